@@ -25,6 +25,34 @@ else:
     for setting in sql:
         api.config[setting] = sql[setting]
     mysql.init_app(api)
+    # Cache the schemas of the tables clients write to, so writes can be
+    # validated. See api/statements.py.
+    from .apiutils import load_table_schemas
+    from .config import VALIDATED_TABLES
+    from pymysql import MySQLError
+    try:
+        with api.app_context():
+            load_table_schemas(VALIDATED_TABLES)
+    except MySQLError:
+        api.logger.exception("Could not load table schemas")
+    # Encode the locations and languages once, and index them for
+    # autocomplete. See api/refdata.py and api/search.py.
+    from . import refdata, search
+    try:
+        with api.app_context():
+            refdata.load()
+            search.locations()
+            search.languages()
+    except MySQLError:
+        api.logger.exception("Could not load reference data")
+    # Index the networks by their locations and language. See
+    # api/networkdir.py.
+    from . import networkdir
+    try:
+        with api.app_context():
+            networkdir.load()
+    except MySQLError:
+        api.logger.exception("Could not load the network directory")
 
 
 
@@ -51,13 +79,21 @@ api.register_blueprint(accounts, url_prefix='/account')
 api.register_blueprint(upload, url_prefix='/upload')
 api.register_blueprint(dev, url_prefix='/dev')
 
+# Report per-request query totals in debug mode. See api/querylog.py.
+from api.querylog import add_debug_headers
+api.after_request(add_debug_headers)
+
+# Let routes that declare a cache policy be cached, and nothing else. See
+# api/httpcache.py.
+from api.httpcache import answer_unchanged, apply_policy
+api.before_request(answer_unchanged)
+api.after_request(apply_policy)
+
 
 @api.after_request
 def add_custom_http_response_headers(response):
     response.headers["X-Content-Type-Options"] = "nosniff"
     response.headers["Strict-Transport-Security"] = "max-age=86400; includeSubDomains"
-    response.headers["Expires"] = "Thu, 01 Jan 1970 00:00:00 GMT"
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate, max-age=0"
     response.headers["Content-Security-Policy"] = "default-src 'self'"
     response.headers["X-CultureMesh"] = "API"
     return response
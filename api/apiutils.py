@@ -1,9 +1,18 @@
-from flask import jsonify, make_response
+from flask import jsonify, make_response, Response, stream_with_context
+from flask.json import dumps as json_dumps
+from pymysql.cursors import SSCursor
 from api.extensions import mysql
+from api.rows import row_factory
+from api import counters, existence, expansion, objectcache, pagination, \
+    querylog, statements
+from api import config
+from api.config import MAX_IDS_PER_REQUEST
 from http import HTTPStatus
 
+import collections
 import hashlib
 import json
+import time
 
 """
 Contains utility routines for API controller logic. Mostly
@@ -14,11 +23,15 @@ dirty work and repeated logic.
 BUF_SIZE = 2 << ((10 * 1) + 4)  # 16 KB
 MAX_SIZE = 2 << ((10 * 2) + 1)  # 2 MB
 ALLOWED_EXTENSIONS = {'gif', 'png', 'jpg'}
+# Rows fetched from the server per round trip when streaming a response.
+STREAM_CHUNK_SIZE = 50
+# Rows sent per statement by execute_insert_rows.
+INSERT_ROWS_PER_STATEMENT = 500
 
 
 def execute_get_one(sql_q_format, args):
     """
-    Get one item from the database.
+    Get one item from the database, possibly from a read replica.
 
     :param sql_q_format: SQL command to execute, with ``%s`` to fill ``args``
     :param args: Arguments used to replace ``%s`` in ``sql_q_format``
@@ -26,31 +39,45 @@ def execute_get_one(sql_q_format, args):
     object retrieved from the database and ``description`` is the cursor
     description that names the attributes in the object.
     """
-    connection = mysql.get_db()
+    return fetch_one(mysql.get_db(read_only=True), sql_q_format, args)
+
+
+def fetch_one(connection, sql_q_format, args):
+    """
+    Get one item using a given connection. Prefer
+    :py:func:`execute_get_one` unless the read must see the primary.
+
+    :param connection: The connection to run the query on
+    :param sql_q_format: SQL command to execute, with ``%s`` to fill ``args``
+    :param args: Arguments used to replace ``%s`` in ``sql_q_format``
+    :return: Tuple of the form ``(item, description)``, as for
+    :py:func:`execute_get_one`.
+    """
+    started = time.perf_counter()
     cursor = connection.cursor()
     cursor.execute(sql_q_format, args)
     result = cursor.fetchone()
     description = cursor.description
     cursor.close()
+    querylog.record(sql_q_format, args, int(result is not None), started)
     return result, description
 
 
-def convert_objects(tuple_arr, description):
+def convert_objects(tuple_arr, description, fields_to_omit=()):
     """
     A DB cursor returns an array of tuples, without attribute names.
     This function converts these tuples into objects
     with key-value pairs.
     :param tuple_arr:  An array of tuples
     :param description: The cursor's description, which allows you to find the attribute names.
+    :param fields_to_omit: attribute names to leave out of every object.
     :return: An array of objects with attribute names according to key-value pairs"""
-    obj_arr = []
-    for tuple_obj in tuple_arr:
-        obj_arr.append({description[index][0]: column for index, column in enumerate(tuple_obj)})
-    return obj_arr
+    return list(map(row_factory(description, fields_to_omit), tuple_arr))
 
 
 def make_response_from_single_tuple(sql_fetched, cursor_description,
-                                    fields_to_omit=["password", "email"]):
+                                    fields_to_omit=["password", "email"],
+                                    factory=None):
     """
     Given a database cursor from which we expect only one result to be
     returned, extracts that tuple into an object and makes a response
@@ -64,17 +91,43 @@ def make_response_from_single_tuple(sql_fetched, cursor_description,
     :param sql_fetched: The object returned by the SQL cursor
     :param cursor_description: The description from ``cursor.description``
     :param fields_to_omit: a list of fields to cut out.
+    :param factory: Optional function taking the cursor description and
+                    returning the function that converts the tuple, e.g.
+                    ``api.usermodel.public_factory``, instead of keeping
+                    every field but ``fields_to_omit``
     :return: A response object ready to return to the client
     """
     obj = sql_fetched
     if obj is not None:
-        obj = convert_objects([obj], cursor_description)[0]
-        for field in fields_to_omit:
-            obj.pop(field, None)
+        obj = _factory(cursor_description, fields_to_omit, factory)(obj)
     status = HTTPStatus.METHOD_NOT_ALLOWED if obj is None else HTTPStatus.OK
     return make_response(jsonify(obj), status)
 
 
+def _factory(description, fields_to_omit, factory):
+    if factory is not None:
+        return factory(description)
+    return row_factory(description, fields_to_omit)
+
+
+def get_count(kind, subject_id, live_query):
+    """
+    Responds with a count kept in the counters table. See
+    :py:mod:`api.counters`.
+
+    :param kind: The kind of count, one of :py:data:`api.counters.KINDS`,
+                 which is also the field it is returned in
+    :param subject_id: The id of the network, post or event
+    :param live_query: A query counting the rows directly, with one %s for
+                       ``subject_id``, used instead if ``LIVE_COUNTS`` is set
+    :return: A response object ready to return to the client
+    """
+    if config.LIVE_COUNTS:
+        return execute_single_tuple_query(live_query, (subject_id,))
+    return make_response(jsonify({kind: counters.get(kind, subject_id)}),
+                         HTTPStatus.OK)
+
+
 def execute_single_tuple_query(sql_q_format, args):
     """
     Returns a single tuple of results from a SQL query
@@ -89,35 +142,133 @@ def execute_single_tuple_query(sql_q_format, args):
     return response
 
 
-def execute_insert(sql_q_format, args):
+def execute_insert(sql_q_format, args, counts=()):
     """
     Executes an insert statement. This simply calls :py:func:`execute_mod` with
     the same parameters as it is provided with.
 
     :param sql_q_format: A complete SQL query with zero or more %s
     :param args: List of parameters to be substituted into the SQL query
+    :param counts: Counters to update, as for :py:func:`execute_mod`
+    :return: The id of the row inserted, as for :py:func:`execute_mod`
     """
-    execute_mod(sql_q_format, args)
+    return execute_mod(sql_q_format, args, counts=counts)
 
 
-def execute_mod(sql_q_format, args):
+def execute_mod(sql_q_format, args, counts=()):
     """
     Executes a SQL statement that modifies the database without getting data.
 
+    Writes always go to the primary, and the rest of the request's reads
+    (and the client's reads for a short while) follow them there so the
+    client sees its own write. See :py:class:`api.pool.PooledMySQL`.
+
     :param sql_q_format: A complete SQL query with zero or more %s
     :param args: List of parameters to be substituted into the SQL query
+    :param counts: List of :py:class:`api.counters.Change` to apply in the
+                   same transaction, once per row the statement affects
+    :return: The ``AUTO_INCREMENT`` id the statement generated, if it
+             inserted a row
     """
+    mysql.note_write()
     connection = mysql.get_db()
+    started = time.perf_counter()
     cursor = connection.cursor()
     try:
         cursor.execute(sql_q_format, args)
     except Exception as e:
         connection.commit()
         raise e
+    querylog.record(sql_q_format, args, cursor.rowcount, started)
+    if counts:
+        try:
+            counters.apply(cursor, counts, cursor.rowcount)
+        except Exception:
+            connection.rollback()
+            raise
+    connection.commit()
+    return cursor.lastrowid
+
+
+def execute_insert_rows(sql_q_format, row_format, rows, counts=(),
+                        rows_per_statement=INSERT_ROWS_PER_STATEMENT):
+    """
+    Inserts many rows in one transaction, using multi-row INSERT statements
+    rather than one statement and one commit per row.
+
+    :param sql_q_format: The statement up to and including ``VALUES``, e.g.
+                         ``INSERT INTO network_registration VALUES``
+    :param row_format: The value list for one row, with a ``%s`` per
+                       argument, e.g. ``(%s, %s, CURRENT_TIMESTAMP)``
+    :param rows: Sequence of argument tuples, one per row
+    :param counts: List of :py:class:`api.counters.Change` to apply, once, in
+                   the same transaction. If fewer rows are inserted than
+                   given, e.g. by an ``INSERT IGNORE``, the changes' counters
+                   are recounted instead.
+    :param rows_per_statement: The most rows to send in one statement
+    :return: The number of rows inserted
+    """
+    if not rows:
+        return 0
+    mysql.note_write()
+    connection = mysql.get_db()
+    inserted = 0
+    try:
+        for start in range(0, len(rows), rows_per_statement):
+            batch = rows[start:start + rows_per_statement]
+            sql = sql_q_format + " " + ", ".join([row_format] * len(batch))
+            args = tuple(arg for row in batch for arg in row)
+            started = time.perf_counter()
+            cursor = connection.cursor()
+            cursor.execute(sql, args)
+            inserted += cursor.rowcount
+            cursor.close()
+            querylog.record(sql, args, cursor.rowcount, started)
+        if counts:
+            cursor = connection.cursor()
+            if inserted == len(rows):
+                counters.apply(cursor, counts)
+            else:
+                counters.recount(cursor, counts)
+            cursor.close()
+    except Exception:
+        connection.rollback()
+        raise
     connection.commit()
+    return inserted
+
+
+def get_id_list(request, max_ids=MAX_IDS_PER_REQUEST):
+    """
+    Reads a list of ids for a bulk endpoint, either from an ``ids`` array in
+    the JSON body or from a comma separated ``ids`` query parameter.
+
+    :param request: The request received
+    :param max_ids: The most ids a request may name
+    :return: List of the ids as integers, without duplicates, in the order
+             given
+    :raises ValueError: if the ids are missing, malformed or too many
+    """
+    content = request.get_json(silent=True)
+    if isinstance(content, dict) and "ids" in content:
+        ids = content["ids"]
+        if not isinstance(ids, list):
+            raise ValueError("ids must be a list")
+    elif request.args.get("ids"):
+        ids = request.args["ids"].split(",")
+    else:
+        raise ValueError("No ids specified")
+    try:
+        ids = [int(id_) for id_ in ids]
+    except (TypeError, ValueError):
+        raise ValueError("ids must be integers")
+    ids = list(collections.OrderedDict.fromkeys(ids))
+    if not ids or len(ids) > max_ids:
+        raise ValueError("Between 1 and %d ids must be given" % max_ids)
+    return ids
 
 
-def get_by_id(table_name, id_, cut_out_fields=[]):
+def get_by_id(table_name, id_, cut_out_fields=[], factory=None):
     """
     Given a table name and an id to search for, queries the table
     and returns a response object ready to be returned to the client.
@@ -125,24 +276,101 @@ def get_by_id(table_name, id_, cut_out_fields=[]):
     :param table_name: The name of the table to query
     :param id_: The id of the object to fetch
     :param cut_out_fields: a list of fields that should be removed for privacy reasons.
+    :param factory: Optional function making the row converter, as in
+                    :py:func:`make_response_from_single_tuple`; then
+                    ``cut_out_fields`` should list the fields it leaves out
     :returns: A response object ready to return to the client.
-    """
 
+    Found objects are cached, already encoded; see :py:mod:`api.objectcache`.
+    """
+    body = objectcache.get(table_name, id_, cut_out_fields)
+    if body:
+        return Response(body, HTTPStatus.OK, mimetype="application/json")
     # Note table_name is never supplied by a client, so we do not
     # need to escape it.
     query = "SELECT * FROM `%s` WHERE id=%%s" % (table_name,)
     sql_object, description = execute_get_one(query, id_)
     response = make_response_from_single_tuple(sql_object, description,
-                                               cut_out_fields)
+                                               cut_out_fields, factory)
+    if body is None and response.status_code == HTTPStatus.OK:
+        objectcache.put(table_name, id_, cut_out_fields, response.get_data())
     return response
 
 
+def get_by_ids(table_name, ids, cut_out_fields=[], bodies=None,
+               factory=None):
+    """
+    Multi-get counterpart of :py:func:`get_by_id`: responds with a JSON
+    array of the objects with the given ids, in the order given, with
+    ``null`` in place of ids that do not exist. Objects not in the object
+    cache are read with a single query.
+
+    :param table_name: The name of the table to query
+    :param ids: List of the ids of the objects to fetch, e.g. from
+                :py:func:`get_id_list`
+    :param cut_out_fields: a list of fields that should be removed for privacy reasons.
+    :param bodies: Optional dictionary mapping ids to objects already
+                   encoded, e.g. from :py:mod:`api.refdata`, which are not
+                   looked up again
+    :param factory: Optional function making the row converter, as in
+                    :py:func:`get_by_id`
+    :returns: A response object ready to return to the client.
+    """
+    bodies = dict(bodies or {})
+    uncacheable = set()
+    for id_ in ids:
+        if id_ not in bodies:
+            body = objectcache.get(table_name, id_, cut_out_fields)
+            if body:
+                bodies[id_] = body
+            elif body is not None:
+                uncacheable.add(id_)
+    missing = [id_ for id_ in ids if id_ not in bodies]
+    if missing:
+        objs = get_objects_by_ids(table_name, missing, cut_out_fields,
+                                  factory)
+        for obj in objs.values():
+            # Encoded the way jsonify encodes, like the bodies get_by_id
+            # caches.
+            body = (json_dumps(obj, separators=(",", ":")) + "\n").encode()
+            bodies[obj["id"]] = body
+            if obj["id"] not in uncacheable:
+                objectcache.put(table_name, obj["id"], cut_out_fields, body)
+    body = b"[" + b",".join(bodies[id_].rstrip(b"\n") if id_ in bodies
+                            else b"null" for id_ in ids) + b"]\n"
+    return Response(body, HTTPStatus.OK, mimetype="application/json")
+
+
+def get_objects_by_ids(table_name, ids, fields_to_omit=(), factory=None):
+    """
+    Reads many rows of a table by id with one query.
+
+    :param table_name: The name of the table to query. Never client supplied.
+    :param ids: Iterable of ids
+    :param fields_to_omit: a list of fields to cut out of every object.
+    :param factory: Optional function making the row converter, as in
+                    :py:func:`make_response_from_single_tuple`
+    :return: Dictionary mapping the ids of the rows found to the rows, as
+             objects
+    """
+    ids = tuple(sorted(set(ids)))
+    if not ids:
+        return {}
+    query = "SELECT * FROM `%s` WHERE id IN %%s" % (table_name,)
+    items, description = execute_get_all(query, (ids,))
+    convert = _factory(description, fields_to_omit, factory)
+    return {obj["id"]: obj for obj in map(convert, items)}
+
+
 def execute_put_by_id(request, table_name):
     """
     Executes a PUT command (a SQL update) on a table
     by the tuple's 'id' field.  All elements specified
     in the request JSON except id are updated.
 
+    Field names and values are validated against the table's schema, if it
+    has been loaded (see :py:func:`load_table_schemas`).
+
     :param request: The request received
     :param table_name: The name of the table to update
     :returns: A response object ready to return to the client
@@ -151,116 +379,228 @@ def execute_put_by_id(request, table_name):
     if not content:
         content = request.form
 
-    columns = content.keys()
-
-    if "id" not in columns:
+    if "id" not in content.keys():
         return make_response("ID not specified", HTTPStatus.METHOD_NOT_ALLOWED)
 
-    query = "UPDATE %s SET " % table_name
-    query_clauses = []
-    args = []
-    for col in columns:
-        if col == "id":
-          continue
-        query_clauses.append("%s=%%s" % col)
-        args.append(content[col])
-    query += ", ".join(query_clauses)
-    query += " WHERE id=%s"
-    args.append(content['id'])
-
-    execute_insert(query, tuple(args))
+    columns = tuple(col for col in content.keys() if col != "id")
+    try:
+        statement = statements.update_statement(table_name, columns)
+        args = statement.bind(content)
+    except statements.InvalidFieldError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+
+    execute_insert(statement.sql, args + (content['id'],))
+    objectcache.invalidate(table_name, content['id'])
     return make_response("OK", HTTPStatus.OK)
 
 
-def execute_post_by_table(request, content_fields, table_name):
+def execute_post_by_table(request, content_fields, table_name, counts=()):
     """
     Executes a POST command to a certain table.
 
     This function is smart enough to detect NULLs in content fields
-    to leverage default database schema values.
+    to leverage default database schema values. Values are validated
+    against the table's schema, if it has been loaded (see
+    :py:func:`load_table_schemas`).
 
     :param request: The request received
     :param content_fields: A tuple containing the field/column names
                      to extract from the request and insert into
                      the table.
     :param table_name: The table to insert into
+    :param counts: Counters to update, as for :py:func:`execute_mod`
     :returns: A response object ready for the client.
     """
+    return insert_from_request(request, content_fields, table_name,
+                               counts)[0]
+
+
+def insert_from_request(request, content_fields, table_name, counts=()):
+    """
+    Does the work of :py:func:`execute_post_by_table`, and also returns the
+    id of the row it inserted, for endpoints that go on to use it.
 
+    :param request: The request received
+    :param content_fields: The fields to insert, as for
+                           :py:func:`execute_post_by_table`
+    :param table_name: The table to insert into
+    :param counts: Counters to update, as for :py:func:`execute_mod`
+    :return: Tuple of a response object ready for the client and the new
+             row's id, which is None if the request was rejected
+    """
     content = request.get_json()
     if not content:
         content = request.form
 
-    # Sanitize content fields.  If we 'null' or 'NULL' or '-1' for any
-    # of the fields, we exclude them from the post_by_table since they will
-    # automatically default to NULL.  We also only keep content fields
-    # that are actually in the form.
-    non_null_content_fields = []
-    for content_field in content_fields:
-      if content_field in content and \
-                    content[content_field] and \
-                    str(content[content_field]) != "-1" and \
-                    str(content[content_field]).lower().strip() != 'null':
-        non_null_content_fields.append(content_field)
-
-    query = "INSERT INTO %s (%s) " % (
-        table_name, ','.join(non_null_content_fields)
-    )
-    query += " values ("
-    for _ in non_null_content_fields:
-        query += "%s, "
-    if query[-2] == ",":
-        query = query[:-2]
-    query += ");"
-
-    args = []
-    for col in non_null_content_fields:
-        args.append(content[col])
-    execute_insert(query, tuple(args))
-    return make_response("OK", HTTPStatus.OK)
+    columns = non_null_fields(content, content_fields)
+    try:
+        statement = statements.insert_statement(table_name, columns)
+        args = statement.bind(content)
+    except statements.InvalidFieldError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST), None
+    row_id = execute_insert(statement.sql, args, counts=counts)
+    return make_response("OK", HTTPStatus.OK), row_id
 
 
-def get_paginated(sql_q_format, selection_fields, args,
-                  order_clause, order_index_format, order_arg):
+def non_null_fields(content, content_fields):
+    """
+    Sanitizes content fields.  If we get 'null' or 'NULL' or '-1' for any of
+    the fields, we exclude them from inserts since they will automatically
+    default to NULL.  We also only keep content fields that are actually in
+    the content.
+
+    :param content: The values to insert, by field
+    :param content_fields: The fields that may be inserted
+    :return: Tuple of the fields of ``content_fields`` to insert
+    """
+    return tuple(field for field in content_fields
+                 if field in content and content[field] and
+                 str(content[field]) != "-1" and
+                 str(content[field]).lower().strip() != 'null')
+
+
+def execute_get_or_create(content, content_fields, table_name, key_field):
+    """
+    Inserts a row unless one with the same unique key exists, and returns
+    the row with that key, whichever request created it. Takes an INSERT
+    IGNORE and a read of the primary, so concurrent requests for the same
+    key all get the one row.
+
+    :param content: The values to insert, by field, including ``key_field``
+    :param content_fields: The fields that may be inserted, sanitized as by
+                           :py:func:`non_null_fields`
+    :param table_name: The table to insert into. Never client supplied.
+    :param key_field: A field of ``content_fields`` with a unique index
+    :return: The row, as a dictionary, or ``None`` if there is none: INSERT
+             IGNORE turns errors such as a missing foreign key or a NULL in
+             a NOT NULL column into warnings, and inserts nothing
+    :raises statements.InvalidFieldError: if a value does not fit its column
+    """
+    statement = statements.insert_statement(
+        table_name, non_null_fields(content, content_fields), ignore=True)
+    execute_mod(statement.sql, statement.bind(content))
+    items, description = fetch_all(
+        mysql.get_db(),
+        "SELECT * FROM `%s` WHERE `%s`=%%s" % (table_name, key_field),
+        (content[key_field],))
+    rows = convert_objects(items, description)
+    return rows[0] if rows else None
+
+
+def load_table_schemas(table_names):
+    """
+    Reads the columns of the given tables from ``information_schema`` so
+    that writes to them can be validated. See :py:mod:`api.statements`.
+
+    :param table_names: Names of the tables to load
+    """
+    query = "SELECT table_name, column_name, data_type, is_nullable " \
+            "FROM information_schema.columns " \
+            "WHERE table_schema = DATABASE() AND table_name IN %s " \
+            "ORDER BY table_name, ordinal_position"
+    items, _ = execute_get_all(query, (tuple(table_names),))
+    statements.load_schema(items)
+
+
+def get_paginated(sql_q_format, selection_fields, args, order_keys,
+                  max_arg=None, fields_to_omit=(), stream=False,
+                  expansions=()):
     """
     Utility function for getting paginated results from a
     database.
 
-    See OneNote documentation for Pagination mechanics.
-
-    NOTE: only works if the WHERE class of the SQL statement
-          matches a single id.
+    Pages are ordered newest first by ``order_keys`` and delimited with
+    keyset conditions rather than offsets, and the page size is pushed into
+    the query as a ``LIMIT``. The response carries an ``X-Has-More`` header
+    and, if there is another page, an opaque ``X-Next-Cursor`` header that
+    the client passes back as the ``cursor`` query parameter. See
+    :py:mod:`api.pagination`.
 
     NOTE: the only thing here not provided by the user is args.
 
-    We call get_paginated_objects.
-
-    :param sql_q_format: A partial SQL query with zero or more %s
+    :param sql_q_format: A partial SQL query with zero or more %s, ending in
+                         a WHERE clause
     :param selection_fields: A list of the values to be substituted into sql_q_format
     :param args: The query parameters (request.args)
-    :param order_clause: The SQL part that dictates order on the final results
-    :param order_index_format: The partial SQL query to be used for pagination
-                                ordering, of the form "FIELD <= %s"
-    :param order_arg: The query param on which order is based for pagination
+    :param order_keys: The columns that order the results, most significant
+                       first, as written in SQL (e.g. ``users.id``). The last
+                       one must be unique within the results.
+    :param max_arg: A legacy query param, such as ``max_id``, that gives an
+                    inclusive upper bound on the first order key
+    :param fields_to_omit: a list of fields to cut out of every item.
+    :param stream: If true, rows are read from an unbuffered cursor and
+                   encoded into the response body chunk by chunk instead of
+                   being materialized first. See :py:func:`stream_json_array`.
+                   Pages with expansions are never streamed.
+    :param expansions: The names of the :py:data:`api.expansion.EXPANSIONS`
+                       the client may ask for with the ``expand`` parameter
     :returns: A response object ready to return to the client
     """
-    count = int(args.get("count", 100))
-    if order_arg in args:
-        order_arg_val = args[order_arg]
-        sql_q_format += " AND " + order_index_format
-        args = (*selection_fields, order_arg_val)
+    try:
+        count = pagination.page_size(args)
+        bounds, bound_args = pagination.page_bounds(args, order_keys, max_arg)
+    except ValueError:
+        return make_response("Invalid pagination parameters",
+                             HTTPStatus.BAD_REQUEST)
+    try:
+        expand = expansion.requested(args, expansions)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    # Expansions need the whole page at hand.
+    stream = stream and not expand
+    sql_q_format += bounds + " " + pagination.order_by(order_keys)
+    args = (*selection_fields, *bound_args)
+    if stream:
+        # Find where the next page starts before the body is sent, since the
+        # headers go out first.
+        next_row, descr = execute_get_one(sql_q_format + " LIMIT %s, 1",
+                                          (*args, count))
+        chunks, descr = execute_stream(sql_q_format + " LIMIT %s",
+                                       (*args, count), count)
+        response = stream_json_array(chunks, descr, fields_to_omit)
     else:
-        args = (*selection_fields,)
-    items, descr = execute_get_many(sql_q_format + order_clause, args, count)
-    if len(items) == 0:
-        return make_response(jsonify([]), HTTPStatus.OK)
-    items = convert_objects(items, descr)
-    return make_response(jsonify(items), HTTPStatus.OK)
+        items, descr = execute_get_many(sql_q_format + " LIMIT %s",
+                                        (*args, count + 1), count + 1)
+        next_row = items[count] if len(items) > count else None
+        items = convert_objects(items[:count], descr, fields_to_omit)
+        expansion.expand(items, expand)
+        response = make_response(jsonify(items), HTTPStatus.OK)
+    next_cursor = None
+    if next_row is not None:
+        next_cursor = pagination.row_cursor(next_row, descr, order_keys)
+    return pagination.add_page_headers(response, next_cursor)
+
+
+def stream_json_array(chunks, description, fields_to_omit=()):
+    """
+    Builds a response whose body is a JSON array encoded incrementally from
+    chunks of rows, so that at most one chunk is held in memory at a time.
+
+    :param chunks: Iterable of sequences of result tuples, e.g. from
+                   :py:func:`execute_stream`
+    :param description: The cursor description naming the columns
+    :param fields_to_omit: a list of fields to cut out of every item.
+    :returns: A streamed response object ready to return to the client
+    """
+    make_row = row_factory(description, fields_to_omit)
+
+    def generate():
+        separator = "["
+        for chunk in chunks:
+            if not chunk:
+                continue
+            yield separator + ",".join(json_dumps(make_row(row))
+                                       for row in chunk)
+            separator = ","
+        yield "[]\n" if separator == "[" else "]\n"
+
+    return Response(stream_with_context(generate()), HTTPStatus.OK,
+                    mimetype="application/json")
 
 
 def execute_get_many(sql_q_format, args, count):
     """
-    Get many items from the database.
+    Get many items from the database, possibly from a read replica.
 
     :param sql_q_format: SQL command to execute, with ``%s`` to fill ``args``
     :param args: Arguments used to replace ``%s`` in ``sql_q_format``
@@ -269,18 +609,62 @@ def execute_get_many(sql_q_format, args, count):
     tuple of objects retrieved from the database and ``description`` is the
     cursor description that names the attributes in the objects.
     """
-    conn = mysql.get_db()
+    conn = mysql.get_db(read_only=True)
+    started = time.perf_counter()
     cursor = conn.cursor()
     cursor.execute(sql_q_format, args)
     items = cursor.fetchmany(count)
     descr = cursor.description
     cursor.close()
+    querylog.record(sql_q_format, args, len(items), started)
     return items, descr
 
 
+def execute_stream(sql_q_format, args, count,
+                   chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Runs a query on an unbuffered (server-side) cursor and returns its rows
+    lazily, ``chunk_size`` at a time.
+
+    The cursor stays open on the request's connection until the returned
+    generator is exhausted or closed, so nothing else may be run on that
+    connection in the meantime. Callers should hand the chunks straight to
+    the response.
+
+    :param sql_q_format: SQL command to execute, with ``%s`` to fill ``args``
+    :param args: Arguments used to replace ``%s`` in ``sql_q_format``
+    :param count: The maximum number of items to return
+    :param chunk_size: The number of rows to fetch per round trip
+    :return: Tuple of the form ``(chunks, description)`` where ``chunks`` is
+    a generator of tuples of rows and ``description`` is the cursor
+    description that names the attributes in the rows.
+    """
+    conn = mysql.get_db(read_only=True)
+    started = time.perf_counter()
+    cursor = conn.cursor(SSCursor)
+    cursor.execute(sql_q_format, args)
+
+    def chunks():
+        remaining = count
+        try:
+            while remaining > 0:
+                rows = cursor.fetchmany(min(chunk_size, remaining))
+                if not rows:
+                    break
+                remaining -= len(rows)
+                yield rows
+        finally:
+            cursor.close()
+            # Recorded once streaming ends, so the time includes sending.
+            querylog.record(sql_q_format, args, count - remaining, started)
+
+    return chunks(), cursor.description
+
+
 def execute_get_all(sql_q_format, args):
     """
-    Get all available items from the database that match a query.
+    Get all available items from the database that match a query, possibly
+    from a read replica.
 
     :param sql_q_format: SQL command to execute, with ``%s`` to fill ``args``
     :param args: Arguments used to replace ``%s`` in ``sql_q_format``
@@ -288,12 +672,27 @@ def execute_get_all(sql_q_format, args):
     tuple of objects retrieved from the database and ``description`` is the
     cursor description that names the attributes in the objects.
     """
-    conn = mysql.get_db()
-    cursor = conn.cursor()
+    return fetch_all(mysql.get_db(read_only=True), sql_q_format, args)
+
+
+def fetch_all(connection, sql_q_format, args):
+    """
+    Get all matching items using a given connection. Prefer
+    :py:func:`execute_get_all` unless the read must see the primary.
+
+    :param connection: The connection to run the query on
+    :param sql_q_format: SQL command to execute, with ``%s`` to fill ``args``
+    :param args: Arguments used to replace ``%s`` in ``sql_q_format``
+    :return: Tuple of the form ``(items, description)``, as for
+    :py:func:`execute_get_all`.
+    """
+    started = time.perf_counter()
+    cursor = connection.cursor()
     cursor.execute(sql_q_format, args)
     items = cursor.fetchall()
     descr = cursor.description
     cursor.close()
+    querylog.record(sql_q_format, args, len(items), started)
     return items, descr
 
 
@@ -301,57 +700,36 @@ def event_exists(event_id):
     """
     This function is used to validate endpoint input.
     This function checks if the passed event id is a valid event id
-    (there is a corresponding event with that id.)
+    (there is a corresponding event with that id.) The answer is usually
+    cached; see :py:mod:`api.existence`.
     :param event_id: the event id.
     :return: true if valid, false if no event found.
     """
-    connection = mysql.get_db()
-    event_registration_check_cursor = connection.cursor()
-    event_registration_check_cursor.execute("SELECT * \
-                                             FROM events \
-                                             WHERE id=%s",
-                                             (event_id,))
-    possible_event = event_registration_check_cursor.fetchone()
-    event_registration_check_cursor.close()
-    return possible_event is not None
+    return existence.exists('events', event_id)
 
 
 def user_exists(user_id):
     """
      This function is used to validate endpoint input.
      This function checks if the passed user id is a valid user id
-    (there is a corresponding user with that id.)
+    (there is a corresponding user with that id.) The answer is usually
+    cached; see :py:mod:`api.existence`.
     :param user_id:
     :return: true if valid, false if no user found.
     """
-    connection = mysql.get_db()
-    user_check = connection.cursor()
-    user_check.execute("SELECT * \
-                        FROM users \
-                        WHERE id=%s",
-                        (user_id,))
-    possible_user = user_check.fetchone()
-    user_check.close()
-    return possible_user is not None
+    return existence.exists('users', user_id)
 
 
 def network_exists(network_id):
     """
     This function is used to validate endpoint input.
     This function checks if the passed network id is a valid
-    network id (there is a corresponding network with that id.)
+    network id (there is a corresponding network with that id.) The answer
+    is usually cached; see :py:mod:`api.existence`.
     :param network_id:
     :return: true if valid, false if no network found.
     """
-    connection = mysql.get_db()
-    network_check = connection.cursor()
-    network_check.execute("SELECT * \
-                           FROM networks \
-                           WHERE id=%s",
-                           (network_id,))
-    possible_network = network_check.fetchone()
-    network_check.close()
-    return possible_network is not None
+    return existence.exists('networks', network_id)
 
 
 def hash_file(file):
@@ -0,0 +1,59 @@
+"""
+Rebuilds of in-memory data, such as the search indexes, on background
+threads.
+
+Building some of these takes seconds. Rather than have the request that
+notices the data is stale wait for the new copy, while the others keep
+serving the old one, it starts the build with :py:func:`run` and serves the
+old copy too. At most one build of each kind runs at a time. Builds run in
+an application context of the app that started them, so they can query the
+database.
+"""
+import threading
+
+from flask import current_app
+
+_threads = {}
+_lock = threading.Lock()
+
+
+def _run(app, target, args):
+    with app.app_context():
+        try:
+            target(*args)
+        except Exception:
+            app.logger.exception("Background rebuild failed")
+
+
+def run(name, target, *args):
+    """
+    Calls ``target(*args)`` on a new thread, unless the last call started
+    under ``name`` is still running. Must be called in an application
+    context.
+
+    :param name: What is being built, e.g. ``'leaderboard'``
+    :param target: The function to call
+    :return: Whether the call was started
+    """
+    app = current_app._get_current_object()
+    with _lock:
+        thread = _threads.get(name)
+        if thread is not None and thread.is_alive():
+            return False
+        thread = threading.Thread(target=_run, args=(app, target, args),
+                                  name="rebuild %s" % name, daemon=True)
+        _threads[name] = thread
+        thread.start()
+    return True
+
+
+def wait(timeout=None):
+    """
+    Waits for the builds started so far to finish, e.g. in tests.
+
+    :param timeout: The most seconds to wait for each build
+    """
+    with _lock:
+        threads = list(_threads.values())
+    for thread in threads:
+        thread.join(timeout)
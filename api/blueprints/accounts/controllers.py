@@ -1,13 +1,19 @@
-from flask import Blueprint, jsonify, g
-from hashlib import md5
+from flask import Blueprint, jsonify, g, abort
+from hashlib import sha256
+from http import HTTPStatus
+import hmac
 from flask_httpauth import HTTPBasicAuth
 from itsdangerous import (TimedJSONWebSignatureSerializer
-                          as Serializer, BadSignature, SignatureExpired)
+                          as Serializer, BadData, BadSignature,
+                          SignatureExpired)
 
-from api.blueprints.users.utils import get_user_by_id, get_user_by_email, get_user_by_username
+from api.blueprints.users.utils import get_user_by_id, get_user_by_login, \
+    set_password_hash
 from api.credentials import secret_key
-from cryptography.hazmat.primitives import constant_time
-from api.config import AUTH_TOKEN_EXPIRATION_SECS
+from api.config import AUTH_TOKEN_EXPIRATION_SECS, SESSION_CACHE_SIZE, \
+    SESSION_CACHE_TTL
+from api import cache, passwords
+from api.extensions import mysql
 import time
 
 accounts = Blueprint('account', __name__)
@@ -17,28 +23,99 @@ auth = HTTPBasicAuth()
 """
 This Token Authentication approach draws heavy inspiration from
 https://blog.miguelgrinberg.com/post/restful-authentication-with-flask
+
+Sessions: checking a token's signature and reading its user on every
+request is most of the cost of authenticating, so the claims of verified
+tokens and the Users they belong to are cached for up to SESSION_CACHE_TTL
+seconds (see invalidate_session for how changes to users are handled).
+Tokens carry the user's id and a fingerprint of their password hash, so
+tokens issued before a password change are rejected. Checking that needs
+the user's current password hash, so each worker reads a user once per
+SESSION_CACHE_TTL while their token is in use; the claims alone are not
+trusted. Tokens found to be revoked are remembered for as long, so replaying
+one does not read the user every time.
 """
 
+# Verified token -> its claims.
+_verified_tokens = cache.TTLCache('verified_tokens', SESSION_CACHE_SIZE,
+                                  SESSION_CACHE_TTL)
+
+# User id -> User.
+_sessions = cache.TTLCache('sessions', SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+
+# Token issued before its user's password changed -> True.
+_revoked_tokens = cache.TTLCache('revoked_tokens', SESSION_CACHE_SIZE,
+                                 SESSION_CACHE_TTL)
+
+# Expiration seconds -> Serializer. Any of them verifies any token.
+_serializers = {}
+
+# Returned by verify_auth_token for a token that is not accepted.
+REJECTED = object()
+
+
+def _serializer(expiration=AUTH_TOKEN_EXPIRATION_SECS):
+    serializer = _serializers.get(expiration)
+    if serializer is None:
+        serializer = _serializers[expiration] = Serializer(
+            secret_key, expires_in=expiration)
+    return serializer
+
+
+def _session_user(user_id):
+    """
+    :param user_id: The id of a user
+    :return: The User with that id, or None if there is none
+    """
+    user = _sessions.get(user_id)
+    if user is None:
+        user = get_user_by_id(user_id)
+        if user is None:
+            return None
+        _sessions.set(user_id, user)
+    return user
+
+
+def invalidate_session(user_id):
+    """
+    Forgets the cached User of a user whose row has changed, e.g. by
+    update_user, so their next request reads it again and tokens issued
+    before a password change stop working. Only this worker process's cache
+    is cleared; the others notice within SESSION_CACHE_TTL seconds.
+    :param user_id: The id of the user
+    """
+    _sessions.delete(int(user_id))
+
 
 @auth.verify_password
 def verify_password(username_or_email_or_token, password):
+    if not username_or_email_or_token:
+        return False
     # first try to authenticate by token
-    user = User.verify_auth_token(username_or_email_or_token)
-    if not user:
-        # try to authenticate with username/password
-        user_obj = get_user_by_email(username_or_email_or_token)
-        if user_obj is None:
-            # username_or_email_or_token is likely a username.
-            user_obj = get_user_by_username(username_or_email_or_token)
-        if user_obj is not None:
-            # Yay! we have a user! Let's convert it to a fancy User.
-            user = User(user_obj)
-            if not user.verify_password(password):
-                return False
-        else:
+    user = verify_auth_token(username_or_email_or_token)
+    if user is REJECTED:
+        # A token, so not a login; hashing its password would only tie up
+        # the hashing pool.
+        return False
+    if user is None:
+        # try to authenticate with username/password. Unknown logins are
+        # checked too, so they take as long to reject.
+        user = get_user_by_login(username_or_email_or_token)
+        # Hashing may wait for the pool (see api/passwords.py), so let
+        # other requests use the connection meanwhile.
+        mysql.release()
+        try:
+            valid, new_hash = passwords.check(
+              password, user.password_hash if user else None)
+        except passwords.Busy:
+            abort(HTTPStatus.SERVICE_UNAVAILABLE)
+        if not valid:
             return False
-    else:
-        user = User(user)
+        if new_hash is not None:
+            # Stored by an older hasher; store the preferred one's instead.
+            set_password_hash(user.id, new_hash)
+            invalidate_session(user.id)
+            user = user._replace(password_hash=new_hash)
     g.user = user
     return True
 
@@ -46,59 +123,91 @@ def verify_password(username_or_email_or_token, password):
 @accounts.route('/token')
 @auth.login_required
 def get_auth_token():
-    token = g.user.generate_auth_token()
-    return_dict = vars(g.user)
+    token = generate_auth_token(g.user)
+    return_dict = g.user.account()
     return_dict['token'] = token.decode('ascii')
     return_dict['token_expiration_epoch'] = int(time.time()) + AUTH_TOKEN_EXPIRATION_SECS 
     return jsonify(return_dict)
 
 
-class User:
+def password_fingerprint(user):
     """
-    This user class is used by Flask Login to validate users.
+    :param user: A User
+    :return: A keyed hash of the user's password hash, which tokens carry so
+    they can be revoked by changing the password without revealing the
+    password hash.
     """
+    key = secret_key if isinstance(secret_key, bytes) \
+        else secret_key.encode('utf8')
+    return hmac.new(key, user.password_hash.encode('utf8'),
+                    sha256).hexdigest()[:16]
 
-    def __init__(self, user_obj):
-        """
-        Instantiates user based on user_name and hashed password
-        """
-        self.id = user_obj['id']
-        self.password_hash = user_obj['password']
-        self.email = user_obj['email']
-        self.username = user_obj['username']
-        self.about_me = user_obj['about_me']
-        self.first_name = user_obj['first_name']
-        self.last_name = user_obj['last_name']
-        self.role = user_obj['role']
-        self.last_login = user_obj['last_login']  # TODO: possibly update this field?
-        self.gender = user_obj['gender']
-        self.img_link = user_obj['img_link']
-
-    @staticmethod
-    def hash_password(password):
-        return md5(password.encode('utf-8')).hexdigest()
-
-    def verify_password(self, password):
-        """
-        We use a constant time comparison so attackers cannot differentiate between hashes that are close to the
-        actual hash (and thus take less time to compare) and hashes that are way off the mark.
-        :param password: password to hash.
-        :return: True if password is valid, False otherwise.
-        """
-        return constant_time.bytes_eq(bytes(self.hash_password(password).encode('utf8')), \
-                                      bytes(self.password_hash.encode('utf8')))
-
-    def generate_auth_token(self, expiration=AUTH_TOKEN_EXPIRATION_SECS):
-        s = Serializer(secret_key, expires_in=expiration)
-        return s.dumps({'id': self.id})
-
-    @staticmethod
-    def verify_auth_token(token):
-        s = Serializer(secret_key)
+
+def _issued(user, claims):
+    """
+    :param user: A User
+    :param claims: The claims of a verified token
+    :return: True unless the token was issued with another password.
+    Tokens issued before tokens carried a fingerprint have none.
+    """
+    return 'pw' not in claims or hmac.compare_digest(
+        claims['pw'], password_fingerprint(user))
+
+
+def generate_auth_token(user, expiration=AUTH_TOKEN_EXPIRATION_SECS):
+    """
+    :param user: The User to issue a token to
+    :param expiration: Seconds the token is valid for
+    :return: The token, as bytes
+    """
+    return _serializer(expiration).dumps(
+        {'id': user.id, 'pw': password_fingerprint(user)})
+
+
+def verify_auth_token(token):
+    """
+    :param token: A token from generate_auth_token, or a login
+    :return: The User the token was issued to; REJECTED if it is a signed
+    payload, like a token, but its signature is wrong, it has expired or it
+    was issued before the user's password changed; or None if it is not a
+    token at all.
+    """
+    if _revoked_tokens.get(token):
+        return REJECTED
+    claims = _verified_tokens.get(token)
+    if claims is None:
         try:
-            data = s.loads(token)
+            claims, header = _serializer().loads(token, return_header=True)
         except SignatureExpired:
-            return None  # valid token, but expired
-        except BadSignature:
-            return None  # invalid token
-        return get_user_by_id(data["id"])
+            return REJECTED  # valid token, but expired
+        except BadSignature as e:
+            return REJECTED if _is_signed_payload(e) else None
+        # Never cached past the token's expiry.
+        _verified_tokens.set(token, claims,
+                             min(SESSION_CACHE_TTL,
+                                 header['exp'] - time.time()))
+    user = _session_user(claims['id'])
+    if user is not None and not _issued(user, claims):
+        # The password may have changed since the user was cached.
+        invalidate_session(claims['id'])
+        user = _session_user(claims['id'])
+    if user is None or not _issued(user, claims):
+        _verified_tokens.delete(token)
+        _revoked_tokens.set(token, True)
+        return REJECTED
+    return user
+
+
+def _is_signed_payload(error):
+    """
+    :param error: The BadSignature raised when loading a token
+    :return: True if what was loaded has the form of a token, so that only
+    its signature is wrong.
+    """
+    if error.payload is None:
+        return False
+    try:
+        _serializer().load_payload(error.payload)
+    except BadData:
+        return False
+    return True
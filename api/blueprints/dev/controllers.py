@@ -1,5 +1,8 @@
-from flask import Blueprint
-from api import api
+from functools import wraps
+from http import HTTPStatus
+from flask import Blueprint, abort, jsonify
+from api import api, cache, objectcache
+from api.extensions import mysql
 
 dev = Blueprint('dev', __name__)
 
@@ -21,3 +24,39 @@ def get_note():
     """
     with open(api.config["NOTE_PATH"], 'r') as file:
         return file.read()
+
+
+def debug_only(f):
+    """Hides an endpoint, with a 404, unless the app is in debug or testing
+    mode. For endpoints exposing internals, such as pool and cache counters.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not (api.debug or api.testing):
+            abort(HTTPStatus.NOT_FOUND)
+        return f(*args, **kwargs)
+    return decorated
+
+
+@dev.route("/pool")
+@debug_only
+def get_pool_stats():
+    """Returns the database connection pool counters for monitoring
+
+    :return: JSON object of pool statistics, empty if the pool is not set up
+    """
+    if mysql.pool is None:
+        return jsonify({})
+    return jsonify(mysql.stats())
+
+
+@dev.route("/caches")
+@debug_only
+def get_cache_stats():
+    """Returns the counters of every in-process cache for monitoring
+
+    :return: JSON object mapping cache names to their statistics
+    """
+    stats = cache.all_stats()
+    stats['objects'] = objectcache.stats()
+    return jsonify(stats)
@@ -2,6 +2,8 @@ from flask import Blueprint, request
 from api.blueprints.accounts.controllers import auth
 from api.blueprints.users.utils import _add_user_to_event, get_curr_user_id
 from api.apiutils import *
+from api.httpcache import cache_policy, REVALIDATE
+from api import counters, existence, objectcache
 
 events = Blueprint('event', __name__)
 
@@ -12,29 +14,47 @@ def test():
 
 
 @events.route("/<event_id>", methods=["GET"])
+@cache_policy(REVALIDATE,
+              lambda event_id: objectcache.etag("events", event_id))
 def get_event(event_id):
     return get_by_id("events", event_id)
 
 
+@events.route("/batch", methods=["GET"])
+@cache_policy(REVALIDATE)
+def get_events_by_ids():
+    """
+    Gets many events at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the events in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    try:
+        ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    return get_by_ids("events", ids)
+
+
 @events.route("/<event_id>/reg", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_event_registration(event_id):
     return get_paginated("SELECT * \
                           FROM event_registration \
                           WHERE id_event=%s",
                           selection_fields=[event_id],
                           args=request.args,
-                          order_clause="ORDER BY date_registered DESC",
-                          order_index_format="date_registered <= %s",
-                          order_arg="max_registration_date")
+                          order_keys=("date_registered", "id_guest"),
+                          max_arg="max_registration_date")
 
 
 @events.route("/<event_id>/reg_count", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_event_registration_count(event_id):
     query = "SELECT count(*) \
              as reg_count \
              from event_registration \
              where id_event=%s"
-    return execute_single_tuple_query(query, (event_id,))
+    return get_count("reg_count", event_id, query)
 
 
 @events.route("/new", methods=["POST", "PUT"])
@@ -49,16 +69,13 @@ def make_new_event():
                           'address_1', 'address_2',
                           'country', 'city',
                           'region', 'description']
-        response = execute_post_by_table(request, content_fields, "events")
-        # Unfortunately, we have to get the event id
+        response, event_id = insert_from_request(request, content_fields,
+                                                 "events")
+        if response.status_code != HTTPStatus.OK:
+            return response
         content = request.get_json()
         if not content:
             content = request.form
-        query = "SELECT id FROM events WHERE id_host=%s AND id_" \
-                "network=%s ORDER BY id DESC LIMIT 1"
-        args = (content["id_host"], content["id_network"])
-        item, desc = execute_get_one(query, args)
-        event_id = convert_objects([item], desc)[0]["id"]
         # We also need to "register" them attending their own event.
         _add_user_to_event(content["id_host"], event_id, "host")
         return response
@@ -74,6 +91,7 @@ def make_new_event():
 
 
 @events.route("/currentUserEventsByNetwork/<network_id>", methods=["GET"])
+@cache_policy(REVALIDATE)
 @auth.login_required
 def user_events_for_network(network_id):
     user_id = get_curr_user_id()
@@ -82,9 +100,11 @@ def user_events_for_network(network_id):
                          WHERE (id_guest=%s OR id_host=%s) AND id_network=%s",
                          selection_fields=[user_id, user_id, network_id],
                          args=request.args,
-                         order_clause="ORDER BY id DESC",
-                         order_index_format="id <= %s",
-                         order_arg="id")
+                         # A hosted event joins a row per guest.
+                         order_keys=("events.id",
+                                     "event_registration.id_guest"),
+                         max_arg="id",
+                         expansions=("host", "network", "reg_count"))
 
 
 @events.route("/delete", methods=["DELETE"])
@@ -96,4 +116,7 @@ def delete_event():
         return make_response("Invalid Input", HTTPStatus.BAD_REQUEST)
     execute_mod('DELETE FROM event_registration WHERE id_event=%s', event_id)
     execute_mod('DELETE FROM events WHERE id=%s', event_id)
+    counters.forget('reg_count', event_id)
+    existence.forget('events', event_id)
+    objectcache.invalidate('events', event_id)
     return make_response("OK", HTTPStatus.OK)
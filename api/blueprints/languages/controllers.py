@@ -2,6 +2,8 @@ from flask import Blueprint, jsonify, request, json, make_response
 from http import HTTPStatus
 from api.extensions import mysql
 from api.apiutils import *
+from api.httpcache import cache_policy, IMMUTABLE, REFERENCE
+from api import refdata, search
 
 languages = Blueprint('language', __name__)
 
@@ -12,24 +14,49 @@ def test():
 
 
 @languages.route("/<lang_id>", methods=["GET"])
+@cache_policy(REFERENCE,
+              lambda lang_id: refdata.item_etag("languages", lang_id))
 def get_language(lang_id):
-    return get_by_id("languages", lang_id)
+    payload = refdata.get_item("languages", lang_id)
+    if payload is None:
+        return get_by_id("languages", lang_id)
+    return refdata.respond(payload)
+
+
+@languages.route("/batch", methods=["GET"])
+@cache_policy(REFERENCE)
+def get_languages_by_ids():
+    """
+    Gets many languages at once, by the comma separated ``ids`` query
+    parameter.
+    :return: JSON list of the languages in the order requested, with
+    ``null`` for ids that do not exist.
+    """
+    try:
+        ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    return get_by_ids("languages", ids,
+                      bodies=refdata.get_bodies("languages", ids))
+
+
+@languages.route("/v/<version>/languages", methods=["GET"])
+@cache_policy(IMMUTABLE)
+def get_all_languages(version):
+    return refdata.serve_bulk(version, "languages")
 
 
 @languages.route("/autocomplete", methods=["GET"])
+@cache_policy(REFERENCE)
 def get_language_autocomplete():
+    """
+    Finds the languages with a name, or alternate name, containing the
+    ``input_text`` query parameter, ignoring case and accents, most spoken
+    first. See :py:mod:`api.search`.
+    """
     input_text = request.args['input_text']
     if input_text is None:
         return make_response("Must have valid input_text field",
                              HTTPStatus.METHOD_NOT_ALLOWED)
-
-    # TODO: this is entirely unsafe, need better way to
-    #       work with autocomplete.
-    query = "SELECT * FROM languages WHERE languages.name REGEXP %s " \
-            "ORDER BY num_speakers DESC;"
-    items, descr = execute_get_many(query, (input_text,), 20)
-    if len(items) == 0:
-        return make_response(jsonify([]), HTTPStatus.OK)
-
-    langs = convert_objects(items, descr)
-    return make_response(jsonify(langs), HTTPStatus.OK)
+    return search.respond(search.languages().search(
+        input_text, search.LANGUAGE_RESULTS))
@@ -1,5 +1,7 @@
 from flask import Blueprint, request
 from api.apiutils import *
+from api.httpcache import cache_policy, IMMUTABLE, REFERENCE, REVALIDATE
+from api import refdata, search
 
 locations = Blueprint('location', __name__)
 
@@ -10,49 +12,118 @@ def test():
 
 
 @locations.route("/countries/<country_id>", methods=["GET"])
+@cache_policy(REFERENCE,
+              lambda country_id: refdata.item_etag("countries", country_id))
 def get_country(country_id):
-    return get_by_id("countries", country_id)
+    return get_reference_item("countries", country_id)
+
+
+@locations.route("/countries/batch", methods=["GET"])
+@cache_policy(REFERENCE)
+def get_countries_by_ids():
+    """
+    Gets many countries at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the countries in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    return get_reference_items("countries")
 
 
 @locations.route("/regions/<region_id>", methods=["GET"])
+@cache_policy(REFERENCE,
+              lambda region_id: refdata.item_etag("regions", region_id))
 def get_region(region_id):
-    return get_by_id("regions", region_id)
+    return get_reference_item("regions", region_id)
+
+
+@locations.route("/regions/batch", methods=["GET"])
+@cache_policy(REFERENCE)
+def get_regions_by_ids():
+    """
+    Gets many regions at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the regions in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    return get_reference_items("regions")
 
 
 @locations.route("/cities/<city_id>", methods=["GET"])
+@cache_policy(REFERENCE,
+              lambda city_id: refdata.item_etag("cities", city_id))
 def get_city(city_id):
-    return get_by_id("cities", city_id)
+    return get_reference_item("cities", city_id)
+
+
+@locations.route("/cities/batch", methods=["GET"])
+@cache_policy(REFERENCE)
+def get_cities_by_ids():
+    """
+    Gets many cities at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the cities in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    return get_reference_items("cities")
+
+
+def get_reference_item(table_name, id_):
+    """
+    Serves a location from the reference data snapshot, or from the
+    database if it is not in the snapshot.
+    """
+    payload = refdata.get_item(table_name, id_)
+    if payload is None:
+        return get_by_id(table_name, id_)
+    return refdata.respond(payload)
+
+
+def get_reference_items(table_name):
+    """
+    Serves the locations named by the ``ids`` query parameter, from the
+    reference data snapshot where possible.
+    """
+    try:
+        ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    return get_by_ids(table_name, ids,
+                      bodies=refdata.get_bodies(table_name, ids))
+
+
+@locations.route("/refdata", methods=["GET"])
+@cache_policy(REVALIDATE)
+def get_refdata_manifest():
+    return make_response(jsonify(refdata.manifest()), HTTPStatus.OK)
+
+
+@locations.route("/v/<version>/countries", methods=["GET"])
+@cache_policy(IMMUTABLE)
+def get_all_countries(version):
+    return refdata.serve_bulk(version, "countries")
+
+
+@locations.route("/v/<version>/countries/<int:country_id>/regions",
+                 methods=["GET"])
+@cache_policy(IMMUTABLE)
+def get_country_regions(version, country_id):
+    return refdata.serve_bulk(version, "regions", country_id)
+
+
+@locations.route("/v/<version>/regions/<int:region_id>/cities",
+                 methods=["GET"])
+@cache_policy(IMMUTABLE)
+def get_region_cities(version, region_id):
+    return refdata.serve_bulk(version, "cities", region_id)
 
 
 @locations.route("/autocomplete", methods=["GET"])
+@cache_policy(REFERENCE)
 def autocomplete():
-    # TODO: Have fancier queries. For now, we will just take advantage of regex, which functions as a "contains"
-    # a direct format. This is a SQL injection vulnerability.
-    location_objects = []
-
-    sql_q_format = "SELECT cities.name, id AS city_id, region_id, country_id " \
-                   "FROM cities WHERE cities.name REGEXP %s"
-    items, descr = execute_get_many(sql_q_format,
-                                    (request.args["input_text"],), 100)
-
-    location_objects.extend(convert_objects(items, descr))
-    if len(location_objects) == 100:
-        return make_response(jsonify(location_objects), HTTPStatus.OK)
-
-    sql_q_format = "SELECT regions.name, 'null' AS city_id, id AS region_id, " \
-                   "country_id FROM regions WHERE regions.name REGEXP %s"
-    items, descr = execute_get_many(sql_q_format,
-                                    (request.args["input_text"],), 100)
-
-    location_objects.extend(convert_objects(items, descr))
-    if len(location_objects) == 100:
-        return make_response(jsonify(location_objects), HTTPStatus.OK)
-
-    sql_q_format = "SELECT countries.name, 'null' AS city_id, 'null' AS " \
-                   "region_id, id AS country_id FROM countries WHERE " \
-                   "countries.name REGEXP %s"
-    items, descr = execute_get_many(sql_q_format,
-                                    (request.args["input_text"],), 100)
-
-    location_objects.extend(convert_objects(items, descr))
-    return make_response(jsonify(location_objects), HTTPStatus.OK)
+    """
+    Finds the locations with, for each word of the ``input_text`` query
+    parameter, a word in their name starting with it, ignoring case and
+    accents. Countries come first, then regions, then cities, each by
+    population. See :py:mod:`api.search`.
+    """
+    input_text = request.args["input_text"]
+    return search.respond(search.locations().search(
+        input_text, search.LOCATION_RESULTS))
@@ -1,9 +1,10 @@
 from flask import Blueprint, request, abort
 from api.apiutils import *
+from api.httpcache import cache_policy, REVALIDATE
+from api import leaderboard, networkdir, objectcache, places
 from pymysql.err import IntegrityError
 
-from api.blueprints.networks.utils import get_from_location_sql_string_end, \
-  get_near_location_sql_string_start
+from api.blueprints.networks.utils import network_key, requested_network_key
 
 networks = Blueprint('network', __name__)
 
@@ -28,31 +29,30 @@ def make_new_network_request():
     # (like form and get_json) to it.
     # See: https://stackoverflow.com/questions/2280334
     req = make_fake_request_obj(request)
-    conn = mysql.get_db()
-
-    near_ids = request.args['near_location'].split(',')
     singulars = ['country', 'region', 'city']
-    plurals = ['countries', 'regions', 'cities']
 
-    for singular, plural, near_id in zip(singulars, plurals, near_ids):
+    triples = [places.parse_triple(request.args['near_location'])]
+    if "from_location" in request.args:
+        triples.append(places.parse_triple(request.args['from_location']))
+    # Name the near and from locations together, in one query per level at
+    # most.
+    names = places.resolve(triples)
+
+    near_ids = triples[0]
+    for singular, near_id, name in zip(singulars, near_ids, names[0]):
         req.form['id_%s_cur' % singular] = near_id
-        req.form['%s_cur' % singular] = get_column_value(
-          conn, 'name', 'id', plural, near_id
-        )
+        req.form['%s_cur' % singular] = name
 
     if "from_location" in request.args:
         # To avoid a key error in execute_post_by_table, we need to set the other params to None
         req.form['id_language_origin'] = None
         req.form['language_origin'] = None
-        from_ids = request.args['from_location'].split(',')
-        for singular, plural, from_id in zip(singulars, plurals, from_ids):
+        for singular, from_id, name in zip(singulars, triples[1], names[1]):
             req.form['id_%s_origin' % singular] = from_id
-            req.form['%s_origin' % singular] = get_column_value(
-              conn, 'name', 'id', plural, from_id
-            )
-        if near_ids[0] != -1:
+            req.form['%s_origin' % singular] = name
+        if near_ids[2] is not None:
             req.form['network_class'] = 'cc'
-        elif near_ids[1] != -1:
+        elif near_ids[1] is not None:
             req.form['network_class'] = 'rc'
         else:
             req.form['network_class'] = 'co'
@@ -61,7 +61,7 @@ def make_new_network_request():
             req.form['id_%s_origin' % singular] = None
             req.form['%s_origin' % singular] = None
         req.form['id_language_origin'] = get_column_value(
-          conn, 'id', 'name', 'languages', request.args['language']
+          mysql.get_db(), 'id', 'name', 'languages', request.args['language']
         )
         req.form['language_origin'] = request.args['language']
         req.form['network_class'] = '_l'
@@ -81,7 +81,8 @@ def get_column_value(db_connection,
                      table_name,
                      item_id):
     """
-    Fetches name from DB table given id. I also use this for languages.
+    Fetches a column of a row. Used to find the id of a language by name;
+    see :py:mod:`api.places` for location names.
     :param db_connection: Database connection (use mysql.get_db())
     :param desired_column: column you want to find out
     :param query_column: column you already know that you can use to query
@@ -92,118 +93,120 @@ def get_column_value(db_connection,
     """
     if item_id == str(-1) or str(item_id).lower() == 'null' or not item_id:
         return None
-    cursor = db_connection.cursor()
-    cursor.execute(
+    row, _ = fetch_one(
+      db_connection,
       "SELECT " + desired_column + " FROM " + table_name + " WHERE " + query_column + "=%s",
       item_id
     )
-    cursor.close()
-    return cursor.fetchone()
+    return row[0] if row is not None else None
 
 
 @networks.route("/networks", methods=["GET"])
-def get_networks(func_counter=0):
+@cache_policy(REVALIDATE)
+def get_networks():
     # Validate that we have valid input data (we need a near_location).
     if "near_location" not in request.args:
         return make_response(
           "No near_location specified", HTTPStatus.METHOD_NOT_ALLOWED
         )
 
-    selection_fields = []
-
-    # All requests will start with the same query and query for near_location.
-    my_sql_string_start, near_location_ids = get_near_location_sql_string_start(
-      request.args["near_location"]
-    )
-
-    selection_fields.extend(near_location_ids)
     # Need to check if querying a location or language network.
-    # That changes our queries.
     if "from_location" in request.args:
-        my_sql_string_end, from_location_ids = get_from_location_sql_string_end(
-           request.args["from_location"]
-        )
-        selection_fields.extend(from_location_ids)
-        response_obj = get_paginated(
-          my_sql_string_start + my_sql_string_end,
-          selection_fields=selection_fields,
-          args=request.args,
-          order_clause="ORDER BY id DESC",
-          order_index_format="id <= %s",
-          order_arg="max_id"
-        )
+        language = None
     elif "language" in request.args:
-        selection_fields.append(request.args["language"])
-        my_sql_string_end = "AND language_origin=%s"
-        response_obj = get_paginated(
-          my_sql_string_start + my_sql_string_end,
-          selection_fields=selection_fields,
-          args=request.args,
-          order_clause="ORDER BY id DESC",
-          order_index_format="id <= %s",
-          order_arg="max_id"
-        )
+        language = request.args["language"]
     else:
         return make_response(
           "No location/language query parameter", HTTPStatus.METHOD_NOT_ALLOWED
         )
-    if len(response_obj.get_json()) == 0:
-        # The network doesn't exist. So, let's make it!
-        try:
-            make_new_network(make_new_network_request())
-            func_counter += 1
-            if func_counter < 2:
-                # We need to avoid a stack overflow error
-                # if our make_new_network messes up.
-                return get_networks(func_counter)
-            else:
-                return make_response("/networks Internal Server Error", HTTPStatus.INTERNAL_SERVER_ERROR)
-        except (AttributeError, ValueError, IndexError, IntegrityError) as e:
-            abort(HTTPStatus.BAD_REQUEST)
-    else:
-        # Just return the response object, since it is not empty.
-        return response_obj
+    try:
+        key = requested_network_key(request.args["near_location"],
+                                    request.args.get("from_location"),
+                                    language)
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+    # There is at most one network with the key. Look it up in the
+    # directory, which reads the networks table only for networks made by
+    # other worker processes; see api/networkdir.py.
+    network_id = networkdir.find(key)
+    if network_id is not None:
+        return pagination.add_page_headers(
+          get_by_ids("networks", [network_id]), None)
+    # The network doesn't exist. So, let's make it! Another request may be
+    # making it at the same time, in which case we get theirs.
+    try:
+        network = get_or_create_network(make_new_network_request().form)
+    except (AttributeError, ValueError, IndexError, IntegrityError) as e:
+        abort(HTTPStatus.BAD_REQUEST)
+    if network is None:
+        abort(HTTPStatus.BAD_REQUEST)
+    networkdir.add(network)
+    return pagination.add_page_headers(
+      make_response(jsonify([network]), HTTPStatus.OK), None)
 
 
 @networks.route("/<network_id>", methods=["GET"])
+@cache_policy(REVALIDATE,
+              lambda network_id: objectcache.etag("networks", network_id))
 def get_network(network_id):
     return get_by_id("networks", network_id)
 
 
+@networks.route("/batch", methods=["GET"])
+@cache_policy(REVALIDATE)
+def get_networks_by_ids():
+    """
+    Gets many networks at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the networks in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    try:
+        ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    return get_by_ids("networks", ids)
+
+
 @networks.route("/<network_id>/posts", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_network_posts(network_id):
     return get_paginated("SELECT * \
                          FROM posts \
                          WHERE id_network=%s",
                          selection_fields=[network_id],
                          args=request.args,
-                         order_clause="ORDER BY id DESC",
-                         order_index_format="id <= %s",
-                         order_arg="max_id")
+                         order_keys=("id",),
+                         max_arg="max_id",
+                         stream=True,
+                         expansions=("user", "network", "reply_count"))
 
 
 @networks.route("/<network_id>/post_count", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_network_post_count(network_id):
     query = "SELECT count(*) \
              as post_count \
              from posts \
              where id_network=%s"
-    return execute_single_tuple_query(query, (network_id,))
+    return get_count("post_count", network_id, query)
 
 
 @networks.route("/<network_id>/events", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_network_events(network_id):
     return get_paginated("SELECT * \
                           FROM events \
                           WHERE id_network=%s",
                           selection_fields=[network_id],
                           args=request.args,
-                          order_clause="ORDER BY id DESC",
-                          order_index_format="id <= %s",
-                          order_arg="max_id")
+                          order_keys=("id",),
+                          max_arg="max_id",
+                          stream=True,
+                          expansions=("host", "network", "reg_count"))
 
 
 @networks.route("/<network_id>/users", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_network_users(network_id):
     return get_paginated("SELECT users.*, join_date \
                           FROM network_registration \
@@ -212,48 +215,87 @@ def get_network_users(network_id):
                           WHERE id_network=%s",
                           selection_fields=[network_id],
                           args=request.args,
-                          order_clause="ORDER BY join_date DESC",
-                          order_index_format="join_date <= %s",
-                          order_arg="max_registration_date")
+                          order_keys=("join_date", "users.id"),
+                          max_arg="max_registration_date",
+                          fields_to_omit=["password", "email"],
+                          stream=True)
 
 
 @networks.route("/<network_id>/user_count", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_network_user_count(network_id):
     query = "SELECT count(*) \
              as user_count \
              from network_registration \
              where id_network=%s"
-    return execute_single_tuple_query(query, (network_id,))
+    return get_count("user_count", network_id, query)
 
 
-@networks.route("/new", methods=["POST"])
-def make_new_network(internal_req=None):
-    content_fields = [
-      'city_cur', 'id_city_cur', 'region_cur', 'id_region_cur', \
-      'country_cur', 'id_country_cur', 'city_origin', 'id_city_origin', \
-      'region_origin', 'id_region_origin', 'country_origin', \
-      'id_country_origin', 'language_origin', 'id_language_origin', \
-      'network_class'
-    ]
+# The fields a network is created with.
+NETWORK_FIELDS = [
+  'city_cur', 'id_city_cur', 'region_cur', 'id_region_cur', \
+  'country_cur', 'id_country_cur', 'city_origin', 'id_city_origin', \
+  'region_origin', 'id_region_origin', 'country_origin', \
+  'id_country_origin', 'language_origin', 'id_language_origin', \
+  'network_class', 'network_key'
+]
+
 
-    if internal_req:
-      request = internal_req
+def get_or_create_network(content):
+    """
+    Creates a network unless one with the same locations and language
+    exists.
 
-    return execute_post_by_table(request, content_fields, "networks")
+    :param content: The network's fields, except network_key
+    :return: The network, as a dictionary, or None if it could not be
+    created, e.g. because a field breaks a constraint
+    """
+    content = dict(content)
+    content['network_key'] = network_key(content)
+    return execute_get_or_create(content, NETWORK_FIELDS, "networks",
+                                 "network_key")
+
+
+@networks.route("/new", methods=["POST"])
+def make_new_network():
+    content = request.get_json() or request.form
+    try:
+        network = get_or_create_network(content)
+    except statements.InvalidFieldError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    if network is None:
+        return make_response("Invalid network", HTTPStatus.BAD_REQUEST)
+    return make_response("OK", HTTPStatus.OK)
 
 
 @networks.route("/popular", methods=["GET"])
+@cache_policy(REVALIDATE)
 def popular():
-    connection = mysql.get_db()
+    """
+    Lists networks by member count, most first, with the count in each
+    network's ``user_count``. May be filtered by ``network_class`` and by
+    one of ``id_city_cur``, ``id_region_cur`` and ``id_country_cur``, and is
+    paginated with ``count`` and ``cursor``. Served from memory; see
+    :py:mod:`api.leaderboard`.
+    """
     try:
-        count = int(request.args["count"])
-        if not count or count > 30:
-            return make_response("Invalid count parameter", HTTPStatus.BAD_REQUEST)
-        # For some reason, distinct only works on individual columns, so we will have to first just get the ids.
-        networks_cursor = connection.cursor()
-        networks_cursor.execute("SELECT * FROM networks ORDER BY (SELECT COUNT(*) FROM network_registration WHERE id=id_network)\
-                DESC LIMIT %s", (count,))
-        return make_response(jsonify(convert_objects(networks_cursor.fetchall(), networks_cursor.description)),
-                             HTTPStatus.OK)
+        count = pagination.page_size(request.args)
     except ValueError:
         return make_response("Invalid count parameter", HTTPStatus.BAD_REQUEST)
+    try:
+        key = leaderboard.filter_key(request.args)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    start = None
+    if "cursor" in request.args:
+        try:
+            start = tuple(int(value) for value in pagination.decode_cursor(
+                request.args["cursor"], 2))
+        except (TypeError, ValueError):
+            return make_response("Invalid cursor", HTTPStatus.BAD_REQUEST)
+    entries, following = leaderboard.page(leaderboard.current(), key, start,
+                                          count)
+    body = b"[" + b",".join(entry.body for entry in entries) + b"]\n"
+    response = Response(body, HTTPStatus.OK, mimetype="application/json")
+    return pagination.add_page_headers(
+        response, following and pagination.encode_cursor(following))
@@ -2,91 +2,48 @@
 # Utility functions for the networks API.
 #
 
-from flask import Blueprint, request, abort
-from http import HTTPStatus
+from api import places
 
-### Helpers for the GET networks function.
+### Helpers for finding and creating networks.
 
-def get_near_location_sql_string_start(near_location):
-    """Returns the first half of the SQL query string to use
-    for a GET networks call.
+# The fields identifying a network, grouped as in its key: the current
+# location, the origin location, and the origin language.
+KEY_FIELDS = (('id_country_cur', 'id_region_cur', 'id_city_cur'),
+              ('id_country_origin', 'id_region_origin', 'id_city_origin'),
+              ('language_origin',))
 
-    :param near_location: the query string passed into the request.
-    :return: (sql string format, values to include in sql string format)
-    """
-    near_location = near_location.split(",")
-    if len(near_location) != 3:
-        abort(HTTPStatus.BAD_REQUEST)
-
-    country_id, region_id, city_id = near_location
-
-    # Build string.
-    sql_string_start = "SELECT * FROM networks "
-
-    # If country id null?
-    if country_id == "-1" or country_id.lower() == "null":
-        sql_string_start += "WHERE id_country_cur is NULL "
-        country_id = None
-    else:
-        sql_string_start += "WHERE id_country_cur=%s "
-
-     # If region id null?
-    if region_id == "-1" or region_id.lower() == "null":
-        sql_string_start += "AND id_region_cur is NULL "
-        region_id = None
-    else:
-        sql_string_start += "AND id_region_cur=%s "
-
-     # If city id null?
-    if city_id == "-1" or city_id.lower() == "null":
-        sql_string_start += "AND id_city_cur is NULL "
-        city_id = None
-    else:
-        sql_string_start += "AND id_city_cur=%s "
-
-    ids_to_return = [
-        id_ for id_ in [country_id, region_id, city_id] if id_
-    ]
-    return (sql_string_start, ids_to_return)
-
-def get_from_location_sql_string_end(from_location):
-    """Returns the second half of the SQL query string to use
-    for a GET networks call with from_location specified.
+def network_key(network):
+    """Returns the canonical key of a network. Networks store it in their
+    unique network_key column, so there is only ever one network for a
+    location and an origin location or language.
 
-    :param from_location: the query string passed into the request.
-    :return: (sql string format, values to include in sql string format)
+    :param network: dictionary of the network's KEY_FIELDS. Missing, None,
+      -1 and null values all stand for NULL.
+    :return: the KEY_FIELDS groups joined by "/", each group's values joined
+      by ",", e.g. "47228,56130,327181/44888,21359,/".
     """
-    from_location = from_location.split(",")
-    if len(from_location) != 3:
-        abort(HTTPStatus.BAD_REQUEST)
-
-    country_id, region_id, city_id = from_location
-
-    # Build string.
-    sql_string_end = ""
-
-    # If country id null?
-    if country_id == "-1" or country_id.lower() == "null":
-        sql_string_end += "AND id_country_origin is NULL "
-        country_id = None
-    else:
-        sql_string_end += "AND id_country_origin=%s "
-
-     # If region id null?
-    if region_id == "-1" or region_id.lower() == "null":
-        sql_string_end += "AND id_region_origin is NULL "
-        region_id = None
-    else:
-        sql_string_end += "AND id_region_origin=%s "
-
-     # If city id null?
-    if city_id == "-1" or city_id.lower() == "null":
-        sql_string_end += "AND id_city_origin is NULL "
-        city_id = None
-    else:
-        sql_string_end += "AND id_city_origin=%s "
-
-    ids_to_return = [
-        id_ for id_ in [country_id, region_id, city_id] if id_
-    ]
-    return (sql_string_end, ids_to_return)
+    def value(field):
+        value = network.get(field)
+        if value is None or str(value).lower().strip() in ('', '-1', 'null'):
+            return ''
+        return str(value)
+
+    return '/'.join(','.join(value(field) for field in fields)
+                    for fields in KEY_FIELDS)
+
+def requested_network_key(near_location, from_location=None, language=None):
+    """Returns the key of the network a request asks for by its locations
+    or language, e.g. GET networks.
+
+    :param near_location: the near_location query string.
+    :param from_location: the from_location query string, if any.
+    :param language: the language query string, if any.
+    :return: the network's key, see network_key.
+    :raises ValueError: if a location is not three ids, each an integer,
+      -1 or null.
+    """
+    network = dict(zip(KEY_FIELDS[0], places.parse_triple(near_location)))
+    if from_location is not None:
+        network.update(zip(KEY_FIELDS[1], places.parse_triple(from_location)))
+    network['language_origin'] = language
+    return network_key(network)
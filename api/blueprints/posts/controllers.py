@@ -1,7 +1,9 @@
 from flask import Blueprint, request
 from api.blueprints.accounts.controllers import auth
 from api.apiutils import *
+from api.httpcache import cache_policy, REVALIDATE
 from api.blueprints.users.utils import get_curr_user_id
+from api import counters, objectcache
 
 
 posts = Blueprint('post', __name__)
@@ -13,16 +15,50 @@ def test():
 
 
 @posts.route("/<post_id>", methods=["GET"])
+@cache_policy(REVALIDATE, lambda post_id: objectcache.etag("posts", post_id))
 def get_post(post_id):
     return get_by_id("posts", post_id)
 
 
+@posts.route("/batch", methods=["GET"])
+@cache_policy(REVALIDATE)
+def get_posts_by_ids():
+    """
+    Gets many posts at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the posts in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    try:
+        ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    return get_by_ids("posts", ids)
+
+
 @posts.route("/reply/<reply_id>", methods=["GET"])
+@cache_policy(REVALIDATE,
+              lambda reply_id: objectcache.etag("post_replies", reply_id))
 def get_post_reply(reply_id):
     return get_by_id("post_replies", reply_id)
 
 
+@posts.route("/reply/batch", methods=["GET"])
+@cache_policy(REVALIDATE)
+def get_post_replies_by_ids():
+    """
+    Gets many post replies at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the post replies in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    try:
+        ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    return get_by_ids("post_replies", ids)
+
+
 @posts.route("/<post_id>/replies", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_post_replies(post_id):
     return get_paginated("SELECT post_replies.* \
                           FROM posts \
@@ -31,18 +67,19 @@ def get_post_replies(post_id):
                           WHERE posts.id=%s",
                           selection_fields=[post_id],
                           args=request.args,
-                          order_clause="ORDER BY id DESC",
-                          order_index_format="post_replies.id <= %s",
-                          order_arg="max_id")
+                          order_keys=("post_replies.id",),
+                          max_arg="max_id",
+                          expansions=("user", "network"))
 
 
 @posts.route("/<post_id>/reply_count", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_post_reply_count(post_id):
     query = "SELECT count(*) \
              as reply_count \
              from post_replies \
              where id_parent=%s"
-    return execute_single_tuple_query(query, (post_id,))
+    return get_count("reply_count", post_id, query)
 
 
 @posts.route("/new", methods=["POST", "PUT"])
@@ -55,7 +92,10 @@ def make_new_post():
         content_fields = ['id_user', 'id_network',
                           'post_text', 'vid_link',
                           'img_link']
-        return execute_post_by_table(req_obj, content_fields, "posts")
+        return execute_post_by_table(
+            req_obj, content_fields, "posts",
+            counts=[counters.Change("post_count",
+                                    (req_obj.form.get("id_network"),), 1)])
     else:
         # PUT
         post = get_by_id("posts", req_obj.form["id"], [])
@@ -75,7 +115,10 @@ def make_new_post_reply(post_id):
     if request.method == "POST":
         # POST
         content_fields = ['id_parent', 'id_user', 'id_network', 'reply_text']
-        return execute_post_by_table(req_obj, content_fields, "post_replies")
+        return execute_post_by_table(
+            req_obj, content_fields, "post_replies",
+            counts=[counters.Change("reply_count",
+                                    (req_obj.form.get("id_parent"),), 1)])
     else:
         # PUT
         reply = get_by_id("post_replies", req_obj.form["id"], [])
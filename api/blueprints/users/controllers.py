@@ -1,9 +1,13 @@
 from flask import Blueprint, request
-from hashlib import md5
 from pymysql.err import IntegrityError
-from api.blueprints.accounts.controllers import auth
+from api.blueprints.accounts.controllers import auth, invalidate_session
 from api.blueprints.users.utils import *
-from api.blueprints.users.utils import _add_user_to_event, _remove_user_from_event
+from api.blueprints.networks.utils import requested_network_key
+from api.httpcache import cache_policy, REVALIDATE
+from api import counters, networkdir, objectcache, passwords
+from api.extensions import mysql
+from api.blueprints.users.utils import _add_user_to_event, \
+    _add_user_to_events, _add_user_to_networks, _remove_user_from_event
 
 users = Blueprint('user', __name__)
 
@@ -19,51 +23,58 @@ def test():
 
 
 def handle_users_get(request):
+    """
+    Lists the users of the network near ``near_location`` and either from
+    ``from_location`` or speaking ``language``, newest first, with one query
+    per page. The network is found in the directory of networks (see
+    :py:mod:`api.networkdir`). Paginated like
+    :py:func:`api.apiutils.get_paginated`.
+    """
     if "near_location" not in request.args:
         return make_response("No near location", HTTPStatus.METHOD_NOT_ALLOWED)
-    count = int(request.args.get("count", 100))
-    # Parse id's into collection
-    near_ids = request.args["near_location"].split(",")
-    near_loc_query = "id_country_cur=%s AND id_region_cur=%s AND id_city_cur=%s"
     if "language" in request.args:
-        near_ids.extend([str(request.args["language"])])
-        query = "SELECT id FROM networks WHERE " + near_loc_query + \
-                " AND id_language_origin=%s"
+        from_location, language = None, request.args["language"]
     elif "from_location" in request.args:
-        near_ids.extend(request.args["from_location"].split(","))
-        query = "SELECT id FROM networks WHERE " + near_loc_query + " AND " \
-                + near_loc_query.replace("cur", "origin")
+        from_location, language = request.args["from_location"], None
     else:
         return make_response("No language/from location",
                              HTTPStatus.METHOD_NOT_ALLOWED)
-    network_ids, network_des = execute_get_all(query, tuple(near_ids))
-
-    if len(network_ids) == 0:
-        return make_response(jsonify([]), HTTPStatus.OK)
-    # Now we need to get all the users subscribed to these networks.
-    sql_query_string = "SELECT id_user FROM network_registration " \
-                       "WHERE id_network IN %s"
-    sql_order_string = "ORDER BY id_user DESC"
-    if "max_id" in request.args:
-        sql_query_string += " AND id_user<=%s"
-        args = (network_ids, request.args["max_id"])
-    else:
-        args = (network_ids,)
-    user_ids, user_id_des = \
-        execute_get_many(sql_query_string + sql_order_string, args, count)
-
-    if len(user_ids) == 0:
-        return make_response(jsonify([]), HTTPStatus.OK)
-    user_query = "SELECT * FROM users WHERE id IN %s"
-    user_arg = (tuple(user_ids),)
-    user_items, user_descr = execute_get_all(user_query, user_arg)
-
-    users_obj = convert_objects(user_items, user_descr)
-    for user_obj in users_obj:
-        user_obj.pop('password', None)
-        user_obj.pop('email', None)
-
-    return make_response(jsonify(users_obj), HTTPStatus.OK)
+    try:
+        key = requested_network_key(request.args["near_location"],
+                                    from_location, language)
+    except ValueError:
+        return make_response("Invalid location", HTTPStatus.BAD_REQUEST)
+    try:
+        count = pagination.page_size(request.args)
+        bounds, bound_args = pagination.page_bounds(
+            request.args, ("network_registration.id_user",), "max_id")
+    except ValueError:
+        return make_response("Invalid pagination parameters",
+                             HTTPStatus.BAD_REQUEST)
+    network_id = networkdir.find(key)
+    if network_id is None:
+        return pagination.add_page_headers(
+            make_response(jsonify([]), HTTPStatus.OK), None)
+    # The page is cut from the registrations, newest member first, before
+    # joining users, so only one page of members is read whatever the size
+    # of the network.
+    columns = ", ".join("users.%s" % column for column in PUBLIC_USER_COLUMNS)
+    query = "SELECT " + columns + " FROM users INNER JOIN (" \
+            "SELECT network_registration.id_user " \
+            "FROM network_registration " \
+            "WHERE network_registration.id_network=%s" + bounds + " " + \
+            pagination.order_by(("network_registration.id_user",)) + \
+            " LIMIT %s) AS members ON members.id_user = users.id " + \
+            pagination.order_by(("users.id",))
+    items, descr = execute_get_all(query,
+                                   (network_id, *bound_args, count + 1))
+    next_cursor = None
+    if len(items) > count:
+        next_cursor = pagination.row_cursor(items[count], descr, ("users.id",))
+    response = make_response(
+        jsonify(list(map(public_factory(descr), items[:count]))),
+        HTTPStatus.OK)
+    return pagination.add_page_headers(response, next_cursor)
 
 
 def validate_new_user(form, content_fields):
@@ -78,10 +89,11 @@ def validate_new_user(form, content_fields):
     if not validate_request_body(form, content_fields):
         return False
     content_fields.append("img_link")
-    return get_user_by_email(form['email']) is None and get_user_by_username(form['username']) is None
+    return not user_exists(form['email'], form['username'])
 
 
 @users.route("/users", methods=["GET", "POST"])
+@cache_policy(REVALIDATE)
 def users_query():
     if request.method == 'GET':
         return handle_users_get(request)
@@ -96,9 +108,16 @@ def users_query():
         req_obj = make_fake_request_obj(request)
         # validate that username/email doesn't already exist.
         if validate_new_user(req_obj.form, content_fields):
-            # We now need to convert the user password into a hash.
-            password = str(req_obj.form['password'])
-            req_obj.form['password'] = md5(password.encode('utf-8')).hexdigest()
+            # We now need to convert the user password into a hash. Hashing
+            # may wait for the pool (see api/passwords.py), so let other
+            # requests use the connection meanwhile.
+            mysql.release()
+            try:
+                req_obj.form['password'] = passwords.make_hash(
+                    str(req_obj.form['password']))
+            except passwords.Busy:
+                return make_response("Too many requests, try again later",
+                                     HTTPStatus.SERVICE_UNAVAILABLE)
             return execute_post_by_table(req_obj, content_fields, "users")
         else:
             return make_response("Username already taken or invalid params", HTTPStatus.BAD_REQUEST)
@@ -110,18 +129,46 @@ def update_user():
     req_obj = make_fake_request_obj(request)
     req_obj.form["id"] = get_curr_user_id()
     if 'password' in req_obj.form:
-        # We now need to convert the user password into a hash.
-        password = str(req_obj.form['password'])
-        req_obj.form['password'] = md5(password.encode('utf-8')).hexdigest()
-    return execute_put_by_id(request, "users")
+        # We now need to convert the user password into a hash, letting
+        # other requests use the connection meanwhile.
+        mysql.release()
+        try:
+            req_obj.form['password'] = passwords.make_hash(
+                str(req_obj.form['password']))
+        except passwords.Busy:
+            return make_response("Too many requests, try again later",
+                                 HTTPStatus.SERVICE_UNAVAILABLE)
+    response = execute_put_by_id(request, "users")
+    invalidate_session(req_obj.form["id"])
+    return response
 
 
 @users.route("/<user_id>", methods=["GET"])
+@cache_policy(REVALIDATE, lambda user_id: objectcache.etag(
+    "users", user_id, PRIVATE_USER_COLUMNS))
 def get_user(user_id):
-    return get_by_id("users", user_id, ["email", "password"])
+    return get_by_id("users", user_id, PRIVATE_USER_COLUMNS,
+                     public_factory)
+
+
+@users.route("/batch", methods=["GET"])
+@cache_policy(REVALIDATE)
+def get_users_by_ids():
+    """
+    Gets many users at once, by the comma separated ``ids`` query parameter.
+    :return: JSON list of the users in the order requested, with ``null`` for
+    ids that do not exist.
+    """
+    try:
+        ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    return get_by_ids("users", ids, PRIVATE_USER_COLUMNS,
+                      factory=public_factory)
 
 
 @users.route("/<user_id>/networks", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_user_networks(user_id):
     return get_paginated("SELECT networks.*, join_date \
                           FROM network_registration \
@@ -130,24 +177,25 @@ def get_user_networks(user_id):
                           WHERE network_registration.id_user=%s",
                          selection_fields=[user_id],
                          args=request.args,
-                         order_clause="ORDER BY join_date DESC",
-                         order_index_format="join_date <= %s",
-                         order_arg="max_registration_date")
+                         order_keys=("join_date", "networks.id"),
+                         max_arg="max_registration_date")
 
 
 @users.route("/<user_id>/posts", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_user_posts(user_id):
     return get_paginated("SELECT * \
                           FROM posts \
                           WHERE id_user=%s",
                          selection_fields=[user_id],
                          args=request.args,
-                         order_clause="ORDER BY id DESC",
-                         order_index_format="id <= %s",
-                         order_arg="max_id")
+                         order_keys=("id",),
+                         max_arg="max_id",
+                         expansions=("user", "network", "reply_count"))
 
 
 @users.route("/<user_id>/events", methods=["GET"])
+@cache_policy(REVALIDATE)
 def get_user_events(user_id):
     return get_paginated("SELECT events.* \
                           FROM event_registration \
@@ -156,9 +204,9 @@ def get_user_events(user_id):
                           WHERE event_registration.id_guest=%s AND event_registration.job=%s",
                          selection_fields=[user_id, request.args["role"]],
                          args=request.args,
-                         order_clause="ORDER BY id_event DESC",
-                         order_index_format="id <= %s",
-                         order_arg="max_id")
+                         order_keys=("events.id",),
+                         max_arg="max_id",
+                         expansions=("host", "network", "reg_count"))
 
 
 @users.route("/joinEvent/<event_id>", methods=["POST"])
@@ -195,13 +243,55 @@ def add_user_to_network(network_id):
             "(%s, %s, CURRENT_TIMESTAMP)"
     args = (str(user_id), str(network_id))
     try:
-        execute_mod(query, args)
+        execute_mod(query, args,
+                    counts=[counters.Change("user_count", (network_id,), 1)])
     except IntegrityError:
         return make_response("User already subscribed",
                              HTTPStatus.METHOD_NOT_ALLOWED)
     return make_response("OK", HTTPStatus.OK)
 
 
+@users.route("/joinNetworks", methods=["POST"])
+@auth.login_required
+def add_user_to_networks():
+    """
+    Joins the current user to every network in the ``ids`` list of the JSON
+    body (or the comma separated ``ids`` query parameter) at once.
+    :return: JSON list with an ``id`` and a ``result`` for each network.
+    """
+    try:
+        network_ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    results = _add_user_to_networks(get_curr_user_id(), network_ids)
+    return make_response(jsonify([{"id": id_, "result": result}
+                                  for id_, result in results.items()]),
+                         HTTPStatus.OK)
+
+
+@users.route("/joinEvents", methods=["POST"])
+@auth.login_required
+def add_user_to_events():
+    """
+    Registers the current user to every event in the ``ids`` list of the
+    JSON body (or the comma separated ``ids`` query parameter) at once, with
+    the role given by the ``role`` query parameter.
+    :return: JSON list with an ``id`` and a ``result`` for each event.
+    """
+    if request.args.get("role") not in ("host", "guest"):
+        return make_response("Invalid role parameter.",
+                             HTTPStatus.METHOD_NOT_ALLOWED)
+    try:
+        event_ids = get_id_list(request)
+    except ValueError as e:
+        return make_response(str(e), HTTPStatus.BAD_REQUEST)
+    results = _add_user_to_events(get_curr_user_id(), event_ids,
+                                  request.args["role"])
+    return make_response(jsonify([{"id": id_, "result": result}
+                                  for id_, result in results.items()]),
+                         HTTPStatus.OK)
+
+
 @users.route("/leaveNetwork/<network_id>", methods=["DELETE"])
 @auth.login_required
 def remove_user_from_network(network_id):
@@ -209,6 +299,7 @@ def remove_user_from_network(network_id):
     query = "DELETE FROM network_registration WHERE id_user=%s AND " \
             "id_network=%s"
     args = (user_id, network_id)
-    execute_mod(query, args)
+    execute_mod(query, args,
+                counts=[counters.Change("user_count", (network_id,), -1)])
     return make_response("User " + str(user_id) + " left network " +
                          str(network_id), HTTPStatus.OK)
@@ -1,57 +1,68 @@
 from api.apiutils import *
+from api import counters, existence
+from api.usermodel import PUBLIC_FIELDS, PRIVATE_COLUMNS, public_factory, \
+    user_factory
 from api.extensions import mysql
+import collections
 from flask import g
 """
 Utility module for querying users based on certain information.
 """
 
+# Columns of users that anyone may see. Leaves out the email, password and
+# the activation and password reset codes.
+PUBLIC_USER_COLUMNS = PUBLIC_FIELDS
+PRIVATE_USER_COLUMNS = list(PRIVATE_COLUMNS)
 
-def get_user_by_email(email):
+
+def get_user_by_login(login):
     """
-    Checks database and returns object representing user with that username.
-    :param email: email of CultureMesh account (string)
-    :return: user_obj from db or None if no corresponding found.
+    Finds the user logging in with an email or username, with one query.
+    :param login: email or username of CultureMesh account (string)
+    :return: api.usermodel.User from db or None if no corresponding found.
+    A user whose email it is comes before one whose username it is.
     """
-    query = "SELECT * FROM users WHERE email=%s"
-    item, desc = execute_get_one(query, (email,))
+    query = "SELECT * FROM users WHERE email=%s OR username=%s " \
+            "ORDER BY email=%s DESC LIMIT 1"
+    item, desc = execute_get_one(query, (login, login, login))
     if item is None:
         return None
-    user = convert_objects([item], desc)[0]
-    return user
+    return user_factory(desc)(item)
+
+
+def user_exists(email, username):
+    """
+    Checks whether an email or username is taken, with one query.
+    :param email: email of a new CultureMesh account (string)
+    :param username: username of a new CultureMesh account (string)
+    :return: True if a user has that email or that username.
+    """
+    query = "SELECT id FROM users WHERE email=%s OR username=%s LIMIT 1"
+    item, _ = execute_get_one(query, (email, username))
+    return item is not None
 
 
 def get_user_by_id(id):
     """
     Checks database and returns object representing user with that id.
     :param id: id of CultureMesh account (string)
-    :return: user_obj from db or None if no corresponding found.
+    :return: api.usermodel.User from db or None if no corresponding found.
     """
-    connection = mysql.get_db()
-    cursor = connection.cursor()
-    # Note table_name is never supplied by a client, so we do not
-    # need to escape it.
     query = "SELECT * FROM users WHERE id=%s"
-    cursor.execute(query, (id,))
-    user_db_tuple = cursor.fetchone()
+    user_db_tuple, description = fetch_one(mysql.get_db(), query, (id,))
     if user_db_tuple is None:
         return None
-    user = convert_objects([user_db_tuple], cursor.description)[0]
-    cursor.close()
-    return user
+    return user_factory(description)(user_db_tuple)
 
 
-def get_user_by_username(username):
+def set_password_hash(user_id, password_hash):
     """
-    Checks database and returns object representing user with that id.
-    :param username: id of CultureMesh account (string)
-    :return: user_obj from db or None if no corresponding found.
+    Stores a new hash of a user's password, e.g. by a stronger hasher.
+    :param user_id: id of CultureMesh account
+    :param password_hash: the hash, from api.passwords
     """
-    query = "SELECT * FROM users WHERE username=%s"
-    item, desc = execute_get_one(query, (username,))
-    if item is None:
-        return None
-    user = convert_objects([item], desc)[0]
-    return user
+    execute_mod("UPDATE users SET password=%s WHERE id=%s",
+                (password_hash, user_id))
 
 
 def _add_user_to_event(user_id, event_id, role):
@@ -64,7 +75,8 @@ def _add_user_to_event(user_id, event_id, role):
     args = (user_id, event_id, role)
     query = "INSERT INTO event_registration VALUES " \
             "(%s,%s,CURRENT_TIMESTAMP, %s)"
-    execute_insert(query, args)
+    execute_insert(query, args,
+                   counts=[counters.Change("reg_count", (event_id,), 1)])
 
 
 def _remove_user_from_event(user_id, event_id):
@@ -75,7 +87,75 @@ def _remove_user_from_event(user_id, event_id):
     """
     query = "DELETE FROM event_registration WHERE id_event=%s AND id_guest=%s"
     args = (event_id, user_id)
-    execute_mod(query, args)
+    execute_mod(query, args,
+                counts=[counters.Change("reg_count", (event_id,), -1)])
+
+
+def _add_user_to_networks(user_id, network_ids):
+    """
+    Joins a user to many networks in one transaction.
+    :param user_id: id of user
+    :param network_ids: list of integer network ids
+    :return: dictionary mapping each network id to "joined",
+    "already subscribed" or "invalid".
+    """
+    return _add_registrations(
+        network_ids, existence.existing_ids('networks', network_ids),
+        "SELECT id_network FROM network_registration "
+        "WHERE id_user=%s AND id_network IN %s",
+        "INSERT IGNORE INTO network_registration VALUES",
+        "(%s, %s, CURRENT_TIMESTAMP)",
+        lambda network_id: (user_id, network_id),
+        user_id, "already subscribed", "user_count")
+
+
+def _add_user_to_events(user_id, event_ids, role):
+    """
+    Registers a user to many events in one transaction.
+    :param user_id: id of user
+    :param event_ids: list of integer event ids
+    :param role: either "host" or "guest"
+    :return: dictionary mapping each event id to "joined",
+    "already registered" or "invalid".
+    """
+    return _add_registrations(
+        event_ids, existence.existing_ids('events', event_ids),
+        "SELECT id_event FROM event_registration "
+        "WHERE id_guest=%s AND id_event IN %s",
+        "INSERT IGNORE INTO event_registration VALUES",
+        "(%s,%s,CURRENT_TIMESTAMP, %s)",
+        lambda event_id: (user_id, event_id, role),
+        user_id, "already registered", "reg_count")
+
+
+def _add_registrations(ids, valid_ids, registered_query, insert_query,
+                       row_format, make_row, user_id, registered_result,
+                       count_kind):
+    """
+    Shared logic of :py:func:`_add_user_to_networks` and
+    :py:func:`_add_user_to_events`: looks up which of the valid ids the user
+    is already registered to in one query, and inserts the rest, and counts
+    them in the ``count_kind`` counters, in one transaction.
+    """
+    registered = set()
+    if valid_ids:
+        # Read from the primary so a registration made a moment ago counts.
+        rows, _ = fetch_all(mysql.get_db(), registered_query,
+                            (user_id, tuple(sorted(valid_ids))))
+        registered = {row[0] for row in rows}
+    to_add = [id_ for id_ in ids if id_ in valid_ids and id_ not in registered]
+    execute_insert_rows(insert_query, row_format,
+                        [make_row(id_) for id_ in to_add],
+                        counts=[counters.Change(count_kind, to_add, 1)])
+    results = collections.OrderedDict()
+    for id_ in ids:
+        if id_ not in valid_ids:
+            results[id_] = "invalid"
+        elif id_ in registered:
+            results[id_] = registered_result
+        else:
+            results[id_] = "joined"
+    return results
 
 
 def get_curr_user_id():
@@ -0,0 +1,129 @@
+"""
+In-process caches with per-entry expiry.
+
+Each worker process keeps its own caches, so anything cached here may be
+stale in the other workers until it expires. Callers pick TTLs with that in
+mind and invalidate locally on the write paths they know about.
+
+Every cache registers itself by name, so that monitoring can report on all of
+them and tests can reset them between cases with :py:func:`clear_all`.
+"""
+import collections
+import threading
+import time
+
+# Name -> TTLCache, for every cache created.
+registry = {}
+
+class TTLCache(object):
+    """
+    A thread-safe, size-bounded LRU cache whose entries expire.
+    """
+
+    def __init__(self, name, maxsize, ttl, sizeof=None):
+        """
+        :param name: A unique name for monitoring.
+        :param maxsize: The most entries to keep. The least recently used
+                        entry is evicted to make room.
+        :param ttl: Default seconds an entry stays fresh.
+        :param sizeof: Optional function returning the size in bytes of a
+                       value, to report the memory the values take up.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+        registry[name] = self
+
+    def get(self, key, default=None):
+        """
+        :param key: The key to look up
+        :param default: What to return if the key is missing or expired
+        :return: The cached value, or ``default``
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                self._remove(key)
+            self._stats['misses'] += 1
+            return default
+
+    def _remove(self, key):
+        """
+        Drops an entry. Must be called holding the lock.
+        """
+        value, _ = self._entries.pop(key)
+        if self.sizeof is not None:
+            self._bytes -= self.sizeof(value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """
+        :param key: The key to store under
+        :param value: The value to store
+        :param ttl: Seconds the entry stays fresh, if not the default
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires)
+            if self.sizeof is not None:
+                self._bytes += self.sizeof(value)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        """
+        Drops an entry, if present.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: A dictionary of cache counters suitable for monitoring.
+        """
+        with self._lock:
+            stats = {'size': len(self._entries), 'maxsize': self.maxsize}
+            if self.sizeof is not None:
+                stats['bytes'] = self._bytes
+            for key in ('hits', 'misses', 'evictions', 'invalidations'):
+                stats[key] = self._stats[key]
+        return stats
+
+
+def clear_all():
+    """
+    Empties every registered cache.
+    """
+    for cache in registry.values():
+        cache.clear()
+
+
+def all_stats():
+    """
+    :return: Dictionary mapping each cache's name to its stats.
+    """
+    return {name: cache.stats() for name, cache in registry.items()}
@@ -3,3 +3,77 @@ Contains configuration values for the API.
 """
 
 AUTH_TOKEN_EXPIRATION_SECS = 60 ** 2 * 24 * 3  # Three days
+
+# Verified auth tokens and the users they belong to are cached for up to
+# SESSION_CACHE_TTL seconds, so a password change made through another worker
+# process takes up to that long to revoke older tokens there. See
+# api/blueprints/accounts/controllers.py.
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 60
+
+# Passwords are hashed by PASSWORD_HASHER, on a pool of PASSWORD_HASH_WORKERS
+# threads that at most PASSWORD_HASH_QUEUE more hashes may wait for. See
+# api/passwords.py.
+PASSWORD_HASHER = 'pbkdf2_sha256'
+PASSWORD_HASH_ITERATIONS = 100000
+PASSWORD_HASH_WORKERS = 4
+PASSWORD_HASH_QUEUE = 64
+
+# Connection pool defaults. Each can be overridden by a setting of the same
+# name in the ``sql`` dictionary of the credentials file.
+MYSQL_POOL_SIZE = 10
+MYSQL_POOL_MAX_LIFETIME = 60 * 30  # Recycle connections every half hour
+MYSQL_POOL_TIMEOUT = 5  # Seconds to wait for a free connection
+MYSQL_POOL_PING_INTERVAL = 30  # Ping connections idle for this many seconds
+
+# Read replicas. Replicas lagging by more than MYSQL_REPLICA_MAX_LAG seconds
+# are skipped, and a client's reads go to the primary for
+# MYSQL_READ_YOUR_WRITES_WINDOW seconds after it writes. See api/pool.py.
+MYSQL_REPLICA_MAX_LAG = 5
+MYSQL_REPLICA_LAG_CHECK_INTERVAL = 5  # Seconds between replica lag probes
+MYSQL_READ_YOUR_WRITES_WINDOW = 10
+
+# Existence checks. Ids known to exist are cached for EXISTENCE_TTL seconds,
+# ids known not to exist only for EXISTENCE_NEGATIVE_TTL. See api/existence.py.
+EXISTENCE_CACHE_SIZE = 50000
+EXISTENCE_TTL = 60 * 5
+EXISTENCE_NEGATIVE_TTL = 5
+
+# Objects served by get_by_id are cached for OBJECT_CACHE_TTL seconds. See
+# api/objectcache.py.
+OBJECT_CACHE_SIZE = 20000
+OBJECT_CACHE_TTL = 60 * 10
+
+# Locations missing from the reference data snapshot are cached for
+# PLACE_CACHE_TTL seconds when looked up. See api/places.py.
+PLACE_CACHE_SIZE = 20000
+PLACE_CACHE_TTL = 60 * 60
+
+# Reference data (locations and languages). Bump REFERENCE_DATA_VERSION to
+# give clients new versioned URLs. Payloads of at least GZIP_MIN_SIZE bytes
+# are also kept gzipped. Every REFERENCE_DATA_CHECK_SECS seconds the tables
+# are checked for new or deleted rows. See api/refdata.py.
+REFERENCE_DATA_VERSION = 1
+REFERENCE_DATA_CHECK_SECS = 60
+GZIP_MIN_SIZE = 1024
+
+# Whether the count endpoints count rows on every request instead of reading
+# the maintained counters. Counters are kept up to date either way. See
+# api/counters.py.
+LIVE_COUNTS = False
+
+# /network/popular serves the top LEADERBOARD_SIZE networks of each
+# leaderboard from memory, rebuilt every LEADERBOARD_REFRESH_SECS seconds.
+# See api/leaderboard.py.
+LEADERBOARD_SIZE = 1000
+LEADERBOARD_REFRESH_SECS = 60
+
+# Pagination. Clients may ask for up to MAX_PAGE_SIZE items per page.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# The most ids a bulk endpoint (e.g. /user/joinNetworks) accepts at once.
+MAX_IDS_PER_REQUEST = 100
+
+# Tables whose schemas are loaded at startup to validate client writes.
+VALIDATED_TABLES = ('users', 'posts', 'post_replies', 'events', 'networks')
@@ -0,0 +1,264 @@
+"""
+Maintained counts of posts per network, members per network, replies per
+post and registrations per event.
+
+Counting these with ``count(*)`` reads every counted row, so the count
+endpoints read a single row of the ``counters`` table (see :py:data:`SCHEMA`)
+instead.
+
+Statements that add or remove counted rows are run with a list of
+:py:class:`Change`, which ``execute_mod`` and ``execute_insert_rows`` apply
+in the same transaction. A counter is created from a live count by the first
+write that changes it, or by :py:func:`reconcile`; reads never write, so
+they can be served by replicas, and count the rows of subjects without a
+counter instead. Counters can still drift, e.g. when rows are changed by
+hand, and :py:func:`reconcile` (run by ``bin/reconcile_counters.py``)
+repairs them. Setting ``LIVE_COUNTS`` in ``api/config.py`` makes the
+endpoints count the source tables again.
+"""
+import collections
+import time
+
+from api import querylog
+from api.extensions import mysql
+
+SCHEMA = """
+CREATE TABLE counters (
+    kind VARCHAR(32) NOT NULL,
+    id_subject BIGINT NOT NULL,
+    value BIGINT NOT NULL,
+    PRIMARY KEY (kind, id_subject)
+);
+"""
+
+# Kind -> (table of the subjects, table of the counted rows, column of the
+# counted rows holding the subject's id). Kinds are named after the
+# endpoints' response fields.
+KINDS = {
+    'post_count': ('networks', 'posts', 'id_network'),
+    'user_count': ('networks', 'network_registration', 'id_network'),
+    'reply_count': ('posts', 'post_replies', 'id_parent'),
+    'reg_count': ('events', 'event_registration', 'id_event'),
+}
+
+# Counters repaired per statement by reconcile().
+RECONCILE_BATCH_SIZE = 1000
+
+# Adds ``delta`` to the ``kind`` counter of each of the subjects ``ids``.
+Change = collections.namedtuple('Change', ['kind', 'ids', 'delta'])
+
+
+def _execute(cursor, sql, args):
+    started = time.perf_counter()
+    cursor.execute(sql, args)
+    querylog.record(sql, args, cursor.rowcount, started)
+    return cursor.rowcount
+
+
+def _live_count(kind, subject_id):
+    """
+    :param kind: One of :py:data:`KINDS`
+    :param subject_id: The SQL expression of the subject's id
+    :return: A subquery counting the subject's rows
+    """
+    _, table, column = KINDS[kind]
+    return "(SELECT count(*) FROM `%s` WHERE `%s` = %s)" \
+        % (table, column, subject_id)
+
+
+def _create(cursor, kind, ids):
+    """
+    Creates the counters of those of the subjects ``ids`` that exist and
+    have none, from live counts.
+    """
+    parent = KINDS[kind][0]
+    return _execute(cursor,
+                    "INSERT IGNORE INTO counters (kind, id_subject, value) "
+                    "SELECT %%s, id, %s FROM `%s` WHERE id IN %%s"
+                    % (_live_count(kind, "`%s`.id" % parent), parent),
+                    (kind, ids))
+
+
+def _subject_ids(change):
+    if change.kind not in KINDS:
+        raise ValueError("Unknown counter %s" % change.kind)
+    return tuple(collections.OrderedDict.fromkeys(
+        id_ for id_ in change.ids if id_ is not None))
+
+
+def apply(cursor, changes, rows=1):
+    """
+    Updates counters inside the caller's transaction, creating those that
+    do not exist yet.
+
+    :param cursor: A cursor on the connection running the transaction
+    :param changes: Iterable of :py:class:`Change`
+    :param rows: The number of rows the statement that made the changes
+                 affected. Each change's delta is applied once per row, so
+                 e.g. a DELETE that matched nothing changes no counter.
+    """
+    if not rows:
+        return
+    for change in changes:
+        ids = _subject_ids(change)
+        if not ids:
+            continue
+        updated = _execute(cursor, "UPDATE counters SET value = value + %s "
+                                   "WHERE kind=%s AND id_subject IN %s",
+                           (change.delta * rows, change.kind, ids))
+        # The new counters count the rows this transaction changed.
+        if updated < len(ids):
+            _create(cursor, change.kind, ids)
+
+
+def recount(cursor, changes):
+    """
+    Sets the counters of the changes' subjects from live counts inside the
+    caller's transaction, for statements that may have changed fewer rows
+    than the changes say, e.g. an ``INSERT IGNORE`` that ignored some.
+
+    :param cursor: A cursor on the connection running the transaction
+    :param changes: Iterable of :py:class:`Change`
+    """
+    for change in changes:
+        ids = _subject_ids(change)
+        if not ids:
+            continue
+        _execute(cursor, "UPDATE counters SET value = %s "
+                         "WHERE kind=%%s AND id_subject IN %%s"
+                         % _live_count(change.kind, "counters.id_subject"),
+                 (change.kind, ids))
+        _create(cursor, change.kind, ids)
+
+
+def get(kind, subject_id):
+    """
+    :param kind: One of :py:data:`KINDS`
+    :param subject_id: The id of the network, post or event
+    :return: The count
+    """
+    try:
+        subject_id = int(subject_id)
+    except (TypeError, ValueError):
+        return 0
+    return get_many(kind, (subject_id,)).get(subject_id, 0)
+
+
+def get_many(kind, subject_ids):
+    """
+    Reads many counters of a kind in at most two read-only queries, counting
+    the rows of subjects that have no counter yet.
+
+    :param kind: One of :py:data:`KINDS`
+    :param subject_ids: Ids of networks, posts or events
+    :return: Dictionary mapping each of the ids, as integers, that belongs
+             to an existing subject to its count
+    """
+    # Imported here because apiutils imports this module.
+    from api.apiutils import fetch_all
+    subject_ids = tuple(sorted({int(id_) for id_ in subject_ids}))
+    if not subject_ids:
+        return {}
+    query = "SELECT id_subject, value FROM counters " \
+            "WHERE kind=%s AND id_subject IN %s"
+    rows, _ = fetch_all(mysql.get_db(read_only=True), query,
+                        (kind, subject_ids))
+    counts = {row[0]: row[1] for row in rows}
+    missing = tuple(id_ for id_ in subject_ids if id_ not in counts)
+    if not missing:
+        return counts
+    # Subjects that do not exist are left out.
+    parent = KINDS[kind][0]
+    rows, _ = fetch_all(mysql.get_db(read_only=True),
+                        "SELECT id, %s FROM `%s` WHERE id IN %%s"
+                        % (_live_count(kind, "`%s`.id" % parent), parent),
+                        (missing,))
+    counts.update((row[0], row[1]) for row in rows)
+    return counts
+
+
+def count_live(kind, subject_ids):
+    """
+    Counts rows directly rather than reading counters, in one query.
+
+    :param kind: One of :py:data:`KINDS`
+    :param subject_ids: Ids of networks, posts or events
+    :return: Dictionary mapping the ids with a non-zero count to the count
+    """
+    from api.apiutils import execute_get_all
+    subject_ids = tuple(sorted(set(subject_ids)))
+    if not subject_ids:
+        return {}
+    _, table, column = KINDS[kind]
+    rows, _ = execute_get_all("SELECT `%s`, count(*) FROM `%s` "
+                              "WHERE `%s` IN %%s GROUP BY `%s`"
+                              % (column, table, column, column),
+                              (subject_ids,))
+    return {row[0]: row[1] for row in rows}
+
+
+def forget(kind, subject_id):
+    """
+    Deletes a counter, e.g. because its subject was deleted.
+
+    :param kind: One of :py:data:`KINDS`
+    :param subject_id: The id of the network, post or event
+    """
+    from api.apiutils import execute_mod
+    execute_mod("DELETE FROM counters WHERE kind=%s AND id_subject=%s",
+                (kind, subject_id))
+
+
+def reconcile(kinds=None):
+    """
+    Sets every counter that differs from a live count to the live count,
+    creates the counters of subjects that have none, and deletes counters
+    whose subject no longer exists.
+
+    Drifted counters are found without locking, then repaired
+    ``RECONCILE_BATCH_SIZE`` at a time, each from a fresh count taken in the
+    repairing statement so that writes made in between are not lost.
+
+    :param kinds: The kinds of counter to check, or ``None`` for all
+    :return: Dictionary mapping each kind to the number of counters
+             repaired or created
+    """
+    from api.apiutils import fetch_all
+    repaired = {}
+    connection = mysql.get_db()
+    for kind in sorted(kinds or KINDS):
+        parent = KINDS[kind][0]
+        live = _live_count(kind, "counters.id_subject")
+        rows, _ = fetch_all(connection,
+                            "SELECT id_subject FROM counters "
+                            "WHERE kind=%%s AND value <> %s" % live, (kind,))
+        ids = [row[0] for row in rows]
+        cursor = connection.cursor()
+        try:
+            count = _execute(cursor,
+                             "DELETE FROM counters WHERE kind=%%s AND "
+                             "id_subject NOT IN (SELECT id FROM `%s`)"
+                             % parent, (kind,))
+            for start in range(0, len(ids), RECONCILE_BATCH_SIZE):
+                batch = tuple(ids[start:start + RECONCILE_BATCH_SIZE])
+                count += _execute(cursor,
+                                  "UPDATE counters SET value = %s "
+                                  "WHERE kind=%%s AND id_subject IN %%s"
+                                  % live, (kind, batch))
+                connection.commit()
+            count += _execute(cursor,
+                              "INSERT IGNORE INTO counters "
+                              "(kind, id_subject, value) "
+                              "SELECT %%s, id, %s FROM `%s` WHERE id NOT IN "
+                              "(SELECT id_subject FROM counters "
+                              "WHERE kind=%%s)"
+                              % (_live_count(kind, "`%s`.id" % parent),
+                                 parent), (kind, kind))
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        connection.commit()
+        repaired[kind] = count
+    return repaired
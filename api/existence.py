@@ -0,0 +1,89 @@
+"""
+Answers whether rows with given ids exist, for validating endpoint input.
+
+Only the primary key is selected, and answers are cached: an id that exists
+is remembered for ``EXISTENCE_TTL`` seconds, and one that does not for just
+``EXISTENCE_NEGATIVE_TTL`` seconds, since it may be created at any moment.
+Paths that delete rows call :py:func:`forget` so this process stops vouching
+for them straight away; other worker processes find out when their entries
+expire.
+"""
+from api import cache, config
+from api.extensions import mysql
+
+TABLES = ('events', 'users', 'networks')
+
+_cache = cache.TTLCache('existence', config.EXISTENCE_CACHE_SIZE,
+                        config.EXISTENCE_TTL)
+
+
+def _normalize(id_):
+    """
+    :return: ``id_`` as an integer, or ``None`` if it cannot be an id
+    """
+    try:
+        return int(id_)
+    except (TypeError, ValueError):
+        return None
+
+
+def existing_ids(table_name, ids):
+    """
+    Finds which of many ids exist, with at most one query for the ids that
+    are not cached.
+
+    :param table_name: One of :py:data:`TABLES`. Never client supplied.
+    :param ids: Iterable of ids, as integers or strings
+    :return: Set of the ids that exist, as integers
+    """
+    # Imported here because apiutils imports this module.
+    from api.apiutils import fetch_all
+    if table_name not in TABLES:
+        raise ValueError("Unknown table %s" % table_name)
+    found = set()
+    unknown = set()
+    for id_ in ids:
+        id_ = _normalize(id_)
+        if id_ is None:
+            continue
+        cached = _cache.get((table_name, id_))
+        if cached is None:
+            unknown.add(id_)
+        elif cached:
+            found.add(id_)
+    if unknown:
+        # Existence guards writes, so ask the primary rather than a replica.
+        rows, _ = fetch_all(mysql.get_db(),
+                            "SELECT id FROM `%s` WHERE id IN %%s"
+                            % table_name, (tuple(sorted(unknown)),))
+        present = {row[0] for row in rows}
+        for id_ in unknown:
+            if id_ in present:
+                _cache.set((table_name, id_), True)
+            else:
+                _cache.set((table_name, id_), False,
+                           config.EXISTENCE_NEGATIVE_TTL)
+        found |= present
+    return found
+
+
+def exists(table_name, id_):
+    """
+    :param table_name: One of :py:data:`TABLES`. Never client supplied.
+    :param id_: The id to check
+    :return: ``True`` if a row with the id exists
+    """
+    id_ = _normalize(id_)
+    return id_ is not None and id_ in existing_ids(table_name, (id_,))
+
+
+def forget(table_name, id_):
+    """
+    Drops what is cached about an id, e.g. because the row was deleted.
+
+    :param table_name: One of :py:data:`TABLES`
+    :param id_: The id whose row changed
+    """
+    id_ = _normalize(id_)
+    if id_ is not None:
+        _cache.delete((table_name, id_))
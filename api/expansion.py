@@ -0,0 +1,86 @@
+"""
+Embeds related resources in the items of a paginated response.
+
+Items in lists such as ``/network/<id>/posts`` refer to other resources by
+id (``id_user``, ``id_network``, ...). A client may ask for some of those to
+be embedded with the ``expand`` query parameter, e.g.
+``?expand=user,reply_count``, instead of fetching them one request per item.
+Each expansion is loaded for the whole page at once, so a page costs one
+extra query per expansion (a few more for counters that do not exist yet)
+whatever its size.
+
+Routes list the expansions they allow when calling ``get_paginated``.
+"""
+import collections
+
+from api import config, counters, usermodel
+
+# ``field`` is where the loaded value is put in each item, ``key`` the
+# item's field holding the id to look up and ``load`` a function taking a
+# list of ids and returning a dictionary of the values found by id.
+Expansion = collections.namedtuple('Expansion', ['field', 'key', 'load'])
+
+
+def _objects(table_name, fields_to_omit=(), factory=None):
+    def load(ids):
+        # Imported here because apiutils imports this module.
+        from api.apiutils import get_objects_by_ids
+        return get_objects_by_ids(table_name, ids, fields_to_omit, factory)
+    return load
+
+
+def _counts(kind):
+    def load(ids):
+        if config.LIVE_COUNTS:
+            counts = counters.count_live(kind, ids)
+        else:
+            counts = counters.get_many(kind, ids)
+        return {id_: counts.get(id_, 0) for id_ in ids}
+    return load
+
+
+_users = _objects('users', factory=usermodel.public_factory)
+
+EXPANSIONS = {
+    'user': Expansion('user', 'id_user', _users),
+    'host': Expansion('host', 'id_host', _users),
+    'network': Expansion('network', 'id_network', _objects('networks')),
+    'reply_count': Expansion('reply_count', 'id', _counts('reply_count')),
+    'reg_count': Expansion('reg_count', 'id', _counts('reg_count')),
+}
+
+
+def requested(args, allowed):
+    """
+    Reads the expansions a request asks for.
+
+    :param args: The query parameters (request.args)
+    :param allowed: The names of the expansions the route offers
+    :return: List of the names requested, possibly empty
+    :raises ValueError: if a name is not one of ``allowed``
+    """
+    names = [name.strip() for name in args.get("expand", "").split(",")
+             if name.strip()]
+    for name in names:
+        if name not in allowed:
+            raise ValueError("Cannot expand %s" % name)
+    return list(collections.OrderedDict.fromkeys(names))
+
+
+def expand(items, names):
+    """
+    Embeds expansions in items, in place. Items whose key is ``null`` or
+    refers to nothing get ``null``.
+
+    :param items: List of objects, e.g. from ``convert_objects``
+    :param names: Names of :py:data:`EXPANSIONS`
+    :return: ``items``
+    """
+    for name in names:
+        expansion = EXPANSIONS[name]
+        ids = {item[expansion.key] for item in items
+               if item.get(expansion.key) is not None}
+        values = expansion.load(ids) if ids else {}
+        for item in items:
+            item[expansion.field] = values.get(item.get(expansion.key))
+    return items
@@ -4,5 +4,5 @@ circular imports.
 For  more information, check out
 https://stackoverflow.com/questions/28784849/how-to-fix-circular-import-in-flask-project-using-blueprints-mysql-w-o-sqlalchem#28784938
 """
-from flaskext.mysql import MySQL
-mysql = MySQL()
+from api.pool import PooledMySQL
+mysql = PooledMySQL()
@@ -0,0 +1,141 @@
+"""
+HTTP caching policies for routes.
+
+By default every response is marked ``no-store`` so that nothing, including
+authenticated payloads, is kept by clients or proxies. Routes opt into
+caching by declaring a policy:
+
+.. code-block:: python
+
+    @posts.route("/<post_id>", methods=["GET"])
+    @cache_policy(REVALIDATE)
+    def get_post(post_id):
+        ...
+
+Responses of routes with a policy that asks for validation carry a strong
+``ETag`` derived from their content, and requests whose ``If-None-Match``
+matches it are answered with an empty ``304 Not Modified``. Streamed
+responses are never buffered to compute an ETag, so they only get the
+policy's ``Cache-Control``.
+
+Computing the ETag from the content means doing all the work of a response
+to then send none of it. Routes that can tell their ETag cheaply, e.g. from
+a body in :py:mod:`api.objectcache` or :py:mod:`api.refdata`, declare a
+validator taking the view's arguments, and matching requests are answered
+before the view runs:
+
+.. code-block:: python
+
+    @posts.route("/<post_id>", methods=["GET"])
+    @cache_policy(REVALIDATE, lambda post_id: objectcache.etag("posts",
+                                                                post_id))
+    def get_post(post_id):
+        ...
+
+Validators run before everything else the view does, including checking
+credentials, so only routes anyone may read can have one.
+"""
+import collections
+
+from flask import Response, current_app, request
+from http import HTTPStatus
+
+CachePolicy = collections.namedtuple(
+    'CachePolicy', ['max_age', 'public', 'etag', 'immutable'])
+
+# Cache, but ask the server whether the copy is still current on every use.
+# For resources that may change at any moment, such as posts and profiles.
+REVALIDATE = CachePolicy(max_age=0, public=False, etag=True, immutable=False)
+
+# Shared caches may keep a copy for a day before revalidating. For reference
+# data, such as locations and languages, that hardly ever changes.
+REFERENCE = CachePolicy(max_age=60 * 60 * 24, public=True, etag=True,
+                        immutable=False)
+
+# Keep for a year without revalidating. Only for URLs whose content never
+# changes, such as the versioned reference data downloads.
+IMMUTABLE = CachePolicy(max_age=60 * 60 * 24 * 365, public=True, etag=True,
+                        immutable=True)
+
+
+def cache_policy(policy, validator=None):
+    """
+    Declares the caching policy of a route. Must be applied below the
+    ``route`` decorator.
+
+    :param policy: A :py:class:`CachePolicy`
+    :param validator: Optional function taking the view's arguments and
+                      returning the ETag its response would have, or
+                      ``None`` if that cannot be told without running it
+    """
+    def decorate(view):
+        view.cache_policy = policy
+        view.cache_validator = validator
+        return view
+    return decorate
+
+
+def _route_view():
+    if request.url_rule is None:
+        return None
+    return current_app.view_functions.get(request.url_rule.endpoint)
+
+
+def _route_policy():
+    return getattr(_route_view(), 'cache_policy', None)
+
+
+def cache_control(policy):
+    """
+    :param policy: A :py:class:`CachePolicy`
+    :return: The ``Cache-Control`` header value for the policy
+    """
+    directives = ["public" if policy.public else "private"]
+    if policy.max_age:
+        directives.append("max-age=%d" % policy.max_age)
+    else:
+        directives.append("no-cache")
+    if policy.immutable:
+        directives.append("immutable")
+    return ", ".join(directives)
+
+
+def answer_unchanged():
+    """
+    ``before_request`` hook answering ``304 Not Modified`` without running
+    the view, if the route has a validator and the client's copy matches
+    it.
+    """
+    if request.method not in ("GET", "HEAD") or not request.if_none_match:
+        return None
+    view = _route_view()
+    validator = getattr(view, 'cache_validator', None)
+    if validator is None or not view.cache_policy.etag:
+        return None
+    etag = validator(**request.view_args)
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=HTTPStatus.NOT_MODIFIED)
+    response.set_etag(etag)
+    return response
+
+
+def apply_policy(response):
+    """
+    ``after_request`` hook applying the route's caching policy, or
+    forbidding caching if the route has none.
+    """
+    policy = _route_policy()
+    if policy is None or response.status_code not in (200, 304) or \
+            request.method not in ("GET", "HEAD"):
+        response.headers["Expires"] = "Thu, 01 Jan 1970 00:00:00 GMT"
+        response.headers["Cache-Control"] = \
+            "no-cache, no-store, must-revalidate, max-age=0"
+        return response
+    response.headers["Cache-Control"] = cache_control(policy)
+    # A 304 from answer_unchanged() already has its ETag.
+    if policy.etag and response.status_code == 200 and \
+            not response.is_streamed:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
@@ -0,0 +1,165 @@
+"""
+Leaderboards of the networks with the most members, served from memory.
+
+Ranking networks by their member count in SQL counts the registrations of
+every network on every request. Instead, each worker process keeps a
+:py:class:`Board`: the top ``LEADERBOARD_SIZE`` networks overall, per
+``network_class``, per current city, region and country, and per class
+within each of those places, each network already encoded as JSON. A board
+is rebuilt from two queries once it is ``LEADERBOARD_REFRESH_SECS`` old, on
+a background thread started by the first request to notice (see
+:py:mod:`api.background`), while requests keep being served the old one, so
+member counts may lag by a little more than that.
+"""
+import bisect
+import collections
+import threading
+import time
+
+from flask import json
+
+from api import background, config
+
+# Fields a leaderboard may be filtered by. At most one location field may be
+# used at a time.
+CLASS_FIELD = 'network_class'
+LOCATION_FIELDS = ('id_city_cur', 'id_region_cur', 'id_country_cur')
+
+# ``built`` is the ``time.monotonic()`` of the build and ``groups`` maps
+# each filter, as a sorted tuple of ``(field, value)`` pairs, to a list of
+# :py:class:`Entry` ordered by rank.
+Board = collections.namedtuple('Board', ['built', 'groups'])
+
+# ``key`` orders entries, most members first, and ``body`` is the network
+# encoded as JSON.
+Entry = collections.namedtuple('Entry', ['key', 'members', 'id', 'body'])
+
+_board = None
+_build_lock = threading.Lock()
+
+
+def _filters(network):
+    """
+    :return: The filters under which ``network`` is listed
+    """
+    network_class = network.get(CLASS_FIELD)
+    filters = [()]
+    if network_class is not None:
+        filters.append(((CLASS_FIELD, network_class),))
+    for field in LOCATION_FIELDS:
+        if network.get(field) is None:
+            continue
+        filters.append(((field, network[field]),))
+        if network_class is not None:
+            filters.append(tuple(sorted(((CLASS_FIELD, network_class),
+                                         (field, network[field])))))
+    return filters
+
+
+def build(networks, members, size=None):
+    """
+    :param networks: Iterable of networks, as dictionaries
+    :param members: Dictionary mapping network ids to their member counts
+    :param size: The most networks to keep per leaderboard
+    :return: A :py:class:`Board`
+    """
+    size = config.LEADERBOARD_SIZE if size is None else size
+    entries = []
+    for network in networks:
+        count = members.get(network['id'], 0)
+        body = json.dumps(dict(network, user_count=count),
+                          separators=(",", ":")).encode('utf-8')
+        entries.append((Entry((-count, network['id']), count, network['id'],
+                              body), _filters(network)))
+    entries.sort(key=lambda pair: pair[0].key)
+    groups = collections.defaultdict(list)
+    for entry, filters in entries:
+        for key in filters:
+            group = groups[key]
+            if len(group) < size:
+                group.append(entry)
+    return Board(time.monotonic(), dict(groups))
+
+
+def load():
+    """
+    Reads every network and its member count and replaces the current
+    board.
+
+    :return: The new :py:class:`Board`
+    """
+    # Imported here because apiutils is not needed to serve a board.
+    from api.apiutils import convert_objects, execute_get_all
+    items, description = execute_get_all("SELECT * FROM networks", ())
+    networks = convert_objects(items, description)
+    rows, _ = execute_get_all("SELECT id_network, count(*) "
+                              "FROM network_registration "
+                              "GROUP BY id_network", ())
+    global _board
+    _board = build(networks, {row[0]: row[1] for row in rows})
+    return _board
+
+
+def current():
+    """
+    :return: The current :py:class:`Board`, built first if there is none.
+             If it is stale, a rebuild is started in the background.
+    """
+    board = _board
+    if board is None:
+        with _build_lock:
+            return _board if _board is not None else load()
+    if time.monotonic() - board.built > config.LEADERBOARD_REFRESH_SECS:
+        background.run('leaderboard', load)
+    return board
+
+
+def clear():
+    global _board
+    _board = None
+
+
+def filter_key(args):
+    """
+    Reads the filters of a request.
+
+    :param args: The query parameters (request.args)
+    :return: The filter as a key of :py:attr:`Board.groups`
+    :raises ValueError: if more than one location is given or an id is not
+                        an integer
+    """
+    pairs = []
+    if args.get(CLASS_FIELD):
+        pairs.append((CLASS_FIELD, args[CLASS_FIELD]))
+    locations = [field for field in LOCATION_FIELDS if args.get(field)]
+    if len(locations) > 1:
+        raise ValueError("Filter by at most one location")
+    for field in locations:
+        try:
+            pairs.append((field, int(args[field])))
+        except ValueError:
+            raise ValueError("%s must be an integer" % field)
+    return tuple(sorted(pairs))
+
+
+def page(board, key, start_after, count):
+    """
+    :param board: A :py:class:`Board`
+    :param key: A filter, from :py:func:`filter_key`
+    :param start_after: ``None`` for the first page, or the
+                        ``(members, id)`` of the first entry of the page
+    :param count: The most entries to return
+    :return: Tuple of the form ``(entries, next)`` where ``next`` is the
+             ``(members, id)`` of the first entry of the next page, or
+             ``None``
+    """
+    group = board.groups.get(key, [])
+    start = 0
+    if start_after is not None:
+        members, id_ = start_after
+        # A 1-tuple sorts just before the entry with the same key.
+        start = bisect.bisect_left(group, ((-members, id_),))
+    entries = group[start:start + count]
+    following = group[start + count] if len(group) > start + count else None
+    return entries, None if following is None else \
+        (following.members, following.id)
@@ -0,0 +1,130 @@
+"""
+Directory of networks by their canonical key, kept in memory.
+
+A network is identified by its current location and either its origin
+location or its origin language, which
+:py:func:`api.blueprints.networks.utils.network_key` writes as one key such
+as ``"47228,56130,327181/44888,21359,/"``: the current location, then the
+origin location and language. Rather than filter the ``networks`` table on
+up to seven columns to find a network, each worker process keeps a
+:py:class:`Directory` mapping keys to ids and back. It is read from the
+``network_key`` column when the app starts, and networks are added as they
+are created.
+
+Networks are never updated or deleted, so entries never go stale, but a
+network created by another worker process is missing until this one looks
+it up. :py:func:`find` reads the database on a miss.
+"""
+import threading
+
+_directory = None
+_load_lock = threading.Lock()
+
+
+class Directory(object):
+    """
+    Network ids by key, and keys by id.
+    """
+
+    def __init__(self, networks=()):
+        """
+        :param networks: Iterable of ``(id, network_key)`` pairs
+        """
+        self._ids = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        for id_, key in networks:
+            self._add(id_, key)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, id_, key):
+        """
+        Adds a network, unless there is one with its key or id already.
+        """
+        with self._lock:
+            self._add(id_, key)
+
+    def _add(self, id_, key):
+        if key in self._ids or id_ in self._keys:
+            return
+        self._ids[key] = id_
+        self._keys[id_] = key
+
+    def get(self, key):
+        """
+        :return: The id of the network with the key, or ``None``
+        """
+        return self._ids.get(key)
+
+    def key(self, id_):
+        """
+        :return: The key of the network with the id, or ``None``
+        """
+        return self._keys.get(id_)
+
+
+def load():
+    """
+    Reads the key of every network and replaces the current directory.
+
+    :return: The new :py:class:`Directory`
+    """
+    # Imported here because apiutils is not needed to read the directory.
+    from api.apiutils import execute_get_all
+    rows, _ = execute_get_all("SELECT id, network_key FROM networks "
+                              "WHERE network_key IS NOT NULL", ())
+    global _directory
+    _directory = Directory(rows)
+    return _directory
+
+
+def current():
+    """
+    :return: The current :py:class:`Directory`, loaded first if there is
+             none
+    """
+    if _directory is None:
+        with _load_lock:
+            if _directory is None:
+                load()
+    return _directory
+
+
+def clear():
+    global _directory
+    _directory = None
+
+
+def add(network):
+    """
+    Adds a network just created or read to the current directory.
+
+    :param network: The network, as a dictionary with its ``id`` and
+                    ``network_key``
+    """
+    current().add(network['id'], network['network_key'])
+
+
+def find(key):
+    """
+    :param key: A network key
+    :return: The id of the network with the key, or ``None`` if there is
+             none. Networks missing from the directory are looked for in
+             the database, with one query.
+
+    The database may compare keys ignoring case, so a network found there
+    is added by the key it stores rather than ``key``.
+    """
+    directory = current()
+    id_ = directory.get(key)
+    if id_ is None:
+        from api.apiutils import execute_get_all
+        rows, _ = execute_get_all(
+            "SELECT id, network_key FROM networks WHERE network_key=%s",
+            (key,))
+        if rows:
+            id_, stored_key = rows[0]
+            directory.add(id_, stored_key)
+    return id_
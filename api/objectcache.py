@@ -0,0 +1,203 @@
+"""
+Read-through cache for single objects served by
+:py:func:`api.apiutils.get_by_id`.
+
+Entries are keyed by table and integer id, so ``/user/05`` and ``/user/5``
+share one, and hold the response body exactly as it is sent: the JSON
+encoding of the row with private fields (e.g. ``email``) already removed. A
+hit therefore costs neither a query nor any encoding.
+
+Writes through ``execute_put_by_id`` and the delete paths call
+:py:func:`invalidate`. Invalidation leaves a short-lived tombstone rather
+than just dropping the entry, so that a read served by a lagging replica
+right after the write cannot put the old row back in the cache. The
+tombstone lasts ``MYSQL_REPLICA_MAX_LAG`` seconds, after which replicas that
+are still in use have caught up.
+
+The cache lives in each worker process by default (:py:class:`LocalBackend`).
+Workers can share one instead by passing a memcached or Redis client to
+:py:func:`set_backend`, wrapped in a :py:class:`ClientBackend`.
+"""
+import collections
+import re
+import threading
+
+from werkzeug.http import generate_etag
+
+from api import cache, config
+
+# Stored in place of a body while writes to a row may not have reached
+# every replica yet.
+TOMBSTONE = b""
+
+
+class LocalBackend(object):
+    """
+    Stores entries in an in-process LRU cache.
+    """
+
+    def __init__(self, maxsize=config.OBJECT_CACHE_SIZE):
+        self._cache = cache.TTLCache('objects', maxsize,
+                                     config.OBJECT_CACHE_TTL, sizeof=len)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class ClientBackend(object):
+    """
+    Stores entries in a shared cache server through a client object with
+    ``get(key)`` and ``set(key, value, ttl)`` methods, such as
+    ``pymemcache.client.base.Client`` or ``redis.Redis``. Errors from the
+    server are treated as misses so an outage only costs speed.
+    """
+
+    def __init__(self, client, prefix='cm:obj:'):
+        self.client = client
+        self.prefix = prefix
+        self._stats = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _key(self, key):
+        return self.prefix + ':'.join(str(part) for part in key)
+
+    def get(self, key):
+        try:
+            value = self.client.get(self._key(key))
+        except Exception:
+            self._count('errors')
+            return None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, key, value, ttl):
+        try:
+            self.client.set(self._key(key), value, ttl)
+        except Exception:
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return {key: self._stats[key]
+                    for key in ('hits', 'misses', 'errors')}
+
+
+_backend = LocalBackend()
+
+
+def set_backend(backend):
+    """
+    :param backend: A :py:class:`LocalBackend`, a :py:class:`ClientBackend`,
+                    or ``None`` to turn the cache off
+    """
+    global _backend
+    _backend = backend
+
+
+def _key(table_name, id_):
+    """
+    :return: The key of an object, or ``None`` if ``id_`` is not a string
+             of digits or an integer, so that its object is not cached
+    """
+    if isinstance(id_, int):
+        return table_name, id_
+    if re.fullmatch(r"[0-9]+", str(id_)) is None:
+        return None
+    return table_name, int(id_)
+
+
+def _omit_marker(fields_to_omit):
+    return ",".join(sorted(fields_to_omit)).encode('utf-8') + b"\n"
+
+
+def get(table_name, id_, fields_to_omit=()):
+    """
+    :param table_name: The table the object is in
+    :param id_: The object's id
+    :param fields_to_omit: The fields the caller leaves out of the object
+    :return: The cached response body; ``None`` on a miss; or
+             :py:data:`TOMBSTONE` on a miss whose result must not be cached
+             with :py:func:`put`
+    """
+    key = _key(table_name, id_)
+    if _backend is None or key is None:
+        return TOMBSTONE
+    value = _backend.get(key)
+    if value is None or value == TOMBSTONE:
+        return value
+    # Each table is only ever served with one set of omitted fields, but
+    # make sure a body with fields the caller would leave out is not served.
+    marker = _omit_marker(fields_to_omit)
+    if not value.startswith(marker):
+        return None
+    return value[len(marker):]
+
+
+def etag(table_name, id_, fields_to_omit=()):
+    """
+    Finds the ETag of an object's response without querying, for
+    :py:func:`api.httpcache.cache_policy` validators.
+
+    :param table_name: The table the object is in
+    :param id_: The object's id
+    :param fields_to_omit: The fields the caller leaves out of the object
+    :return: The ETag the cached body is served with, or ``None`` if the
+             object is not cached
+    """
+    body = get(table_name, id_, fields_to_omit)
+    if not body:
+        return None
+    return generate_etag(body)
+
+
+def put(table_name, id_, fields_to_omit, body):
+    """
+    Caches a response body after a miss.
+
+    :param table_name: The table the object is in
+    :param id_: The object's id
+    :param fields_to_omit: The fields left out of ``body``
+    :param body: The response body, as bytes
+    """
+    key = _key(table_name, id_)
+    if _backend is None or key is None:
+        return
+    _backend.set(key, _omit_marker(fields_to_omit) + body,
+                 config.OBJECT_CACHE_TTL)
+
+
+def invalidate(table_name, id_):
+    """
+    Drops a cached object, e.g. because its row was updated or deleted.
+
+    :param table_name: The table the object is in
+    :param id_: The object's id
+    """
+    key = _key(table_name, id_)
+    if _backend is None or key is None:
+        return
+    _backend.set(key, TOMBSTONE,
+                 config.MYSQL_REPLICA_MAX_LAG)
+
+
+def stats():
+    """
+    :return: The backend's counters and hit ratio, or an empty dictionary
+             if the cache is off.
+    """
+    if _backend is None:
+        return {}
+    stats = _backend.stats()
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else None
+    return stats
@@ -0,0 +1,150 @@
+"""
+Keyset pagination helpers used by :py:func:`api.apiutils.get_paginated`.
+
+Pages are ordered by one or more keys, newest first. When the leading key is
+not unique (e.g. ``join_date``), a unique key such as ``users.id`` follows it
+so that rows sharing a timestamp are neither skipped nor repeated across
+pages. A page is identified by the keys of its first row. Clients receive the
+next page's position as an opaque cursor, and send it back as the ``cursor``
+query parameter. The older ``max_id`` / ``max_registration_date`` style
+parameters still work and bound only the leading key.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from api.config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+
+def page_size(args):
+    """
+    Reads the requested page size, capped at ``MAX_PAGE_SIZE``.
+
+    :param args: The query parameters (request.args)
+    :return: The number of items to return
+    :raises ValueError: if ``count`` is not a positive integer
+    """
+    count = int(args.get("count", DEFAULT_PAGE_SIZE))
+    if count < 1:
+        raise ValueError("count must be positive")
+    return min(count, MAX_PAGE_SIZE)
+
+
+def column_name(key):
+    """
+    :param key: An order key as written in SQL, e.g. ``users.id``
+    :return: The name of the key's column in result rows, e.g. ``id``
+    """
+    return key.rsplit(".", 1)[-1]
+
+
+def order_by(keys):
+    """
+    :param keys: Order keys, most significant first
+    :return: The ``ORDER BY`` clause for a newest-first page
+    """
+    return "ORDER BY " + ", ".join(key + " DESC" for key in keys)
+
+
+def keyset_condition(keys):
+    """
+    Builds the condition selecting rows at or after a page's first row.
+
+    For keys ``(a, b)`` this is ``(a < %s OR (a = %s AND b <= %s))``.
+
+    :param keys: Order keys, most significant first
+    :return: Tuple of the form ``(condition, arg_indexes)`` where
+             ``arg_indexes`` maps each ``%s`` to the index of the key value
+             that fills it
+    """
+    clauses = []
+    arg_indexes = []
+    for position, key in enumerate(keys):
+        equalities = ["%s = %%s" % prior for prior in keys[:position]]
+        operator = "<=" if position == len(keys) - 1 else "<"
+        clause = " AND ".join(equalities + ["%s %s %%s" % (key, operator)])
+        clauses.append(clause if position == 0 else "(%s)" % clause)
+        arg_indexes.extend(range(position + 1))
+    if len(clauses) == 1:
+        return clauses[0], arg_indexes
+    return "(" + " OR ".join(clauses) + ")", arg_indexes
+
+
+def _encodable(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    """
+    :param values: The order key values of a page's first row
+    :return: An opaque, URL-safe cursor string
+    """
+    payload = json.dumps([_encodable(value) for value in values],
+                         separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, key_count):
+    """
+    :param cursor: A cursor produced by :py:func:`encode_cursor`
+    :param key_count: The number of order keys the cursor should hold
+    :return: List of order key values
+    :raises ValueError: if the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != key_count:
+        raise ValueError("Malformed cursor")
+    return values
+
+
+def page_bounds(args, keys, max_arg=None):
+    """
+    Builds the extra ``WHERE`` condition that starts a page where the client
+    asked for it.
+
+    :param args: The query parameters (request.args)
+    :param keys: Order keys, most significant first
+    :param max_arg: Legacy query parameter bounding the leading key
+                    inclusively, e.g. ``max_id``
+    :return: Tuple of the form ``(sql, args)``, where ``sql`` is empty or
+             starts with `` AND``
+    :raises ValueError: if the cursor is malformed
+    """
+    if "cursor" in args:
+        values = decode_cursor(args["cursor"], len(keys))
+        condition, arg_indexes = keyset_condition(keys)
+        return " AND " + condition, tuple(values[i] for i in arg_indexes)
+    if max_arg and max_arg in args:
+        return " AND %s <= %%s" % keys[0], (args[max_arg],)
+    return "", ()
+
+
+def row_cursor(row, description, keys):
+    """
+    :param row: A result tuple
+    :param description: The cursor description naming the row's columns
+    :param keys: Order keys, most significant first
+    :return: The cursor of the page that starts at ``row``
+    """
+    names = [column[0] for column in description]
+    return encode_cursor([row[names.index(column_name(key))] for key in keys])
+
+
+def add_page_headers(response, next_cursor):
+    """
+    Tells the client whether there is another page and how to get it.
+
+    :param response: The response holding the current page
+    :param next_cursor: The next page's cursor, or ``None`` on the last page
+    :return: The response
+    """
+    response.headers["X-Has-More"] = "true" if next_cursor else "false"
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
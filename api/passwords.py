@@ -0,0 +1,173 @@
+"""
+Password hashing.
+
+Passwords are stored hashed by one of several hashers, identified by the
+form of the stored hash. New hashes are made by the hasher named by
+``PASSWORD_HASHER``; when a user logs in with a password stored by another
+hasher, or with weaker parameters, :py:func:`check` also returns a new hash
+to replace it with. This is how the unsalted MD5 hashes passwords were
+first stored with are replaced. A stronger hasher can be added with
+:py:func:`register`.
+
+Good hashes are slow to compute on purpose, so they are computed by a pool
+of ``PASSWORD_HASH_WORKERS`` threads (``hashlib`` lets other threads run
+while it hashes). At most ``PASSWORD_HASH_QUEUE`` more may wait their turn;
+beyond that :py:class:`Busy` is raised, so a storm of logins is turned away
+rather than tying up every request thread.
+"""
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import os
+import threading
+
+from api import config
+
+
+class Busy(Exception):
+    """
+    Raised when too many passwords are waiting to be hashed.
+    """
+
+
+class MD5Hasher(object):
+    """
+    Unsalted MD5 hex digests, as passwords were first stored.
+    """
+
+    algorithm = 'md5'
+
+    def identifies(self, encoded):
+        return len(encoded) == 32 and '$' not in encoded
+
+    def encode(self, password):
+        return hashlib.md5(password.encode('utf-8')).hexdigest()
+
+    def verify(self, password, encoded):
+        return hmac.compare_digest(self.encode(password), encoded)
+
+    def needs_rehash(self, encoded):
+        return False
+
+
+class PBKDF2Hasher(object):
+    """
+    Salted PBKDF2 with SHA-256, stored as
+    ``pbkdf2_sha256$<iterations>$<salt>$<hash>``.
+    """
+
+    algorithm = 'pbkdf2_sha256'
+
+    def __init__(self, iterations=None):
+        """
+        :param iterations: Iterations for new hashes, by default
+                           ``PASSWORD_HASH_ITERATIONS``
+        """
+        self.iterations = iterations or config.PASSWORD_HASH_ITERATIONS
+
+    def identifies(self, encoded):
+        return encoded.startswith(self.algorithm + '$')
+
+    def encode(self, password, salt=None, iterations=None):
+        salt = salt or base64.b64encode(os.urandom(12)).decode('ascii')
+        iterations = iterations or self.iterations
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'),
+                                     salt.encode('ascii'), iterations)
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt,
+                                base64.b64encode(digest).decode('ascii'))
+
+    def verify(self, password, encoded):
+        _, iterations, salt, _ = encoded.split('$', 3)
+        return hmac.compare_digest(
+            self.encode(password, salt, int(iterations)), encoded)
+
+    def needs_rehash(self, encoded):
+        return int(encoded.split('$', 2)[1]) != self.iterations
+
+
+# Algorithm name -> hasher.
+HASHERS = {}
+
+
+def register(hasher):
+    """
+    Adds a hasher, which may then be named by ``PASSWORD_HASHER``. A hasher
+    has an ``algorithm`` name and methods ``identifies(encoded)``,
+    ``encode(password)``, ``verify(password, encoded)`` and
+    ``needs_rehash(encoded)``, like :py:class:`PBKDF2Hasher`.
+
+    :param hasher: The hasher
+    """
+    HASHERS[hasher.algorithm] = hasher
+
+
+register(MD5Hasher())
+register(PBKDF2Hasher())
+
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=config.PASSWORD_HASH_WORKERS,
+    thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(config.PASSWORD_HASH_WORKERS +
+                                    config.PASSWORD_HASH_QUEUE)
+
+
+def _run(fn, *args):
+    """
+    Calls ``fn`` in the pool and waits for its result.
+
+    :raises Busy: if the pool has too many calls waiting already
+    """
+    if not _slots.acquire(blocking=False):
+        raise Busy()
+    try:
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def _preferred():
+    return HASHERS[config.PASSWORD_HASHER]
+
+
+def _check(password, encoded):
+    preferred = _preferred()
+    if encoded is None:
+        # Take as long as for a user who exists, so that timing does not
+        # reveal which logins exist.
+        preferred.encode(password)
+        return False, None
+    for hasher in HASHERS.values():
+        if hasher.identifies(encoded):
+            break
+    else:
+        return False, None
+    if not hasher.verify(password, encoded):
+        return False, None
+    if hasher is not preferred or preferred.needs_rehash(encoded):
+        return True, preferred.encode(password)
+    return True, None
+
+
+def make_hash(password):
+    """
+    :param password: A password, e.g. a new user's
+    :return: Its hash by the preferred hasher, to store
+    :raises Busy: if too many passwords are waiting to be hashed
+    """
+    return _run(_preferred().encode, password)
+
+
+def check(password, encoded):
+    """
+    :param password: The password given
+    :param encoded: The stored hash, or ``None`` if there is no such user
+    :return: Tuple of the form ``(valid, new_hash)``, where ``new_hash`` is
+             a hash by the preferred hasher to replace ``encoded`` with, or
+             ``None`` if it need not be replaced
+    :raises Busy: if too many passwords are waiting to be hashed
+    """
+    return _run(_check, password, encoded)
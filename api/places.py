@@ -0,0 +1,97 @@
+"""
+Names and parents of countries, regions and cities, by id.
+
+Networks store the names of their locations next to the ids, so creating
+one needs the names of up to six locations. :py:func:`resolve` finds those
+of any number of ``(country, region, city)`` id triples at once. Locations
+come from the reference data snapshot (see :py:mod:`api.refdata`) when it
+has them, else from a cache, and the rest are read with one query per
+level. Locations hardly ever change, so cached ones are kept for
+``PLACE_CACHE_TTL`` seconds.
+"""
+import collections
+
+from api import cache, config, refdata
+
+# The tables of each level of a triple, in order.
+LEVELS = ('countries', 'regions', 'cities')
+
+# A location. Parent ids are ``None`` where the level has no such parent.
+Place = collections.namedtuple('Place',
+                               ['id', 'name', 'region_id', 'country_id'])
+
+_cache = cache.TTLCache('places', config.PLACE_CACHE_SIZE,
+                        config.PLACE_CACHE_TTL)
+
+
+def parse_triple(text):
+    """
+    :param text: ``country,region,city`` ids, as in the ``near_location``
+                 and ``from_location`` query parameters, with ``-1`` or
+                 ``null`` for a missing level
+    :return: Tuple of the three ids as integers, or ``None``
+    :raises ValueError: if there are not three ids or one is not an integer
+    """
+    ids = text.split(',')
+    if len(ids) != 3:
+        raise ValueError("Expected country,region,city")
+    return tuple(None if id_.lower() in ('', '-1', 'null') else int(id_)
+                 for id_ in ids)
+
+
+def _place(row):
+    return Place(row['id'], row['name'], row.get('region_id'),
+                 row.get('country_id'))
+
+
+def lookup(table_name, ids):
+    """
+    Finds locations of one level, with at most one query.
+
+    :param table_name: One of :py:data:`LEVELS`
+    :param ids: Iterable of integer ids
+    :return: Dictionary mapping those of the ids that exist to their
+             :py:class:`Place`
+    """
+    # Imported here because apiutils is not needed for cached places.
+    from api.apiutils import convert_objects, execute_get_all
+    snapshot = refdata.current()
+    rows = snapshot.rows[table_name] if snapshot is not None else {}
+    found = {}
+    missing = []
+    for id_ in set(ids):
+        if id_ in rows:
+            found[id_] = _place(rows[id_])
+            continue
+        place = _cache.get((table_name, id_))
+        if place is None:
+            missing.append(id_)
+        else:
+            found[id_] = place
+    if missing:
+        # Note table_name is never supplied by a client.
+        items, description = execute_get_all(
+            "SELECT * FROM `%s` WHERE id IN %%s" % table_name,
+            (tuple(sorted(missing)),))
+        for row in convert_objects(items, description):
+            found[row['id']] = place = _place(row)
+            _cache.set((table_name, row['id']), place)
+    return found
+
+
+def resolve(triples):
+    """
+    Names the locations of many triples, with at most one query per level.
+
+    :param triples: List of ``(country, region, city)`` id tuples, e.g.
+                    from :py:func:`parse_triple`
+    :return: List of ``(country, region, city)`` name tuples, one per
+             triple, with ``None`` for missing ids and ids that do not exist
+    """
+    places = [lookup(table_name,
+                     [triple[level] for triple in triples
+                      if triple[level] is not None])
+              for level, table_name in enumerate(LEVELS)]
+    return [tuple(places[level][id_].name if id_ in places[level] else None
+                  for level, id_ in enumerate(triple))
+            for triple in triples]
@@ -0,0 +1,554 @@
+"""
+A small, thread-safe MySQL connection pool and the Flask extension that
+hands its connections out to requests.
+
+flaskext.mysql opens a brand new PyMySQL connection for every application
+context and closes it on teardown, so every request pays for a TCP connect
+and a MySQL authentication handshake. The pool below keeps a bounded number
+of connections open and lends them to requests instead, and can spread
+reads over a set of read replicas.
+"""
+import collections
+import itertools
+import math
+import os
+import threading
+import time
+
+import pymysql
+import pymysql.cursors
+from flask import g, request
+
+from api import config
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection could be checked out of the pool before the
+    checkout timeout expired.
+    """
+    pass
+
+
+class PoolEntry(object):
+    """
+    Bookkeeping for one pooled connection.
+    """
+    __slots__ = ('connection', 'pid', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.pid = os.getpid()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of DB-API connections.
+
+    Connections are created lazily, up to ``max_size`` of them. Idle
+    connections are pinged before being handed out if they have been idle
+    for longer than ``ping_interval`` seconds, and are closed and replaced
+    once they are older than ``max_lifetime`` seconds. A ``max_lifetime``
+    of zero never reuses a connection, which mimics an unpooled setup.
+
+    The pool remembers the pid of the process that created it. If it is
+    used from a different process (e.g. a forked FastCGI worker), it drops
+    every connection inherited from the parent without closing it, since
+    closing would tear down the parent's socket, and starts over.
+    """
+
+    def __init__(self, connect, max_size=config.MYSQL_POOL_SIZE,
+                 max_lifetime=config.MYSQL_POOL_MAX_LIFETIME,
+                 checkout_timeout=config.MYSQL_POOL_TIMEOUT,
+                 ping_interval=config.MYSQL_POOL_PING_INTERVAL):
+        """
+        :param connect: Zero-argument callable returning a new connection.
+        :param max_size: Maximum number of open connections.
+        :param max_lifetime: Seconds after which a connection is recycled.
+        :param checkout_timeout: Seconds to wait for a free connection before
+                                 raising :py:class:`PoolTimeout`.
+        :param ping_interval: Seconds a connection may sit idle before it is
+                              health-checked on checkout.
+        """
+        self._connect = connect
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._size = 0
+        self._stats = collections.Counter()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # We were forked. The inherited sockets belong to the parent.
+            self._reset()
+
+    def _expired(self, entry, now):
+        return now - entry.created_at >= self.max_lifetime
+
+    def _healthy(self, entry, now):
+        if now - entry.last_used < self.ping_interval:
+            return True
+        try:
+            entry.connection.ping(reconnect=False)
+        except Exception:
+            return False
+        return True
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    def _discard(self, entry):
+        """
+        Closes a connection that will not go back into the pool. Must be
+        called without holding the pool lock.
+        """
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def checkout(self):
+        """
+        Borrows a connection from the pool, opening a new one if there is
+        room, or waiting for one to be returned otherwise.
+
+        :return: A :py:class:`PoolEntry` whose ``connection`` is ready to use.
+        :raises PoolTimeout: if no connection frees up in time.
+        """
+        self._check_pid()
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._cond:
+                entry = None
+                while entry is None:
+                    if self._idle:
+                        entry = self._idle.pop()
+                    elif self._size < self.max_size:
+                        self._size += 1
+                        break
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            raise PoolTimeout(
+                                "No connection available after %s seconds"
+                                % self.checkout_timeout)
+                        self._stats['waits'] += 1
+                        self._cond.wait(remaining)
+            if entry is None:
+                try:
+                    entry = PoolEntry(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                self._count('created')
+            else:
+                now = time.monotonic()
+                if self._expired(entry, now):
+                    self._count('recycled')
+                    self._discard(entry)
+                    continue
+                if not self._healthy(entry, now):
+                    self._count('failed_health_checks')
+                    self._discard(entry)
+                    continue
+            self._count('checkouts')
+            return entry
+
+    def checkin(self, entry):
+        """
+        Returns a connection to the pool. Any open transaction is rolled
+        back so the next borrower does not inherit a stale snapshot.
+
+        :param entry: The :py:class:`PoolEntry` obtained from
+                      :py:meth:`checkout`.
+        """
+        self._check_pid()
+        if entry.pid != self._pid:
+            # Borrowed before a fork; leave it to the parent.
+            return
+        try:
+            entry.connection.rollback()
+        except Exception:
+            self._discard(entry)
+            return
+        entry.last_used = time.monotonic()
+        if self._expired(entry, entry.last_used):
+            self._count('recycled')
+            self._discard(entry)
+            return
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def dispose(self):
+        """
+        Closes every idle connection.
+        """
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self):
+        """
+        :return: A dictionary of pool counters suitable for monitoring.
+        """
+        with self._cond:
+            stats = {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+            }
+            for key in ('created', 'checkouts', 'recycled',
+                        'failed_health_checks', 'waits', 'timeouts'):
+                stats[key] = self._stats[key]
+        return stats
+
+
+class Replica(object):
+    """
+    A read replica: its connection pool and what we last learned about how
+    far it lags behind the primary.
+
+    Lag is probed at most once every ``check_interval`` seconds; between
+    probes the last answer is reused. A replica whose probe fails, or which
+    reports no lag figure at all (replication stopped), is treated as
+    unusable until the next probe says otherwise.
+    """
+
+    def __init__(self, pool, name='replica', lag_probe=None,
+                 check_interval=config.MYSQL_REPLICA_LAG_CHECK_INTERVAL):
+        """
+        :param pool: The replica's :py:class:`ConnectionPool`.
+        :param name: A label for monitoring.
+        :param lag_probe: Function taking a connection and returning the
+                          replica's lag in seconds, or ``None`` if it is not
+                          replicating. Defaults to :py:func:`replication_lag`.
+        :param check_interval: Seconds between lag probes.
+        """
+        self.pool = pool
+        self.name = name
+        self.lag_probe = lag_probe or replication_lag
+        self.check_interval = check_interval
+        self.lag = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def current_lag(self):
+        """
+        :return: The replica's lag in seconds, or ``None`` if it should not
+                 be read from.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and \
+                    now - self._checked_at < self.check_interval:
+                return self.lag
+            # Claim this probe; concurrent callers keep the previous answer.
+            self._checked_at = now
+        try:
+            entry = self.pool.checkout()
+            try:
+                lag = self.lag_probe(entry.connection)
+            finally:
+                self.pool.checkin(entry)
+        except Exception:
+            lag = None
+        self.lag = lag
+        return lag
+
+    def stats(self):
+        """
+        :return: The replica's pool counters, its name and its last known lag.
+        """
+        stats = self.pool.stats()
+        stats['name'] = self.name
+        stats['lag'] = self.lag
+        return stats
+
+
+def replication_lag(connection):
+    """
+    Asks a MySQL replica how far behind its primary it is.
+
+    :param connection: A connection to the replica
+    :return: ``Seconds_Behind_Master``, or ``None`` if the server is not
+             replicating.
+    """
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not status:
+        return None
+    return status['Seconds_Behind_Master']
+
+
+class PooledMySQL(object):
+    """
+    A drop-in replacement for ``flaskext.mysql.MySQL`` that lends each
+    application context a connection from a :py:class:`ConnectionPool`
+    rather than opening a new one.
+
+    It reads the same ``MYSQL_DATABASE_*`` settings as flaskext.mysql, plus
+    ``MYSQL_POOL_SIZE``, ``MYSQL_POOL_MAX_LIFETIME``, ``MYSQL_POOL_TIMEOUT``
+    and ``MYSQL_POOL_PING_INTERVAL``.
+
+    Reads may also be served by replicas listed in ``MYSQL_REPLICAS``, a
+    list of dictionaries overriding the ``MYSQL_DATABASE_*`` settings for
+    each replica (usually just the host). Callers ask for a replica with
+    ``get_db(read_only=True)`` and get the primary instead when:
+
+    * no replica is configured, or every replica lags by more than
+      ``MYSQL_REPLICA_MAX_LAG`` seconds or cannot be reached;
+    * the current request has already written (see :py:meth:`note_write`);
+    * the client wrote within the last ``MYSQL_READ_YOUR_WRITES_WINDOW``
+      seconds. The client is recognized by a cookie and, once it has
+      authenticated, by its user id, so that clients that drop cookies
+      still read their own writes.
+    """
+
+    COOKIE_NAME = 'cm_read_primary_until'
+
+    def __init__(self, app=None, connect=None):
+        self.pool = None
+        self.replicas = []
+        self.max_lag = config.MYSQL_REPLICA_MAX_LAG
+        self.read_your_writes_window = config.MYSQL_READ_YOUR_WRITES_WINDOW
+        self._next_replica = itertools.count()
+        self._recent_writers = {}
+        self._lock = threading.Lock()
+        self._routing = collections.Counter()
+        if app is not None:
+            self.init_app(app, connect)
+
+    def init_app(self, app, connect=None, replica_connects=None,
+                 lag_probe=None):
+        """
+        Creates the pools from the app's configuration.
+
+        :param app: The Flask app
+        :param connect: Optional zero-argument callable that opens a new
+                        connection. Defaults to ``pymysql.connect`` with the
+                        app's ``MYSQL_DATABASE_*`` settings.
+        :param replica_connects: Optional list of such callables, one per
+                                 replica. Defaults to one per entry of
+                                 ``MYSQL_REPLICAS``.
+        :param lag_probe: Optional function measuring a replica's lag. See
+                          :py:class:`Replica`.
+        """
+        app.config.setdefault('MYSQL_DATABASE_HOST', 'localhost')
+        app.config.setdefault('MYSQL_DATABASE_PORT', 3306)
+        app.config.setdefault('MYSQL_DATABASE_USER', None)
+        app.config.setdefault('MYSQL_DATABASE_PASSWORD', None)
+        app.config.setdefault('MYSQL_DATABASE_DB', None)
+        app.config.setdefault('MYSQL_DATABASE_CHARSET', 'utf8')
+        app.config.setdefault('MYSQL_USE_UNICODE', True)
+        app.config.setdefault('MYSQL_POOL_SIZE', config.MYSQL_POOL_SIZE)
+        app.config.setdefault('MYSQL_POOL_MAX_LIFETIME',
+                              config.MYSQL_POOL_MAX_LIFETIME)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', config.MYSQL_POOL_TIMEOUT)
+        app.config.setdefault('MYSQL_POOL_PING_INTERVAL',
+                              config.MYSQL_POOL_PING_INTERVAL)
+        app.config.setdefault('MYSQL_REPLICAS', [])
+        app.config.setdefault('MYSQL_REPLICA_MAX_LAG',
+                              config.MYSQL_REPLICA_MAX_LAG)
+        app.config.setdefault('MYSQL_REPLICA_LAG_CHECK_INTERVAL',
+                              config.MYSQL_REPLICA_LAG_CHECK_INTERVAL)
+        app.config.setdefault('MYSQL_READ_YOUR_WRITES_WINDOW',
+                              config.MYSQL_READ_YOUR_WRITES_WINDOW)
+        if connect is None:
+            connect = self.make_connect(app.config)
+        if replica_connects is None:
+            replica_connects = [
+                self.make_connect(dict(app.config, **overrides))
+                for overrides in app.config['MYSQL_REPLICAS']]
+        self.pool = self._make_pool(app.config, connect)
+        self.replicas = [
+            Replica(self._make_pool(app.config, replica_connect),
+                    name='replica%d' % index, lag_probe=lag_probe,
+                    check_interval=app.config[
+                        'MYSQL_REPLICA_LAG_CHECK_INTERVAL'])
+            for index, replica_connect in enumerate(replica_connects)]
+        self.max_lag = app.config['MYSQL_REPLICA_MAX_LAG']
+        self.read_your_writes_window = \
+            app.config['MYSQL_READ_YOUR_WRITES_WINDOW']
+        self.register(app)
+
+    @staticmethod
+    def _make_pool(app_config, connect):
+        return ConnectionPool(
+            connect,
+            max_size=app_config['MYSQL_POOL_SIZE'],
+            max_lifetime=app_config['MYSQL_POOL_MAX_LIFETIME'],
+            checkout_timeout=app_config['MYSQL_POOL_TIMEOUT'],
+            ping_interval=app_config['MYSQL_POOL_PING_INTERVAL']
+        )
+
+    def register(self, app):
+        """
+        Installs the request hooks that return connections to their pools
+        and remember which clients have just written. Safe to call more than
+        once.
+
+        :param app: The Flask app
+        """
+        if self.teardown not in app.teardown_appcontext_funcs:
+            app.teardown_appcontext(self.teardown)
+        if self.remember_writer not in app.after_request_funcs.get(None, []):
+            app.after_request(self.remember_writer)
+
+    @staticmethod
+    def make_connect(app_config):
+        """
+        Builds a connection factory from ``MYSQL_DATABASE_*`` settings.
+
+        :param app_config: The app configuration (or any mapping)
+        :return: Zero-argument callable returning a PyMySQL connection.
+        """
+        settings = (('host', 'MYSQL_DATABASE_HOST'),
+                    ('port', 'MYSQL_DATABASE_PORT'),
+                    ('user', 'MYSQL_DATABASE_USER'),
+                    ('password', 'MYSQL_DATABASE_PASSWORD'),
+                    ('db', 'MYSQL_DATABASE_DB'),
+                    ('charset', 'MYSQL_DATABASE_CHARSET'),
+                    ('use_unicode', 'MYSQL_USE_UNICODE'))
+        connect_args = {arg: app_config[key] for arg, key in settings
+                        if app_config.get(key)}
+        return lambda: pymysql.connect(**connect_args)
+
+    def get_db(self, read_only=False):
+        """
+        :param read_only: Whether the caller only reads, in which case the
+                          connection may be to a replica.
+        :return: The connection lent to the current application context,
+                 checking one out of a pool on first use.
+        """
+        if read_only and self.replicas and not self.reads_pinned():
+            entry = g.get('_mysql_replica_entry')
+            if entry is not None:
+                return entry.connection
+            for replica in self._replica_order():
+                lag = replica.current_lag()
+                if lag is None or lag > self.max_lag:
+                    continue
+                try:
+                    entry = replica.pool.checkout()
+                except (PoolTimeout, pymysql.MySQLError, OSError):
+                    continue
+                g._mysql_replica = replica
+                g._mysql_replica_entry = entry
+                self._count('replica_reads')
+                return entry.connection
+            self._count('replica_fallbacks')
+        entry = g.get('_mysql_entry')
+        if entry is None:
+            entry = self.pool.checkout()
+            g._mysql_entry = entry
+        return entry.connection
+
+    def _replica_order(self):
+        start = next(self._next_replica) % len(self.replicas)
+        return self.replicas[start:] + self.replicas[:start]
+
+    def _count(self, key):
+        with self._lock:
+            self._routing[key] += 1
+
+    def note_write(self):
+        """
+        Records that the current request writes to the primary. Its later
+        reads, and the client's reads for the next
+        ``MYSQL_READ_YOUR_WRITES_WINDOW`` seconds, go to the primary too.
+        """
+        g._mysql_wrote = True
+
+    def reads_pinned(self):
+        """
+        :return: Whether reads in the current request must go to the primary
+                 so the client sees its own recent writes.
+        """
+        if g.get('_mysql_wrote'):
+            return True
+        now = time.time()
+        try:
+            if float(request.cookies.get(self.COOKIE_NAME, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        user = g.get('user')
+        if user is not None:
+            return self._recent_writers.get(getattr(user, 'id', None), 0) > now
+        return False
+
+    def remember_writer(self, response):
+        """
+        ``after_request`` hook pinning a client that just wrote to the
+        primary for the read-your-writes window.
+        """
+        if not g.get('_mysql_wrote') or not self.replicas:
+            return response
+        until = time.time() + self.read_your_writes_window
+        response.set_cookie(self.COOKIE_NAME, '%.3f' % until,
+                            max_age=int(math.ceil(
+                                self.read_your_writes_window)),
+                            httponly=True)
+        user = g.get('user')
+        if user is not None:
+            with self._lock:
+                now = time.time()
+                self._recent_writers = {
+                    user_id: deadline for user_id, deadline
+                    in self._recent_writers.items() if deadline > now}
+                self._recent_writers[user.id] = until
+        return response
+
+    def stats(self):
+        """
+        :return: The primary pool's counters, each replica's counters under
+                 ``replicas`` and how reads were routed under ``routing``.
+        """
+        stats = self.pool.stats() if self.pool is not None else {}
+        stats['replicas'] = [replica.stats() for replica in self.replicas]
+        with self._lock:
+            stats['routing'] = {
+                key: self._routing[key]
+                for key in ('replica_reads', 'replica_fallbacks')}
+        return stats
+
+    def teardown(self, exception):
+        self.release()
+
+    def release(self):
+        """
+        Returns the connections lent to the current application context to
+        their pools early, e.g. before it waits on something slow. Its next
+        :py:meth:`get_db` checks one out again.
+        """
+        entry = g.pop('_mysql_entry', None)
+        if entry is not None:
+            self.pool.checkin(entry)
+        replica = g.pop('_mysql_replica', None)
+        entry = g.pop('_mysql_replica_entry', None)
+        if entry is not None:
+            replica.pool.checkin(entry)
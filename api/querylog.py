@@ -0,0 +1,121 @@
+"""
+Records the SQL statements each request runs.
+
+The execution helpers in :py:mod:`api.apiutils` report every statement here
+with its fingerprint (the SQL with values and whitespace normalized away, so
+that the same query with different arguments counts as one kind of query),
+the number of arguments, the number of rows returned or affected and how long
+it took. The records for the current request are available from
+:py:func:`queries`. In debug mode the totals are also sent back in the
+``X-Query-Count`` and ``X-Query-Time-Ms`` response headers.
+
+Tests hold endpoints to a query budget by collecting records with
+:py:func:`capture`, so a change that makes an endpoint issue a query per item
+fails the suite.
+"""
+import collections
+import contextlib
+import re
+import time
+from functools import lru_cache
+
+from flask import current_app, g, has_app_context
+
+QueryRecord = collections.namedtuple(
+    'QueryRecord', ['fingerprint', 'arg_count', 'rows', 'elapsed'])
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s")
+_IN_LIST = re.compile(r"\bIN\s*(?:\(\s*\?(?:\s*,\s*\?)*\s*\)|\?)",
+                      re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+# Lists receiving every record while a capture() block is active.
+_captures = []
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    :param sql: A SQL statement, with or without ``%s`` placeholders
+    :return: The statement with literals and placeholders replaced by ``?``,
+             ``IN`` lists collapsed and whitespace normalized
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def arg_count(args):
+    """
+    :param args: The arguments a statement was executed with
+    :return: How many values were sent, counting each member of a sequence
+             used for an ``IN %s`` list
+    """
+    if args is None:
+        return 0
+    if not isinstance(args, (tuple, list)):
+        return 1
+    return sum(len(arg) if isinstance(arg, (tuple, list)) else 1
+               for arg in args)
+
+
+def record(sql, args, rows, started):
+    """
+    Records a statement that has just finished.
+
+    :param sql: The statement as executed
+    :param args: Its arguments
+    :param rows: The number of rows it returned or affected
+    :param started: ``time.perf_counter()`` from just before it ran
+    """
+    entry = QueryRecord(fingerprint(sql), arg_count(args), rows,
+                        time.perf_counter() - started)
+    if has_app_context():
+        if '_queries' not in g:
+            g._queries = []
+        g._queries.append(entry)
+    for captured in _captures:
+        captured.append(entry)
+
+
+def queries():
+    """
+    :return: List of the :py:class:`QueryRecord` for the statements run so
+             far in the current application context
+    """
+    if not has_app_context():
+        return []
+    return g.get('_queries', [])
+
+
+@contextlib.contextmanager
+def capture():
+    """
+    Collects the records of every statement run inside the block, across
+    requests.
+
+    :return: A list that fills with :py:class:`QueryRecord` as statements run
+    """
+    captured = []
+    _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        _captures.remove(captured)
+
+
+def add_debug_headers(response):
+    """
+    ``after_request`` hook reporting the request's query count and total
+    query time when the app runs in debug mode.
+    """
+    if current_app.debug:
+        records = queries()
+        response.headers['X-Query-Count'] = str(len(records))
+        response.headers['X-Query-Time-Ms'] = '%.3f' % (
+            1000 * sum(entry.elapsed for entry in records))
+    return response
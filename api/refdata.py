@@ -0,0 +1,291 @@
+"""
+Reference data: countries, regions, cities and languages.
+
+These tables change only when someone imports new data, so rather than
+querying them per request we load them once into a :py:class:`Snapshot`
+holding every response already encoded, and the larger ones already
+gzipped. The snapshot is built when the app starts and rebuilt whenever
+:py:func:`load` is called again. Every ``REFERENCE_DATA_CHECK_SECS``
+seconds, the first request to notice reads the row count and largest id of
+each table, with one query, and rebuilds the snapshot if they have changed,
+e.g. after a data import. Rows edited in place change neither, so they are
+only picked up by the next rebuild or a restart.
+
+Each snapshot has a version derived from its content and from
+``REFERENCE_DATA_VERSION`` (bump that to force a new version). Bulk
+downloads are served under URLs that include the version, so their content
+never changes and clients and CDNs may keep them forever. Clients find the
+current version and URLs in the manifest at ``/location/refdata``.
+"""
+import collections
+import gzip
+import hashlib
+import threading
+import time
+
+from flask import Response, json, redirect, request
+from http import HTTPStatus
+
+from api import config
+
+TABLES = ('countries', 'regions', 'cities', 'languages')
+
+# Bulk downloads of a parent's children, by child table.
+PARENTS = {'regions': 'countries', 'cities': 'regions'}
+
+# ``body`` is the encoded JSON, ``gzipped`` the same compressed (or ``None``
+# if too small to be worth it) and ``etag`` a hash of ``body``.
+Payload = collections.namedtuple('Payload', ['body', 'gzipped', 'etag'])
+
+# ``rows`` maps each table name to a dictionary of its rows (as
+# dictionaries) by id. ``items`` maps ``(table, id)`` and ``bulk`` maps
+# download names, e.g. ``('regions', country_id)``, to payloads. ``stamp``
+# is what :py:func:`_read_stamp` read before the tables were, if anything.
+Snapshot = collections.namedtuple('Snapshot',
+                                  ['version', 'rows', 'items', 'bulk',
+                                   'stamp'])
+
+_snapshot = None
+_load_lock = threading.Lock()
+# The time.monotonic() the tables were last found unchanged.
+_checked = 0
+
+
+def make_payload(obj):
+    """
+    :param obj: A JSON serializable object
+    :return: A :py:class:`Payload` of ``obj``
+    """
+    # Encoded the way jsonify encodes, so responses look the same whether
+    # or not they come from a snapshot.
+    body = (json.dumps(obj, separators=(",", ":")) + "\n").encode('utf-8')
+    gzipped = None
+    if len(body) >= config.GZIP_MIN_SIZE:
+        gzipped = gzip.compress(body, 9)
+    return Payload(body, gzipped, hashlib.sha1(body).hexdigest())
+
+
+def _group(rows, key):
+    groups = collections.defaultdict(list)
+    for row in rows:
+        groups[row[key]].append(row)
+    return groups
+
+
+def build(tables, stamp=None):
+    """
+    Encodes reference data.
+
+    :param tables: Dictionary mapping each of :py:data:`TABLES` to a list
+                   of its rows, as dictionaries, ordered by id
+    :param stamp: The tables' stamp, from :py:func:`_read_stamp`
+    :return: A :py:class:`Snapshot`
+    """
+    items = {}
+    for table_name in TABLES:
+        for row in tables[table_name]:
+            items[(table_name, row['id'])] = make_payload(row)
+    bulk = {('countries',): make_payload(tables['countries']),
+            ('languages',): make_payload(tables['languages'])}
+    for country_id, regions in _group(tables['regions'],
+                                      'country_id').items():
+        bulk[('regions', country_id)] = make_payload(regions)
+    for region_id, cities in _group(tables['cities'], 'region_id').items():
+        bulk[('cities', region_id)] = make_payload(cities)
+    digest = hashlib.sha1(str(config.REFERENCE_DATA_VERSION).encode('utf-8'))
+    for name in sorted(bulk, key=repr):
+        digest.update(bulk[name].etag.encode('ascii'))
+    rows = {table_name: {row['id']: row for row in tables[table_name]}
+            for table_name in TABLES}
+    return Snapshot(digest.hexdigest()[:12], rows, items, bulk, stamp)
+
+
+def _read_stamp():
+    """
+    :return: Tuple of the row count and largest id of each of
+             :py:data:`TABLES`, read with one query
+    """
+    from api.apiutils import execute_get_all
+    # Note table names are never supplied by a client.
+    rows, _ = execute_get_all(" UNION ALL ".join(
+        "SELECT %d, COUNT(*), MAX(id) FROM `%s`" % (i, table_name)
+        for i, table_name in enumerate(TABLES)), ())
+    return tuple(tuple(row) for row in sorted(rows))
+
+
+def load():
+    """
+    Reads the reference tables and replaces the current snapshot.
+
+    :return: The new :py:class:`Snapshot`
+    """
+    # Imported here because apiutils is not needed to serve a snapshot.
+    from api.apiutils import convert_objects, execute_get_all
+    # Read first, so that changes made while the tables are read are found
+    # by the next check.
+    stamp = _read_stamp()
+    tables = {}
+    for table_name in TABLES:
+        # Note table_name is never supplied by a client.
+        items, description = execute_get_all(
+            "SELECT * FROM `%s` ORDER BY id" % table_name, ())
+        tables[table_name] = convert_objects(items, description)
+    global _snapshot, _checked
+    _snapshot = build(tables, stamp)
+    _checked = time.monotonic()
+    return _snapshot
+
+
+def _refresh():
+    """
+    Rebuilds the snapshot if the tables' stamp has changed.
+    """
+    global _checked
+    if _read_stamp() != _snapshot.stamp:
+        load()
+    else:
+        _checked = time.monotonic()
+
+
+def current(load_if_missing=False):
+    """
+    :param load_if_missing: Whether to build a snapshot if there is none
+    :return: The current :py:class:`Snapshot`, or ``None``. It is first
+             rebuilt if the tables have changed since it was last checked
+             more than ``REFERENCE_DATA_CHECK_SECS`` ago, unless another
+             thread is checking them.
+    """
+    if _snapshot is None:
+        if load_if_missing:
+            with _load_lock:
+                if _snapshot is None:
+                    load()
+        return _snapshot
+    if time.monotonic() - _checked > config.REFERENCE_DATA_CHECK_SECS and \
+            _load_lock.acquire(blocking=False):
+        try:
+            _refresh()
+        finally:
+            _load_lock.release()
+    return _snapshot
+
+
+def clear():
+    global _snapshot, _checked
+    _snapshot = None
+    _checked = 0
+
+
+def respond(payload):
+    """
+    :param payload: A :py:class:`Payload`
+    :return: A response with the payload, gzipped if it has a gzipped form
+             and the client accepts it
+    """
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    if payload.gzipped is not None and accepts_gzip:
+        response = Response(payload.gzipped, HTTPStatus.OK,
+                            mimetype="application/json")
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(payload.body, HTTPStatus.OK,
+                            mimetype="application/json")
+    if payload.gzipped is not None:
+        response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(etag(payload))
+    return response
+
+
+def etag(payload):
+    """
+    :param payload: A :py:class:`Payload`
+    :return: The ETag :py:func:`respond` serves the payload with
+    """
+    accepts_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    # Distinct validators for the two encodings, as RFC 7232 requires.
+    if accepts_gzip and payload.gzipped is not None:
+        return payload.etag + '-gz'
+    return payload.etag
+
+
+def item_etag(table_name, id_):
+    """
+    For :py:func:`api.httpcache.cache_policy` validators.
+
+    :param table_name: One of :py:data:`TABLES`
+    :param id_: The id of a row, as a string or integer
+    :return: The ETag of the row's response, or ``None`` if it is not in
+             the snapshot
+    """
+    payload = get_item(table_name, id_)
+    return None if payload is None else etag(payload)
+
+
+def get_item(table_name, id_):
+    """
+    :param table_name: One of :py:data:`TABLES`
+    :param id_: The id of a row, as a string or integer
+    :return: The row's :py:class:`Payload`, or ``None`` if there is no
+             snapshot or the row is not in it
+    """
+    snapshot = current()
+    if snapshot is None:
+        return None
+    try:
+        return snapshot.items.get((table_name, int(id_)))
+    except ValueError:
+        return None
+
+
+def get_bodies(table_name, ids):
+    """
+    :param table_name: One of :py:data:`TABLES`
+    :param ids: Integer ids of rows
+    :return: Dictionary mapping those of the ids that are in the snapshot
+             to their encoded rows, e.g. for ``apiutils.get_by_ids``
+    """
+    snapshot = current()
+    if snapshot is None:
+        return {}
+    items = snapshot.items
+    return {id_: items[(table_name, id_)].body for id_ in ids
+            if (table_name, id_) in items}
+
+
+def serve_bulk(version, table_name, parent_id=None):
+    """
+    Serves a bulk download from a versioned URL. Requests for an outdated
+    version are redirected to the current one.
+
+    :param version: The version in the requested URL
+    :param table_name: The table to download
+    :param parent_id: For tables in :py:data:`PARENTS`, the id of the parent
+                      whose children to download
+    :return: A response object ready to return to the client
+    """
+    snapshot = current(load_if_missing=True)
+    if version != snapshot.version:
+        return redirect(request.full_path.rstrip("?").replace(
+            "/v/%s/" % version, "/v/%s/" % snapshot.version, 1))
+    if parent_id is None:
+        return respond(snapshot.bulk[(table_name,)])
+    if parent_id not in snapshot.rows[PARENTS[table_name]]:
+        return Response("Invalid %s id" % PARENTS[table_name],
+                        HTTPStatus.METHOD_NOT_ALLOWED)
+    payload = snapshot.bulk.get((table_name, parent_id))
+    return respond(payload if payload is not None else make_payload([]))
+
+
+def manifest():
+    """
+    :return: The current version and the URLs of the bulk downloads, with
+             ``{id}`` standing for a country or region id
+    """
+    version = current(load_if_missing=True).version
+    return {
+        'version': version,
+        'countries': '/location/v/%s/countries' % version,
+        'regions': '/location/v/%s/countries/{id}/regions' % version,
+        'cities': '/location/v/%s/regions/{id}/cities' % version,
+        'languages': '/language/v/%s/languages' % version,
+    }
@@ -0,0 +1,48 @@
+"""
+Turns database result tuples into dictionaries.
+
+A cursor description only changes when the query shape changes, so rather
+than walking it for every row we compile it once into a small function that
+maps a result tuple straight to a dictionary. The function body is a single
+dictionary display (``{'id': row[0], ...}``), which is the cheapest way for
+CPython to build a dictionary of a known shape. Fields that must never reach a
+client (e.g. ``password``) are dropped at compile time rather than popped from
+every row. This saves CPU time only: the dictionaries built are the same as
+before, and take as much memory.
+"""
+from functools import lru_cache
+
+
+def column_names(description):
+    """
+    :param description: A cursor description
+    :return: Tuple of the column names in ``description``
+    """
+    return tuple(column[0] for column in description)
+
+
+@lru_cache(maxsize=512)
+def compile_row_factory(columns, omit=frozenset()):
+    """
+    Compiles a function that converts a result tuple to a dictionary.
+
+    :param columns: Tuple of column names, in cursor order
+    :param omit: Frozen set of column names to leave out
+    :return: Function taking a result tuple and returning a dictionary
+    """
+    fields = ", ".join("%r: row[%d]" % (name, index)
+                       for index, name in enumerate(columns)
+                       if name not in omit)
+    return eval("lambda row: {%s}" % fields, {})
+
+
+def row_factory(description, fields_to_omit=()):
+    """
+    Returns the cached row factory for a cursor description.
+
+    :param description: The cursor's description
+    :param fields_to_omit: Column names to leave out of every row
+    :return: Function taking a result tuple and returning a dictionary
+    """
+    return compile_row_factory(column_names(description),
+                               frozenset(fields_to_omit))
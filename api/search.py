@@ -0,0 +1,332 @@
+"""
+Search over the names of locations and languages, for the autocomplete
+endpoints.
+
+Matching names with ``REGEXP`` scans whole tables, and lets clients send
+patterns that take arbitrarily long to run. Instead, names are held in
+memory folded to lower case without accents, best ranked first:
+
+* Locations are in an :py:class:`Index` of their names' words, and a query
+  matches the names having, for each of the query's words, a word starting
+  with it: ``"new yo"`` matches ``"New York City"`` and ``"sao"`` matches
+  ``"São Paulo"``.
+* Languages are few, so they are in an :py:class:`InfixIndex`, matching
+  anywhere in any of their names as ``REGEXP`` did: ``"put"`` matches
+  ``"Mandarin Chinese/Putonghua"``.
+
+Indexes are built from the reference data snapshot (see
+:py:mod:`api.refdata`) when the app starts. The first time one is used
+after the snapshot is replaced, it is rebuilt on a background thread (see
+:py:mod:`api.background`), and the old index serves requests until the new
+one is ready.
+"""
+import bisect
+import collections
+import array
+import heapq
+import itertools
+import json
+import re
+import threading
+import unicodedata
+
+from flask import Response
+from http import HTTPStatus
+
+from api import background, refdata
+
+# The most locations and languages an autocomplete returns.
+LOCATION_RESULTS = 100
+LANGUAGE_RESULTS = 20
+
+# Matches of prefixes up to this long are listed in advance, since they
+# start too many words to merge per query.
+SHORT_PREFIX = 3
+
+# Ranks of a multi-word query's rarest word intersected at a time.
+INTERSECT_BLOCK = 512
+
+_WORD = re.compile(r"\w+")
+
+# Locations are ranked by level, in this order, then by population.
+_LEVELS = ('countries', 'regions', 'cities')
+
+_indexes = {}
+_build_lock = threading.Lock()
+
+
+def fold(text):
+    """
+    :return: ``text`` in lower case, without accents
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    return "".join(char for char in decomposed
+                   if not unicodedata.combining(char)).casefold()
+
+
+def words(text):
+    """
+    :return: List of the folded words of ``text``
+    """
+    return _WORD.findall(fold(text or ""))
+
+
+class Index:
+    """
+    Documents, each a name and a response body, searchable by word
+    prefixes.
+    """
+
+    def __init__(self, documents):
+        """
+        :param documents: Iterable of ``(name, body)`` pairs, best ranked
+                          first. ``body`` is the encoded JSON to return.
+        """
+        self.bodies = []
+        postings = collections.defaultdict(list)
+        for rank, (name, body) in enumerate(documents):
+            self.bodies.append(body)
+            for word in set(words(name)):
+                postings[word].append(rank)
+        # Every word, sorted, and the ranks of the documents with each word.
+        self.vocabulary = sorted(postings)
+        self.postings = [postings[word] for word in self.vocabulary]
+        short = collections.defaultdict(set)
+        for word, ranks in zip(self.vocabulary, self.postings):
+            for length in range(1, min(len(word), SHORT_PREFIX) + 1):
+                short[word[:length]].update(ranks)
+        self.short = {prefix: sorted(ranks) for prefix, ranks in short.items()}
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def _matching(self, prefix):
+        """
+        :return: Tuple of the form ``(count, ranks)`` where ``ranks`` is an
+                 iterable of the ranks of the documents with a word starting
+                 with ``prefix``, in order, possibly repeated, and ``count``
+                 its length
+        """
+        if len(prefix) <= SHORT_PREFIX:
+            ranks = self.short.get(prefix, ())
+            return len(ranks), ranks
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\U0010ffff",
+                                 start)
+        postings = self.postings[start:end]
+        return sum(map(len, postings)), heapq.merge(*postings)
+
+    def _rank_list(self, prefix):
+        """
+        :return: Sorted list of the ranks of the documents with a word
+                 starting with ``prefix``, without repeats
+        """
+        if len(prefix) <= SHORT_PREFIX:
+            return self.short.get(prefix, [])
+        return sorted(set(self._matching(prefix)[1]))
+
+    def search(self, query, limit):
+        """
+        :param query: Text to search for
+        :param limit: The most documents to return
+        :return: List of the bodies of the best ranked documents having, for
+                 each word of ``query``, a word starting with it. Empty if
+                 ``query`` has no words.
+        """
+        terms = list(collections.OrderedDict.fromkeys(words(query)))
+        if not terms:
+            return []
+        if len(terms) == 1:
+            # Stop merging as soon as there are enough.
+            ranks = _unique(self._matching(terms[0])[1])
+        else:
+            ranks = _intersection(sorted(map(self._rank_list, terms),
+                                         key=len))
+        return [self.bodies[rank] for rank in itertools.islice(ranks, limit)]
+
+
+def _unique(ranks):
+    """
+    :param ranks: Iterable of ranks, in order, possibly repeated
+    :return: Iterator of the ranks without repeats
+    """
+    previous = None
+    for rank in ranks:
+        if rank != previous:
+            previous = rank
+            yield rank
+
+
+def _intersection(rank_lists):
+    """
+    :param rank_lists: Sorted lists of ranks without repeats, shortest first
+    :return: Iterator of the ranks in every list, in order
+    """
+    first = rank_lists[0]
+    # Where each of the other lists continues past the ranks seen so far.
+    positions = [0] * len(rank_lists)
+    # Intersect a block of the first list at a time, so that sets do the
+    # work and a search that finds enough early stops early.
+    for start in range(0, len(first), INTERSECT_BLOCK):
+        block = first[start:start + INTERSECT_BLOCK]
+        common = set(block)
+        for i in range(1, len(rank_lists)):
+            ranks = rank_lists[i]
+            end = bisect.bisect_right(ranks, block[-1], positions[i])
+            common.intersection_update(ranks[positions[i]:end])
+            positions[i] = end
+        yield from sorted(common)
+        if any(positions[i] == len(rank_lists[i])
+               for i in range(1, len(rank_lists))):
+            return
+
+
+class InfixIndex:
+    """
+    Documents, each with names and a response body, searchable by any part
+    of a name.
+    """
+
+    # Length of the substrings whose matches are listed.
+    GRAM = 3
+
+    def __init__(self, documents):
+        """
+        :param documents: Iterable of ``(names, body)`` pairs, best ranked
+                          first. ``body`` is the encoded JSON to return.
+        """
+        self.bodies = []
+        # The folded names of each document, joined by NUL, by rank.
+        self.names = []
+        grams = collections.defaultdict(lambda: array.array('I'))
+        for rank, (names, body) in enumerate(documents):
+            names = [fold(name) for name in names if name]
+            self.bodies.append(body)
+            self.names.append("\0".join(names))
+            found = set()
+            for name in names:
+                for start in range(len(name)):
+                    for end in range(start + 1,
+                                     min(start + self.GRAM, len(name)) + 1):
+                        found.add(name[start:end])
+            for gram in found:
+                grams[gram].append(rank)
+        # Maps every substring of a name up to GRAM long to the ranks of the
+        # documents with it, in order.
+        self.grams = dict(grams)
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def search(self, query, limit):
+        """
+        :param query: Text to search for
+        :param limit: The most documents to return
+        :return: List of the bodies of the best ranked documents with a name
+                 containing ``query``
+        """
+        query = fold(query)
+        if not query:
+            return self.bodies[:limit]
+        if len(query) <= self.GRAM:
+            ranks = self.grams.get(query, ())
+            return [self.bodies[rank] for rank in ranks[:limit]]
+        # Check the documents with the least common of the query's grams.
+        ranks = min((self.grams.get(query[start:start + self.GRAM], ())
+                     for start in range(len(query) - self.GRAM + 1)),
+                    key=len)
+        found = []
+        for rank in ranks:
+            if query in self.names[rank]:
+                found.append(self.bodies[rank])
+                if len(found) == limit:
+                    break
+        return found
+
+
+# Encodes as jsonify does. Flask's json.dumps looks up the app's settings on
+# every call, which is most of the time it takes to build an index.
+_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+
+def _encode(obj):
+    return _encoder.encode(obj).encode('utf-8')
+
+
+def _location_documents(rows):
+    # Locations missing a level have the string 'null' in its field, as
+    # autocomplete has always returned.
+    documents = []
+    for level, table_name in enumerate(_LEVELS):
+        for row in rows[table_name].values():
+            if table_name == 'countries':
+                ids = ('null', 'null', row['id'])
+            elif table_name == 'regions':
+                ids = ('null', row['id'], row.get('country_id'))
+            else:
+                ids = (row['id'], row.get('region_id'), row.get('country_id'))
+            body = _encode({'name': row['name'], 'city_id': ids[0],
+                            'region_id': ids[1], 'country_id': ids[2]})
+            rank = (level, -(row.get('population') or 0),
+                    fold(row['name'] or ""), row['id'])
+            documents.append((rank, row['name'], body))
+    documents.sort(key=lambda document: document[0])
+    return [(name, body) for _, name, body in documents]
+
+
+def _language_documents(rows):
+    # Alternate names follow a slash in the name, e.g. "Mandarin
+    # Chinese/Putonghua", or are among the comma separated tweet terms.
+    languages = sorted(rows['languages'].values(),
+                       key=lambda row: (-(row.get('num_speakers') or 0),
+                                        fold(row['name'] or ""), row['id']))
+    return [((row['name'] or "").split("/") +
+             (row.get('tweet_terms') or "").split(","), _encode(row))
+            for row in languages]
+
+
+def _build(name, index_class, make_documents, snapshot):
+    _indexes[name] = (snapshot, index_class(make_documents(snapshot.rows)))
+
+
+def _index(name, index_class, make_documents):
+    snapshot = refdata.current(load_if_missing=True)
+    built = _indexes.get(name)
+    if built is None:
+        with _build_lock:
+            if name not in _indexes:
+                _build(name, index_class, make_documents, snapshot)
+        built = _indexes[name]
+    elif built[0] is not snapshot:
+        background.run('search ' + name, _build, name, index_class,
+                       make_documents, snapshot)
+    return built[1]
+
+
+def locations():
+    """
+    :return: The :py:class:`Index` of countries, regions and cities in the
+             current reference data, with autocomplete response bodies
+    """
+    return _index('locations', Index, _location_documents)
+
+
+def languages():
+    """
+    :return: The :py:class:`InfixIndex` of languages in the current
+             reference data, most spoken first, with their rows as bodies
+    """
+    return _index('languages', InfixIndex, _language_documents)
+
+
+def clear():
+    _indexes.clear()
+
+
+def respond(bodies):
+    """
+    :param bodies: Encoded JSON objects, e.g. from :py:meth:`Index.search`
+    :return: A response with the JSON list of the objects
+    """
+    return Response(b"[" + b",".join(bodies) + b"]\n", HTTPStatus.OK,
+                    mimetype="application/json")
@@ -0,0 +1,179 @@
+"""
+Builds the INSERT and UPDATE statements behind ``execute_post_by_table`` and
+``execute_put_by_id``.
+
+The column names in those statements come from the client's request body,
+so they are checked before they get anywhere near SQL: every name must be a
+plain identifier and, once the table's schema has been loaded, an actual
+column of the table. Values are coerced to the column's type so that bad
+input is rejected with a 400 rather than a database error. The SQL text and
+the column checks for each (table, columns) shape are done once and
+memoized, leaving only the per-value coercion for each request.
+"""
+import collections
+import re
+from functools import lru_cache
+from operator import itemgetter
+
+Column = collections.namedtuple('Column', ['name', 'data_type', 'nullable'])
+
+# ``sql`` is the statement text and ``bind`` a function that takes the request
+# content and returns the statement's arguments, validated and coerced.
+Statement = collections.namedtuple('Statement', ['sql', 'bind'])
+
+INTEGER_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'integer',
+                 'bigint', 'bit'}
+REAL_TYPES = {'decimal', 'numeric', 'float', 'double', 'real'}
+TEXT_TYPES = {'char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext',
+              'enum', 'set'}
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Table name -> {column name: Column}, filled by load_schema.
+_schemas = {}
+
+
+class InvalidFieldError(ValueError):
+    """
+    Raised when a request names a column that does not exist or supplies a
+    value that cannot be stored in it.
+    """
+    pass
+
+
+def load_schema(rows):
+    """
+    Caches table schemas.
+
+    :param rows: Iterable of ``(table, column, data_type, is_nullable)``
+                 tuples, as selected from ``information_schema.columns``
+    """
+    schemas = collections.defaultdict(collections.OrderedDict)
+    for table, column, data_type, is_nullable in rows:
+        schemas[table][column] = Column(column, data_type.lower(),
+                                        is_nullable == 'YES')
+    _schemas.update(schemas)
+    _clear_statements()
+
+
+def clear_schema():
+    _schemas.clear()
+    _clear_statements()
+
+
+def _clear_statements():
+    insert_statement.cache_clear()
+    update_statement.cache_clear()
+
+
+def table_schema(table_name):
+    """
+    :param table_name: The table to look up
+    :return: Mapping of column names to :py:class:`Column`, or ``None`` if
+             the table's schema has not been loaded
+    """
+    return _schemas.get(table_name)
+
+
+def _to_int(value):
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+def _to_text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        raise ValueError
+    return str(value)
+
+
+def coercer(column):
+    """
+    Builds a function converting request values to the Python type matching
+    a column.
+
+    :param column: The :py:class:`Column` the values are for
+    :return: Function taking a value and returning the converted value, or
+             raising :py:class:`InvalidFieldError` if it does not fit
+    """
+    if column.data_type in INTEGER_TYPES:
+        convert, kind = _to_int, "an integer"
+    elif column.data_type in REAL_TYPES:
+        convert, kind = float, "a number"
+    elif column.data_type in TEXT_TYPES:
+        convert, kind = _to_text, "text"
+    else:
+        convert, kind = None, None
+
+    def coerce(value):
+        if value is None:
+            if not column.nullable:
+                raise InvalidFieldError("%s cannot be null" % column.name)
+            return None
+        if convert is None:
+            return value
+        try:
+            return convert(value)
+        except (TypeError, ValueError):
+            raise InvalidFieldError("%s must be %s" % (column.name, kind))
+
+    return coerce
+
+
+def _compile_binding(table_name, columns):
+    """
+    Checks a statement's columns once and builds the function that pulls
+    their values out of a request.
+
+    :return: Function taking the request content and returning a tuple of
+             values, in the order of ``columns``
+    :raises InvalidFieldError: if a column name is not acceptable
+    """
+    schema = table_schema(table_name)
+    for name in columns:
+        if not _IDENTIFIER.match(name):
+            raise InvalidFieldError("Invalid field name")
+        if schema is not None and name not in schema:
+            raise InvalidFieldError("Unknown field %s" % name)
+    if not columns:
+        return lambda content: ()
+    if schema is None:
+        if len(columns) == 1:
+            name = columns[0]
+            return lambda content: (content[name],)
+        return itemgetter(*columns)
+    coercers = tuple((name, coercer(schema[name])) for name in columns)
+    return lambda content: tuple([coerce(content[name])
+                                  for name, coerce in coercers])
+
+
+@lru_cache(maxsize=256)
+def insert_statement(table_name, columns, ignore=False):
+    """
+    :param table_name: The table to insert into
+    :param columns: Tuple of column names
+    :param ignore: Whether to make it an INSERT IGNORE, which inserts
+                   nothing where a row with the same unique key exists
+    :return: A :py:class:`Statement` for an INSERT with a ``%s`` per column
+    :raises InvalidFieldError: if a column name is not acceptable
+    """
+    sql = "INSERT %sINTO %s (%s)  values (%s);" % (
+        "IGNORE " if ignore else "", table_name, ','.join(columns),
+        ", ".join(["%s"] * len(columns)))
+    return Statement(sql, _compile_binding(table_name, columns))
+
+
+@lru_cache(maxsize=256)
+def update_statement(table_name, columns):
+    """
+    :param table_name: The table to update
+    :param columns: Tuple of column names to set
+    :return: A :py:class:`Statement` for an UPDATE with a ``%s`` per column
+             followed by one for the row id
+    :raises InvalidFieldError: if a column name is not acceptable
+    """
+    sql = "UPDATE %s SET %s WHERE id=%%s" % (
+        table_name, ", ".join("%s=%%s" % col for col in columns))
+    return Statement(sql, _compile_binding(table_name, columns))
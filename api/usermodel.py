@@ -0,0 +1,119 @@
+"""
+The user model shared by the accounts and users blueprints.
+
+A :py:class:`User` is an immutable tuple of the ``users`` columns that
+sessions read: those ``/account/token`` returns and the password hash. It is
+built straight from a result tuple by a function compiled once per cursor
+description, like the row factories in :py:mod:`api.rows`. Users are kept in
+the session cache (see ``api/blueprints/accounts/controllers.py``), so they
+are small: a tuple, with no dictionary per instance.
+
+What may be sent to whom is explicit. Users are served to anyone with only
+their :py:data:`PUBLIC_FIELDS`, straight from rows by
+:py:func:`public_factory`, and :py:meth:`User.account`, for the user
+themselves, leaves out only the password hash.
+"""
+import collections
+from functools import lru_cache
+
+from api.rows import column_names
+
+# Fields anyone may see.
+PUBLIC_FIELDS = ('id', 'username', 'first_name', 'last_name', 'role',
+                 'register_date', 'last_login', 'gender', 'about_me',
+                 'img_link', 'confirmed', 'network_activity',
+                 'events_upcoming', 'events_interested_in', 'company_news')
+
+# Fields /account/token returns to the user.
+ACCOUNT_FIELDS = ('id', 'username', 'email', 'about_me', 'first_name',
+                  'last_name', 'role', 'last_login', 'gender', 'img_link')
+
+# Every field of a User, in order.
+FIELDS = ACCOUNT_FIELDS + ('password_hash',)
+
+# The column of each field whose column is named differently.
+COLUMNS = {'password_hash': 'password'}
+
+# The columns of users that are not public fields: the email, password and
+# the activation and password reset codes. public_factory leaves out these
+# and any other column; the object cache marks its bodies with them.
+PRIVATE_COLUMNS = ('email', 'password', 'act_code', 'fp_code')
+
+
+class User(collections.namedtuple('User', FIELDS)):
+    """
+    A user, with the fields in :py:data:`FIELDS`. Fields whose columns were
+    not selected are ``None``.
+    """
+
+    __slots__ = ()
+
+    # A dictionary display, which builds the dictionary about twice as fast
+    # as dict(zip(ACCOUNT_FIELDS, self)).
+    account = eval("lambda self: {%s}" % ", ".join(
+        "%r: self[%d]" % (field, index)
+        for index, field in enumerate(ACCOUNT_FIELDS)), {})
+    account.__doc__ = """
+        :return: Dictionary of the fields the user may see
+        """
+
+    @classmethod
+    def from_dict(cls, user_obj):
+        """
+        :param user_obj: A row of users as a dictionary, by column name
+        :return: The :py:class:`User`
+        """
+        return cls(*[user_obj.get(COLUMNS.get(field, field))
+                      for field in FIELDS])
+
+
+@lru_cache(maxsize=64)
+def compile_user_factory(columns):
+    """
+    Compiles a function that converts a result tuple to a :py:class:`User`.
+
+    :param columns: Tuple of column names, in cursor order
+    :return: Function taking a result tuple and returning a User
+    """
+    values = []
+    for field in FIELDS:
+        column = COLUMNS.get(field, field)
+        values.append("row[%d]" % columns.index(column) if column in columns
+                      else "None")
+    return eval("lambda row: new(User, (%s,))" % ", ".join(values),
+                {'new': tuple.__new__, 'User': User})
+
+
+def user_factory(description):
+    """
+    Returns the cached User factory for a cursor description.
+
+    :param description: The cursor's description
+    :return: Function taking a result tuple and returning a User
+    """
+    return compile_user_factory(column_names(description))
+
+
+@lru_cache(maxsize=64)
+def compile_public_factory(columns):
+    """
+    Compiles a function that converts a result tuple of users to a
+    dictionary of the :py:data:`PUBLIC_FIELDS` selected.
+
+    :param columns: Tuple of column names, in cursor order
+    :return: Function taking a result tuple and returning a dictionary
+    """
+    fields = ", ".join("%r: row[%d]" % (field, columns.index(field))
+                       for field in PUBLIC_FIELDS if field in columns)
+    return eval("lambda row: {%s}" % fields, {})
+
+
+def public_factory(description):
+    """
+    Returns the cached public projection of users for a cursor description,
+    e.g. for :py:func:`api.apiutils.get_by_id`.
+
+    :param description: The cursor's description
+    :return: Function taking a result tuple and returning a dictionary
+    """
+    return compile_public_factory(column_names(description))
@@ -0,0 +1,82 @@
+"""Cost of authenticating a request by token
+
+Times the token check every ``login_required`` route runs, the way it used
+to work (a new serializer, a signature check and a read of the user on
+every request) against the cached sessions in
+``api/blueprints/accounts/controllers.py``, and then a whole request to
+``/account/token`` with each. The stand-in database adds a simulated round
+trip to every statement.
+
+Usage: python bin/bench_auth.py [requests]
+"""
+
+import base64
+import sys
+
+from benchutil import StandInDatabase, make_app, measure, report
+from flask import g
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+from api import api
+from api.blueprints.accounts import controllers
+from api.blueprints.accounts.controllers import generate_auth_token, \
+    verify_password
+from api.blueprints.users.utils import get_user_by_id
+from api.credentials import secret_key
+
+QUERY_SECS = 0.0005
+
+
+def old_verify_password(token, password):
+    s = Serializer(secret_key)
+    data = s.loads(token)
+    g.user = get_user_by_id(data["id"])
+    return True
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    database = StandInDatabase(query_latency=QUERY_SECS)
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "first_name TEXT, last_name TEXT, email TEXT, password TEXT, "
+        "role INTEGER, register_date TEXT, last_login TEXT, gender TEXT, "
+        "about_me TEXT, img_link TEXT);"
+        "INSERT INTO users VALUES (1, 'alice', 'Alice', 'A', "
+        "'alice@example.com', '098f6bcd4621d373cade4e832627b4f6', 0, "
+        "'2018-08-21 23:36:05', '2018-08-21 23:36:05', NULL, NULL, NULL);")
+    app = make_app(database)
+    client = app.test_client()
+    with app.app_context():
+        token = generate_auth_token(get_user_by_id(1)).decode('ascii')
+    headers = {'Authorization': 'Basic ' + base64.b64encode(
+        (token + ':').encode('ascii')).decode('ascii')}
+
+    def check(verify):
+        def fn():
+            with api.test_request_context('/account/token'):
+                assert verify(token, '')
+        return fn
+
+    def get_token():
+        assert client.get('/account/token', headers=headers).status_code == 200
+
+    try:
+        for label, fn in (("token check, uncached", check(old_verify_password)),
+                          ("token check, cached", check(verify_password)),
+                          ("/account/token, uncached", get_token),
+                          ("/account/token, cached", get_token)):
+            if label.endswith("uncached"):
+                controllers.auth.verify_password(old_verify_password)
+            else:
+                controllers.auth.verify_password(verify_password)
+            statements = database.statements
+            elapsed, rate = measure(fn, requests)
+            report(label, elapsed, rate, "%.3fms/request, %d statements" % (
+                1000 * elapsed / requests,
+                (database.statements - statements) / requests))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Latency of /location/autocomplete over a realistically sized city list
+
+Times the ``REGEXP`` queries autocomplete used to run and the in-memory
+index (see ``api/search.py``) over about as many cities as the GeoNames
+list of places with at least 1000 people, with made up names.
+
+Usage: python bin/bench_autocomplete.py [requests] [cities]
+"""
+
+import random
+import sys
+import time
+
+from benchutil import StandInDatabase, make_app, measure, report
+from api import search
+
+SYLLABLES = ('san', 'ta', 'ber', 'lin', 'mar', 'ko', 'vo', 'ville', 'new',
+             'port', 'é', 'rio', 'burg', 'ham', 'ton', 'a', 'cruz', 'gra')
+
+QUERIES = ('s', 'new', 'mar ko', 'portvillé', 'zzz')
+
+SQL_QUERIES = (
+    "SELECT cities.name, id AS city_id, region_id, country_id "
+    "FROM cities WHERE cities.name REGEXP %s LIMIT 100",
+    "SELECT regions.name, 'null' AS city_id, id AS region_id, country_id "
+    "FROM regions WHERE regions.name REGEXP %s LIMIT 100",
+    "SELECT countries.name, 'null' AS city_id, 'null' AS region_id, "
+    "id AS country_id FROM countries WHERE countries.name REGEXP %s LIMIT 100")
+
+
+def name(rng):
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+        .capitalize() for _ in range(rng.choice((1, 1, 1, 2, 3))))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    cities = int(sys.argv[2]) if len(sys.argv) > 2 else 140000
+    rng = random.Random(0)
+    database = StandInDatabase()
+    database.executescript(
+        "CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT, "
+        "population INTEGER);"
+        "CREATE TABLE regions (id INTEGER PRIMARY KEY, country_id INTEGER, "
+        "name TEXT, population INTEGER);"
+        "CREATE TABLE cities (id INTEGER PRIMARY KEY, region_id INTEGER, "
+        "country_id INTEGER, name TEXT, population INTEGER);"
+        "CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT);")
+    connection = database.connect()
+    cursor = connection.cursor()
+    cursor.executemany("INSERT INTO countries VALUES (%s, %s, %s)",
+                       [(i, name(rng), 0) for i in range(250)])
+    cursor.executemany("INSERT INTO regions VALUES (%s, %s, %s, %s)",
+                       [(i, i % 250, name(rng), 0) for i in range(4000)])
+    cursor.executemany("INSERT INTO cities VALUES (%s, %s, %s, %s, %s)",
+                       [(i, i % 4000, i % 250, name(rng),
+                         int(1000 * rng.paretovariate(1)))
+                        for i in range(cities)])
+    connection.commit()
+    app = make_app(database)
+    client = app.test_client()
+    try:
+        for query in QUERIES:
+            def sql():
+                for statement in SQL_QUERIES:
+                    cursor.execute(statement, (query,))
+                    cursor.fetchall()
+            elapsed, rate = measure(sql, max(1, requests // 10))
+            report("regexp, %r" % query, elapsed, rate,
+                   "%.3fms/request" % (1000 * elapsed / max(1, requests // 10)))
+
+        start = time.perf_counter()
+        with app.app_context():
+            index = search.locations()
+        report("index build, %d names" % len(index),
+               time.perf_counter() - start, 1)
+        for query in QUERIES:
+            elapsed, rate = measure(
+                lambda: index.search(query, search.LOCATION_RESULTS),
+                requests * 100)
+            report("index, %r" % query, elapsed, rate,
+                   "%.1fus/search" % (1e6 * elapsed / (requests * 100)))
+            path = '/location/autocomplete?input_text=%s' % query
+            assert client.get(path).status_code == 200
+            elapsed, rate = measure(lambda: client.get(path), requests)
+            report("endpoint, %r" % query, elapsed, rate,
+                   "%.3fms/request" % (1000 * elapsed / requests))
+    finally:
+        connection.close()
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Rendering a page of posts: one request per author vs one batch request
+
+A client showing a page of posts needs each post's author. It can fetch them
+with ``GET /user/<id>`` once per post or with a single
+``GET /user/batch?ids=...``. Both are timed with the object cache off, so
+every lookup reaches the stand-in database, which adds a simulated round
+trip to every statement. Request overhead on a real network would widen the
+gap further.
+
+Usage: python bin/bench_batch.py [pages] [page size]
+"""
+
+import sys
+
+from benchutil import StandInDatabase, make_app, measure, report
+from api import objectcache
+
+QUERY_SECS = 0.0005
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    database = StandInDatabase(query_latency=QUERY_SECS)
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "email TEXT, password TEXT, about_me TEXT);" +
+        "".join("INSERT INTO users VALUES (%d, 'user%d', 'e', 'p', '%s');"
+                % (i, i, 'x' * 200) for i in range(1, page_size + 1)))
+    app = make_app(database)
+    client = app.test_client()
+    ids = list(range(1, page_size + 1))
+    query = {'ids': ",".join(str(id_) for id_ in ids)}
+
+    def singles():
+        for id_ in ids:
+            assert client.get('/user/%d' % id_).status_code == 200
+
+    def batch():
+        assert len(client.get('/user/batch', query_string=query).json) == \
+            page_size
+
+    objectcache.set_backend(None)
+    try:
+        for label, fn in (("%d single gets" % page_size, singles),
+                          ("1 batch get of %d" % page_size, batch)):
+            statements = database.statements
+            elapsed, rate = measure(fn, pages)
+            report(label, elapsed, rate, "pages, %d statements" % (
+                database.statements - statements))
+    finally:
+        objectcache.set_backend(objectcache.LocalBackend())
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Latency of the count endpoints as networks grow
+
+Times ``GET /network/<id>/post_count`` for networks of increasing size,
+counting the posts on every request (``LIVE_COUNTS``) and reading the
+maintained counter, created by ``counters.reconcile`` as after deploying.
+Posts are indexed by ``id_network``, as in production, so a live count reads
+one index entry per post in the network.
+
+Usage: python bin/bench_counts.py [requests]
+"""
+
+import sys
+
+from benchutil import StandInDatabase, make_app, measure, report
+from api import cache, config, counters
+
+SIZES = (100, 10000, 100000)
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    database = StandInDatabase()
+    database.executescript(
+        counters.SCHEMA +
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY);"
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY, id_network INTEGER);"
+        "CREATE INDEX posts_network ON posts (id_network);" +
+        "".join("INSERT INTO networks VALUES (%d);" % size
+                for size in SIZES))
+    for size in SIZES:
+        database.executescript(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %d) INSERT INTO posts (id_network) SELECT %d FROM n;"
+            % (size, size))
+    app = make_app(database)
+    client = app.test_client()
+    with app.app_context():
+        counters.reconcile(['post_count'])
+    try:
+        for live in (True, False):
+            config.LIVE_COUNTS = live
+            cache.clear_all()
+            for size in SIZES:
+                path = '/network/%d/post_count' % size
+                assert client.get(path).json == {'post_count': size}
+                elapsed, rate = measure(lambda: client.get(path), requests)
+                report("%s, %d posts" % ("live" if live else "counter", size),
+                       elapsed, rate,
+                       "%.3fms/request" % (1000 * elapsed / requests))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
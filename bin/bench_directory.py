@@ -0,0 +1,105 @@
+"""GET /network/networks: filtering the networks table vs the directory
+
+Times finding an existing network by its locations the way
+``/network/networks`` used to, filtering ``networks`` on seven columns,
+against looking its key up in the in-memory directory (see
+``api/networkdir.py``) and reading it by id, and reports the memory the
+directory keeps and the peak while it loads. The stand-in database adds a
+simulated round trip to every statement.
+
+Usage: python bin/bench_directory.py [requests] [networks]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from benchutil import StandInDatabase, make_app, measure, report
+from flask import request
+from api import api, networkdir
+from api.apiutils import get_paginated
+from api.blueprints.networks.controllers import get_networks
+
+QUERY_SECS = 0.0005
+
+
+def old_handler():
+    return get_paginated(
+        "SELECT * FROM networks WHERE id_country_cur=%s AND "
+        "id_region_cur=%s AND id_city_cur=%s AND id_country_origin=%s AND "
+        "id_region_origin=%s AND id_city_origin=%s ",
+        selection_fields=request.args["near_location"].split(",") +
+        request.args["from_location"].split(","),
+        args=request.args, order_keys=("id",), max_arg="max_id")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    networks = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    rng = random.Random(0)
+    rows = {}
+    while len(rows) < networks:
+        near = (rng.randrange(200), rng.randrange(4000), rng.randrange(10 ** 5))
+        origin = (rng.randrange(200), rng.randrange(4000),
+                  rng.randrange(10 ** 5))
+        rows["%d,%d,%d/%d,%d,%d/" % (near + origin)] = near + origin
+    database = StandInDatabase(query_latency=QUERY_SECS)
+    database.executescript(
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY, "
+        "id_country_cur INTEGER, id_region_cur INTEGER, id_city_cur INTEGER, "
+        "id_country_origin INTEGER, id_region_origin INTEGER, "
+        "id_city_origin INTEGER, network_key TEXT UNIQUE);"
+        "CREATE INDEX network_locations ON networks (id_country_cur, "
+        "id_region_cur, id_city_cur, id_country_origin, id_region_origin, "
+        "id_city_origin);")
+    connection = database.connect()
+    connection.cursor().executemany(
+        "INSERT INTO networks VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        [(i + 1,) + ids + (key,) for i, (key, ids) in enumerate(rows.items())])
+    connection.commit()
+    connection.close()
+    make_app(database)
+    samples = [{'near_location': "%d,%d,%d" % ids[:3],
+                'from_location': "%d,%d,%d" % ids[3:]}
+               for ids in rng.sample(list(rows.values()), requests)]
+    try:
+        with api.app_context():
+            tracemalloc.start()
+            start = time.perf_counter()
+            directory = networkdir.load()
+            elapsed = time.perf_counter() - start
+            size, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        report("directory load, %d networks" % len(directory), elapsed, 1,
+               "%.1fMB kept, %.1fMB peak while loading" % (size / 2 ** 20,
+                                                           peak / 2 ** 20))
+
+        # Called directly rather than through a test client, to leave out
+        # the cost of handling a request. Every query of a run is different,
+        # so the directory's networks come from the object cache only when
+        # asked for again.
+        queries = []
+
+        def run(handler):
+            def fn():
+                with api.test_request_context('/network/networks',
+                                              query_string=queries.pop()):
+                    assert len(handler().json) == 1
+            return fn
+
+        for label, handler in (("filter networks", old_handler),
+                               ("directory", get_networks),
+                               ("directory, asked again", get_networks)):
+            queries[:] = samples
+            statements = database.statements
+            elapsed, rate = measure(run(handler), requests)
+            report(label, elapsed, rate, "%.2fms/request, %d statements" % (
+                1000 * elapsed / requests,
+                (database.statements - statements) / requests))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Bandwidth and server time of screen refreshes with and without ETags
+
+Replays a client refreshing the same screens (a network, its members'
+profiles and posts, and a post's replies) several times over. The first run
+ignores ETags and downloads every payload again, as clients had to while
+every response was marked no-store. The second run sends the ETag it last
+saw in ``If-None-Match`` and receives ``304 Not Modified`` for unchanged
+payloads. Time is measured in-process, so it is the server's share of the
+work; the bytes are the response bodies that would go over the network.
+
+Usage: python bin/bench_etags.py [refreshes]
+"""
+
+import sys
+import time
+
+from benchutil import StandInDatabase, make_app, report
+from api import cache, counters
+
+PATHS = (['/network/1', '/network/1/user_count', '/network/1/events'] +
+         ['/user/%d' % i for i in range(1, 21)] +
+         ['/user/%d/posts' % i for i in range(1, 6)] +
+         ['/post/%d/replies' % i for i in range(1, 11)])
+
+
+def replay(client, refreshes, conditional):
+    etags = {}
+    sent = 0
+    not_modified = 0
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    for _ in range(refreshes):
+        for path in PATHS:
+            headers = {}
+            if conditional and path in etags:
+                headers['If-None-Match'] = etags[path]
+            response = client.get(path, headers=headers)
+            assert response.status_code in (200, 304)
+            not_modified += response.status_code == 304
+            sent += len(response.data)
+            if 'ETag' in response.headers:
+                etags[path] = response.headers['ETag']
+    return (time.perf_counter() - start_wall,
+            time.process_time() - start_cpu, sent, not_modified)
+
+
+def main():
+    refreshes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    database = StandInDatabase()
+    database.executescript(
+        counters.SCHEMA +
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY, city_cur TEXT);"
+        "INSERT INTO networks VALUES (1, 'Palo Alto');"
+        "CREATE TABLE network_registration (id_user INTEGER, "
+        "id_network INTEGER, join_date TEXT);"
+        "CREATE TABLE events (id INTEGER PRIMARY KEY, id_network INTEGER, "
+        "title TEXT, description TEXT);"
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "email TEXT, password TEXT, about_me TEXT);"
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY, id_user INTEGER, "
+        "post_text TEXT);"
+        "CREATE TABLE post_replies (id INTEGER PRIMARY KEY, "
+        "id_parent INTEGER, reply_text TEXT);" +
+        "".join("INSERT INTO users VALUES (%d, 'user%d', 'e', 'p', '%s');"
+                "INSERT INTO network_registration VALUES (%d, 1, '2018');"
+                % (i, i, 'about ' * 30, i) for i in range(1, 21)) +
+        "".join("INSERT INTO events VALUES (%d, 1, 'Event', '%s');"
+                % (i, 'details ' * 20) for i in range(1, 11)) +
+        "".join("INSERT INTO posts VALUES (%d, %d, '%s');"
+                % (i, i % 5 + 1, 'post ' * 40) for i in range(1, 101)) +
+        "".join("INSERT INTO post_replies VALUES (%d, %d, '%s');"
+                % (i, i % 10 + 1, 'reply ' * 20) for i in range(1, 201)))
+    app = make_app(database)
+    client = app.test_client()
+    try:
+        for label, conditional in (("unconditional", False),
+                                   ("If-None-Match", True)):
+            cache.clear_all()
+            wall, cpu, sent, not_modified = replay(client, refreshes,
+                                                   conditional)
+            requests = refreshes * len(PATHS)
+            report(label, wall, requests / wall,
+                   "%.1f KB sent, %.3fs CPU, %d of %d not modified" % (
+                       sent / 1024, cpu, not_modified, requests))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Joining a user to many networks: one request per network vs one bulk call
+
+Each simulated user joins the same set of networks, either through
+``POST /user/joinNetwork/<id>`` once per network (an existence check, an
+INSERT and a commit each time) or through a single
+``POST /user/joinNetworks`` (one existence query, one registration lookup
+and one multi-row INSERT in one transaction). The stand-in database adds a
+simulated round trip to every statement.
+
+Usage: python bin/bench_joins.py [users] [networks]
+"""
+
+import base64
+import sys
+
+from benchutil import StandInDatabase, make_app, measure, report
+from api import cache, counters
+from api.blueprints.accounts.controllers import generate_auth_token
+from api.usermodel import User
+
+QUERY_SECS = 0.0005
+USER_COLUMNS = ('id', 'username', 'email', 'password', 'about_me',
+                'first_name', 'last_name', 'role', 'last_login', 'gender',
+                'img_link')
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    networks = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    database = StandInDatabase(query_latency=QUERY_SECS)
+    database.executescript(
+        counters.SCHEMA +
+        "CREATE TABLE users (%s);" % ", ".join(
+            column + (" INTEGER PRIMARY KEY" if column == "id" else " TEXT")
+            for column in USER_COLUMNS) +
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY);"
+        "CREATE TABLE network_registration (id_user INTEGER, "
+        "id_network INTEGER, join_date TEXT, "
+        "PRIMARY KEY (id_user, id_network));" +
+        "".join("INSERT INTO users (id, username, password) "
+                "VALUES (%d, 'user%d', 'p');" % (i, i)
+                for i in range(1, 2 * users + 1)) +
+        "".join("INSERT INTO networks VALUES (%d);" % i
+                for i in range(1, networks + 1)))
+    app = make_app(database)
+    client = app.test_client()
+    with app.app_context():
+        headers = [{'Authorization': 'Basic ' + base64.b64encode(
+            generate_auth_token(User.from_dict({'id': i, 'password': 'p'})) +
+            b':').decode('ascii')}
+            for i in range(1, 2 * users + 1)]
+    ids = list(range(1, networks + 1))
+    users_left = iter(headers)
+
+    def one_at_a_time():
+        cache.clear_all()
+        auth = next(users_left)
+        for network_id in ids:
+            response = client.post('/user/joinNetwork/%d' % network_id,
+                                   headers=auth)
+            assert response.status_code == 200
+
+    def bulk():
+        cache.clear_all()
+        response = client.post('/user/joinNetworks', json={'ids': ids},
+                               headers=next(users_left))
+        assert response.status_code == 200
+
+    try:
+        for label, fn in (("one request per network", one_at_a_time),
+                          ("one bulk request", bulk)):
+            statements = database.statements
+            elapsed, rate = measure(fn, users)
+            report(label, elapsed, rate * networks,
+                   "joins/s, %.1f statements per user" %
+                   ((database.statements - statements) / users))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Memory and latency of /language/autocomplete
+
+Builds the language index (see ``api/search.py``) over about as many
+languages as are spoken in the world, with made up names, and reports the
+memory it takes and the median and 99th percentile latency of searches,
+against the ``REGEXP ... ORDER BY num_speakers`` query autocomplete used to
+run.
+
+Usage: python bin/bench_languages.py [requests] [languages]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from benchutil import StandInDatabase, make_app, report
+from api import refdata, search
+
+SYLLABLES = ('man', 'da', 'rin', 'en', 'glish', 'ben', 'ga', 'li', 'fren',
+             'ch', 'ç', 'pu', 'ton', 'hua', 'ta', 'mil', 'ko', 'nan', 'é')
+
+QUERIES = ('e', 'en', 'gli', 'glish', 'tonhua', 'zzzz')
+
+SQL_QUERY = "SELECT * FROM languages WHERE languages.name REGEXP %s " \
+            "ORDER BY num_speakers DESC LIMIT 20"
+
+
+def name(rng):
+    return "".join(rng.choice(SYLLABLES)
+                   for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def percentiles(fn, repeat):
+    """
+    :return: Tuple of the form ``(median, 99th percentile)`` of the seconds
+             ``fn`` takes
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.99)]
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    languages = int(sys.argv[2]) if len(sys.argv) > 2 else 7000
+    rng = random.Random(0)
+    database = StandInDatabase()
+    database.executescript(
+        "CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT);"
+        "CREATE TABLE regions (id INTEGER PRIMARY KEY, name TEXT);"
+        "CREATE TABLE cities (id INTEGER PRIMARY KEY, name TEXT);"
+        "CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT, "
+        "num_speakers INTEGER, added INTEGER, tweet_terms TEXT, "
+        "tweet_terms_override TEXT);")
+    connection = database.connect()
+    cursor = connection.cursor()
+    cursor.executemany(
+        "INSERT INTO languages VALUES (%s, %s, %s, 0, %s, NULL)",
+        [(i, "%s/%s" % (name(rng), name(rng)),
+          int(rng.paretovariate(0.7)), name(rng)) for i in range(languages)])
+    connection.commit()
+    app = make_app(database)
+    client = app.test_client()
+    try:
+        with app.app_context():
+            refdata.load()
+            tracemalloc.start()
+            start = time.perf_counter()
+            index = search.languages()
+            elapsed = time.perf_counter() - start
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        report("index build, %d languages" % len(index), elapsed, 1,
+               "%.1fMB" % (size / 2 ** 20))
+        for query in QUERIES:
+            median, p99 = percentiles(
+                lambda: (cursor.execute(SQL_QUERY, (query,)),
+                         cursor.fetchall()), max(1, requests // 10))
+            report("regexp, %r" % query, median, 1 / median,
+                   "p50 %.1fus p99 %.1fus" % (1e6 * median, 1e6 * p99))
+            median, p99 = percentiles(
+                lambda: index.search(query, search.LANGUAGE_RESULTS),
+                requests)
+            report("index, %r" % query, median, 1 / median,
+                   "p50 %.1fus p99 %.1fus" % (1e6 * median, 1e6 * p99))
+            path = '/language/autocomplete?input_text=%s' % query
+            assert client.get(path).status_code == 200
+            median, p99 = percentiles(lambda: client.get(path),
+                                      max(1, requests // 10))
+            report("endpoint, %r" % query, median, 1 / median,
+                   "p50 %.1fus p99 %.1fus" % (1e6 * median, 1e6 * p99))
+    finally:
+        connection.close()
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Logins under load
+
+Runs LOGIN_THREADS threads logging in with a username and password as fast
+as they can. Reports the logins per second and statements per login of the
+old lookup (by email, then by username) with unsalted MD5, and of the one
+query lookup with the preferred hasher on the password hashing pool (see
+``api/passwords.py``). Then it reports the rate and latency of requests
+authenticated by token during such a storm, with hashes computed on the
+pool and, as if there were no pool, on the request threads. The stand-in
+database adds a simulated round trip to every statement.
+
+Usage: python bin/bench_logins.py [seconds]
+"""
+
+import base64
+import mock
+import sys
+import threading
+import time
+
+from benchutil import StandInDatabase, make_app, report
+from api import api, passwords
+from api.apiutils import execute_get_one
+from api.blueprints.accounts import controllers
+from api.blueprints.users.utils import get_user_by_id
+from api.usermodel import user_factory
+
+QUERY_SECS = 0.0005
+LOGIN_THREADS = 16
+USERS = 1000
+
+OLD_LOOKUP = ("SELECT * FROM users WHERE email=%s",
+              "SELECT * FROM users WHERE username=%s")
+
+
+def headers(username, password=''):
+    credentials = ('%s:%s' % (username, password)).encode('utf-8')
+    return {'Authorization': 'Basic ' + base64.b64encode(credentials).decode()}
+
+
+def old_get_user_by_login(login):
+    # Emails are never usernames here, so both queries always run.
+    for query in OLD_LOOKUP:
+        item, description = execute_get_one(query, (login,))
+        if item is not None:
+            return user_factory(description)(item)
+    return None
+
+
+def storm(app, seconds, stop, counter):
+    def login(i):
+        client = app.test_client()
+        while not stop.is_set():
+            user = i % USERS + 1
+            response = client.get('/account/token',
+                                  headers=headers('user%d' % user, 'test'))
+            assert response.status_code == 200
+            counter.append(1)
+
+    threads = [threading.Thread(target=login, args=(i,))
+               for i in range(LOGIN_THREADS)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    database = StandInDatabase(query_latency=QUERY_SECS)
+    pbkdf2 = passwords.HASHERS['pbkdf2_sha256'].encode('test')
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, "
+        "first_name TEXT, last_name TEXT, email TEXT UNIQUE, password TEXT, "
+        "role INTEGER, register_date TEXT, last_login TEXT, gender TEXT, "
+        "about_me TEXT, img_link TEXT);" + "".join(
+            "INSERT INTO users VALUES (%d, 'user%d', NULL, NULL, "
+            "'user%d@example.com', '%s', 0, NULL, NULL, NULL, NULL, NULL);"
+            % (i, i, i, pbkdf2) for i in range(1, USERS + 1)))
+    app = make_app(database)
+
+    try:
+        for label, lookup, hasher in (
+                ("2 queries, md5", old_get_user_by_login, 'md5'),
+                ("1 query, pbkdf2_sha256", controllers.get_user_by_login,
+                 'pbkdf2_sha256')):
+            database.executescript(
+                "UPDATE users SET password = '%s'" %
+                passwords.HASHERS[hasher].encode('test'))
+            stop, counter = threading.Event(), []
+            statements = database.statements
+            with mock.patch.object(controllers, 'get_user_by_login', lookup), \
+                    mock.patch('api.config.PASSWORD_HASHER', hasher):
+                threads = storm(app, seconds, stop, counter)
+                time.sleep(seconds)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+            report("logins, %s" % label, seconds, len(counter) / seconds,
+                   "%d threads, %.1f statements/login" % (
+                       LOGIN_THREADS,
+                       (database.statements - statements) / len(counter)))
+
+        # Issued for the password as it is now.
+        with app.app_context():
+            token = controllers.generate_auth_token(get_user_by_id(1))
+        inline = lambda fn, *args: fn(*args)
+        for label, run in (("token requests, hashing on pool", passwords._run),
+                           ("token requests, hashing inline", inline)):
+            stop, counter = threading.Event(), []
+            with mock.patch('api.passwords._run', run):
+                threads = storm(app, seconds, stop, counter)
+                client = app.test_client()
+                times = []
+                deadline = time.perf_counter() + seconds
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    response = client.get('/account/token',
+                                          headers=headers(token.decode()))
+                    assert response.status_code == 200
+                    times.append(time.perf_counter() - start)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+            times.sort()
+            report(label, seconds, len(times) / seconds,
+                   "p50 %.1fms p99 %.1fms, %.0f logins/s" % (
+                       1000 * times[len(times) // 2],
+                       1000 * times[int(len(times) * 0.99)],
+                       len(counter) / seconds))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
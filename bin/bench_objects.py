@@ -0,0 +1,69 @@
+"""Latency of hot single-object reads with and without the object cache
+
+Replays ``GET /user/<id>`` and ``GET /network/<id>`` over a small set of
+popular ids, as happens when many clients open the same profiles and
+networks, first with the object cache turned off and then on. The stand-in
+database adds a simulated round trip to every statement.
+
+Usage: python bin/bench_objects.py [requests] [hot ids]
+"""
+
+import random
+import sys
+import time
+
+from benchutil import StandInDatabase, make_app, report
+from api import cache, objectcache
+
+QUERY_SECS = 0.0005
+
+
+def replay(client, paths):
+    latencies = []
+    start = time.perf_counter()
+    for path in paths:
+        begin = time.perf_counter()
+        assert client.get(path).status_code == 200
+        latencies.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    hot = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    database = StandInDatabase(query_latency=QUERY_SECS)
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "email TEXT, password TEXT, about_me TEXT);"
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY, city_cur TEXT, "
+        "country_cur TEXT, language_origin TEXT, network_class TEXT);" +
+        "".join("INSERT INTO users VALUES (%d, 'user%d', 'e', 'p', '%s');"
+                "INSERT INTO networks VALUES (%d, 'City', 'Country', "
+                "'Language', '_l');" % (i, i, 'x' * 200, i)
+                for i in range(1, hot + 1)))
+    app = make_app(database)
+    client = app.test_client()
+    rng = random.Random(0)
+    paths = [rng.choice(('/user/%d', '/network/%d')) % rng.randint(1, hot)
+             for _ in range(requests)]
+    try:
+        for label, backend in (("no cache", None),
+                               ("object cache", objectcache.LocalBackend())):
+            cache.clear_all()
+            objectcache.set_backend(backend)
+            statements = database.statements
+            elapsed, latencies = replay(client, paths)
+            report(label, elapsed, requests / elapsed,
+                   "p50 %.3fms p99 %.3fms, %d statements" % (
+                       1000 * latencies[len(latencies) // 2],
+                       1000 * latencies[int(len(latencies) * 0.99)],
+                       database.statements - statements))
+        print("cache stats:", objectcache.stats())
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Requests per second with and without connection pooling
+
+Serves ``GET /user/<id>`` from several threads against the stand-in
+database with a simulated connection handshake cost. The unpooled run uses a
+pool whose connections have a zero max lifetime, which opens a fresh
+connection for every request just as flaskext.mysql did.
+
+Usage: python bin/bench_pool.py [requests] [threads]
+"""
+
+import sys
+import threading
+import time
+
+from benchutil import StandInDatabase, make_app, mysql, report
+from api.pool import ConnectionPool
+
+HANDSHAKE_SECS = 0.005
+QUERY_SECS = 0.0005
+
+
+def run(app, requests, threads):
+    per_thread = requests // threads
+
+    def worker():
+        client = app.test_client()
+        for i in range(per_thread):
+            assert client.get('/user/%d' % (i % 100 + 1)).status_code == 200
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, per_thread * threads / elapsed
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    database = StandInDatabase(connect_latency=HANDSHAKE_SECS,
+                               query_latency=QUERY_SECS)
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "email TEXT, password TEXT);" +
+        "".join("INSERT INTO users VALUES (%d, 'user%d', 'e', 'p');" % (i, i)
+                for i in range(1, 101)))
+    app = make_app(database)
+    try:
+        for label, max_lifetime in (("unpooled", 0), ("pooled", 3600)):
+            mysql.pool = ConnectionPool(database.connect, max_size=threads,
+                                        max_lifetime=max_lifetime)
+            opened = database.connections_opened
+            elapsed, rate = run(app, requests, threads)
+            report(label, elapsed, rate, "%d connections opened" %
+                   (database.connections_opened - opened))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
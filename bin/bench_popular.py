@@ -0,0 +1,66 @@
+"""Latency of /network/popular as the networks table grows
+
+Times the query ``/network/popular`` used to run, which counts the members
+of every network, and the endpoint serving the in-memory leaderboard (see
+``api/leaderboard.py``) once it is built. Registrations are indexed by
+``id_network``, as in production.
+
+Usage: python bin/bench_popular.py [requests]
+"""
+
+import sys
+
+from benchutil import StandInDatabase, make_app, measure, report
+from api import leaderboard
+
+SIZES = (1000, 10000, 50000)
+
+SQL_QUERY = "SELECT * FROM networks ORDER BY (SELECT COUNT(*) " \
+            "FROM network_registration WHERE id=id_network) DESC LIMIT 30"
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    for size in SIZES:
+        database = StandInDatabase()
+        database.executescript(
+            "CREATE TABLE networks (id INTEGER PRIMARY KEY, "
+            "network_class TEXT, id_city_cur INTEGER, id_region_cur INTEGER, "
+            "id_country_cur INTEGER);"
+            "CREATE TABLE network_registration (id_user INTEGER, "
+            "id_network INTEGER);"
+            "CREATE INDEX registration_network "
+            "ON network_registration (id_network);"
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %d) INSERT INTO networks SELECT i, "
+            "CASE i %% 4 WHEN 0 THEN 'cc' WHEN 1 THEN 'rc' WHEN 2 THEN 'co' "
+            "ELSE '_l' END, i %% 100, i %% 10, 1 FROM n;"
+            "INSERT INTO network_registration SELECT a.id, b.id "
+            "FROM networks a, networks b "
+            "WHERE b.id %% 7 = 0 AND a.id <= b.id %% 13;" % size)
+        app = make_app(database)
+        client = app.test_client()
+        try:
+            connection = database.connect()
+            cursor = connection.cursor()
+
+            def sql():
+                cursor.execute(SQL_QUERY)
+                cursor.fetchall()
+            elapsed, rate = measure(sql, requests)
+            report("sql, %d networks" % size, elapsed, rate,
+                   "%.3fms/request" % (1000 * elapsed / requests))
+            connection.close()
+
+            leaderboard.clear()
+            path = '/network/popular?count=30&network_class=cc'
+            assert client.get(path).status_code == 200
+            elapsed, rate = measure(lambda: client.get(path), requests)
+            report("leaderboard, %d networks" % size, elapsed, rate,
+                   "%.3fms/request" % (1000 * elapsed / requests))
+        finally:
+            database.destroy()
+
+
+if __name__ == '__main__':
+    main()
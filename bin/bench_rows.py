@@ -0,0 +1,57 @@
+"""CPU time for turning result pages into dictionaries
+
+Compares the old per-row dictionary comprehension followed by popping the
+private fields against the compiled row factories in ``api/rows.py``, on a
+page shaped like ``GET /network/<id>/users``. Both build the same
+dictionaries, so only the time differs.
+
+Usage: python bin/bench_rows.py [rows per page] [pages]
+"""
+
+import datetime
+import sys
+
+from benchutil import measure, report
+from api.apiutils import convert_objects
+
+COLUMNS = ('id', 'username', 'first_name', 'last_name', 'email', 'password',
+           'role', 'register_date', 'last_login', 'gender', 'about_me',
+           'events_upcoming', 'events_interested_in', 'company_news',
+           'network_activity', 'confirmed', 'act_code', 'img_link', 'fp_code',
+           'join_date')
+DESCRIPTION = tuple((name, 253, None, 50, 50, 0, True) for name in COLUMNS)
+PRIVATE = ['password', 'email']
+
+
+def old_convert(tuple_arr, description):
+    obj_arr = []
+    for tuple_obj in tuple_arr:
+        obj_arr.append({description[index][0]: column
+                        for index, column in enumerate(tuple_obj)})
+    for obj in obj_arr:
+        for field in PRIVATE:
+            obj.pop(field, None)
+    return obj_arr
+
+
+def new_convert(tuple_arr, description):
+    return convert_objects(tuple_arr, description, PRIVATE)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    now = datetime.datetime(2018, 8, 22)
+    page = tuple((i, 'user%d' % i, 'First', 'Last', 'e@example.com',
+                  '098f6bcd4621d373cade4e832627b4f6', 0, now, now, 'n', '',
+                  None, None, None, None, 0, '', None, None, now)
+                 for i in range(size))
+    assert old_convert(page, DESCRIPTION) == new_convert(page, DESCRIPTION)
+    for label, fn in (("per-row dicts + pop", old_convert),
+                      ("compiled row factory", new_convert)):
+        elapsed, rate = measure(lambda: fn(page, DESCRIPTION), pages)
+        report(label, elapsed, rate * size, "rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Cached users: dictionary-backed User objects vs tuple-backed ones
+
+Compares what the accounts blueprint used to keep for each session, a row
+converted to a dictionary that every request copied eleven fields of into a
+regular ``User`` instance, with :py:class:`api.usermodel.User`. Reports the
+memory each cached user takes (measured with ``tracemalloc``, so including
+dictionaries but not the field values, which all share), the time to build
+users from result tuples, and the time to serialize ``/account/token``'s
+user. Both keep the same fields, but the old ``User`` also sent the
+password hash.
+
+Usage: python bin/bench_usermodel.py [users]
+"""
+
+import datetime
+import gc
+import json
+import sys
+import tracemalloc
+
+from benchutil import measure, report
+from api.apiutils import convert_objects
+from api.usermodel import user_factory
+
+DESCRIPTION = tuple((column,) for column in (
+    'id', 'username', 'first_name', 'last_name', 'email', 'password', 'role',
+    'register_date', 'last_login', 'gender', 'about_me', 'events_upcoming',
+    'events_interested_in', 'company_news', 'network_activity', 'confirmed',
+    'act_code', 'img_link', 'fp_code'))
+
+OLD_FIELDS = ('id', 'username', 'email', 'password', 'about_me',
+              'first_name', 'last_name', 'role', 'last_login', 'gender',
+              'img_link')
+
+
+class OldUser(object):
+    def __init__(self, user_obj):
+        for field in OLD_FIELDS:
+            setattr(self, field, user_obj[field])
+        self.password_hash = self.password
+        del self.password
+
+
+def rows(users):
+    date = datetime.datetime(2018, 8, 21, 23, 36, 5)
+    return [(i, 'user', 'First', 'Last', 'e', 'p', 0, date, date, 'M',
+             'about', 1, 1, 1, 1, 1, 'code', 'img', None)
+            for i in range(users)]
+
+
+def footprint(build, items):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    users = build(items)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list holding them is not part of a user.
+    return (after - before - sys.getsizeof(users)) / len(users)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    items = rows(count)
+
+    def dict_build(items):
+        return convert_objects(items, DESCRIPTION)
+
+    def old_build(items):
+        return [OldUser(obj) for obj in convert_objects(items, DESCRIPTION)]
+
+    def new_build(items):
+        factory = user_factory(DESCRIPTION)
+        return [factory(item) for item in items]
+
+    old_user = old_build(items[:1])[0]
+    new_user = new_build(items[:1])[0]
+
+    def old_serialize():
+        json.dumps(vars(old_user), default=str)
+
+    def new_serialize():
+        json.dumps(new_user.account(), default=str)
+
+    for label, build, serialize in (("row dictionary", dict_build, None),
+                                    ("dict-backed User", old_build,
+                                     old_serialize),
+                                    ("tuple-backed User", new_build,
+                                     new_serialize)):
+        per_user = footprint(build, items)
+        elapsed, rate = measure(lambda: build(items), 5)
+        report(label + ", build", elapsed, rate * count,
+               "users/s, %d bytes/user" % per_user)
+        if serialize is None:
+            continue
+        elapsed, rate = measure(serialize, 100000)
+        report(label + ", serialize", elapsed, rate,
+               "%.2fus/user" % (1000000 * elapsed / 100000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""GET /user/users on a network with many members: three queries vs one
+
+Times the three round trips ``/user/users`` used to make (find the
+networks, find their members' ids, then fetch those users) against the
+single query it makes now, on a network with 100k members. The stand-in
+database adds a simulated round trip to every statement.
+
+Usage: python bin/bench_users.py [requests] [members]
+"""
+
+import sys
+
+from benchutil import StandInDatabase, make_app, measure, report
+from flask import jsonify, request
+from api import api
+from api.apiutils import convert_objects, execute_get_all, execute_get_many
+from api.blueprints.users.controllers import handle_users_get
+
+QUERY_SECS = 0.0005
+
+QUERY = {'near_location': '1,2,3', 'from_location': '4,5,6', 'count': 100}
+
+
+def old_handler():
+    network_ids, _ = execute_get_all(
+        "SELECT id FROM networks WHERE id_country_cur=%s AND "
+        "id_region_cur=%s AND id_city_cur=%s AND id_country_origin=%s AND "
+        "id_region_origin=%s AND id_city_origin=%s",
+        ('1', '2', '3', '4', '5', '6'))
+    user_ids, _ = execute_get_many(
+        "SELECT id_user FROM network_registration WHERE id_network IN %s "
+        "ORDER BY id_user DESC", (tuple(row[0] for row in network_ids),), 100)
+    items, descr = execute_get_all("SELECT * FROM users WHERE id IN %s",
+                                   (tuple(row[0] for row in user_ids),))
+    return jsonify(convert_objects(items, descr, ["password", "email"]))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    database = StandInDatabase(query_latency=QUERY_SECS)
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "first_name TEXT, last_name TEXT, email TEXT, password TEXT, "
+        "role INTEGER, register_date TEXT, last_login TEXT, gender TEXT, "
+        "about_me TEXT, events_upcoming INTEGER, "
+        "events_interested_in INTEGER, company_news INTEGER, "
+        "network_activity INTEGER, confirmed INTEGER, act_code TEXT, "
+        "img_link TEXT, fp_code TEXT);"
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY, "
+        "id_country_cur INTEGER, id_region_cur INTEGER, id_city_cur INTEGER, "
+        "id_country_origin INTEGER, id_region_origin INTEGER, "
+        "id_city_origin INTEGER, language_origin TEXT, network_key TEXT);"
+        "CREATE TABLE network_registration (id_user INTEGER, "
+        "id_network INTEGER, PRIMARY KEY (id_user, id_network));"
+        "CREATE INDEX registration_network "
+        "ON network_registration (id_network, id_user);"
+        "INSERT INTO networks VALUES (1, 1, 2, 3, 4, 5, 6, NULL, "
+        "'1,2,3/4,5,6/');"
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+        "WHERE i < %d) INSERT INTO users (id, username, email, password, "
+        "about_me, confirmed, act_code) SELECT i, 'user' || i, 'e', 'p', "
+        "'hello', 1, 'code' FROM n;"
+        "INSERT INTO network_registration SELECT id, 1 FROM users;"
+        % members)
+    make_app(database)
+
+    # Both are called directly rather than through a test client, to leave
+    # out the cost of handling a request.
+    def old():
+        with api.test_request_context('/user/users', query_string=QUERY):
+            assert len(old_handler().json) == 100
+
+    def new():
+        with api.test_request_context('/user/users', query_string=QUERY):
+            assert len(handle_users_get(request).json) == 100
+
+    try:
+        for label, fn in (("3 queries, %d members" % members, old),
+                          ("1 query, %d members" % members, new)):
+            statements = database.statements
+            elapsed, rate = measure(fn, requests)
+            report(label, elapsed, rate, "%.2fms/request, %d statements" % (
+                1000 * elapsed / requests,
+                (database.statements - statements) / requests))
+    finally:
+        database.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Cost of building INSERT and UPDATE statements on the write path
+
+Compares rebuilding the SQL text by concatenation on every request, as
+``execute_post_by_table`` and ``execute_put_by_id`` used to, with the
+memoized statements in ``api/statements.py``, both before the table
+schemas are loaded (statement cache only) and after (names checked and
+values coerced). Only the statement building is timed; the database round
+trip is the same for all of them.
+
+Usage: python bin/bench_writes.py [iterations]
+"""
+
+import sys
+
+from benchutil import measure, report
+from api import statements
+
+POST_FIELDS = ['id_user', 'id_network', 'post_text', 'vid_link', 'img_link']
+POST = {'id_user': 1, 'id_network': '2', 'post_text': 'New Post',
+        'vid_link': 'videoLink', 'img_link': 'imageLink'}
+UPDATE = {'id': 88, 'post_text': 'Edited', 'img_link': 'imageLink'}
+SCHEMA = (('posts', 'id', 'bigint', 'NO'),
+          ('posts', 'id_user', 'bigint', 'YES'),
+          ('posts', 'id_network', 'bigint', 'YES'),
+          ('posts', 'post_text', 'mediumtext', 'YES'),
+          ('posts', 'vid_link', 'varchar', 'YES'),
+          ('posts', 'img_link', 'varchar', 'YES'))
+
+
+def old_insert(content):
+    fields = [field for field in POST_FIELDS if field in content and
+              content[field] and str(content[field]) != "-1" and
+              str(content[field]).lower().strip() != 'null']
+    query = "INSERT INTO %s (%s) " % ('posts', ','.join(fields))
+    query += " values ("
+    for _ in fields:
+        query += "%s, "
+    if query[-2] == ",":
+        query = query[:-2]
+    query += ");"
+    return query, tuple(content[col] for col in fields)
+
+
+def old_update(content):
+    query = "UPDATE %s SET " % 'posts'
+    query_clauses = []
+    args = []
+    for col in content.keys():
+        if col == "id":
+            continue
+        query_clauses.append("%s=%%s" % col)
+        args.append(content[col])
+    query += ", ".join(query_clauses)
+    query += " WHERE id=%s"
+    args.append(content['id'])
+    return query, tuple(args)
+
+
+def new_insert(content):
+    fields = tuple(field for field in POST_FIELDS if field in content and
+                   content[field] and str(content[field]) != "-1" and
+                   str(content[field]).lower().strip() != 'null')
+    statement = statements.insert_statement('posts', fields)
+    return statement.sql, statement.bind(content)
+
+
+def new_update(content):
+    columns = tuple(col for col in content.keys() if col != "id")
+    statement = statements.update_statement('posts', columns)
+    return statement.sql, statement.bind(content) + (content['id'],)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    assert old_insert(POST) == new_insert(POST)
+    assert old_update(UPDATE) == new_update(UPDATE)
+    for label, fn, content in (
+            ("INSERT, rebuilt per request", old_insert, POST),
+            ("INSERT, memoized", new_insert, POST),
+            ("UPDATE, rebuilt per request", old_update, UPDATE),
+            ("UPDATE, memoized", new_update, UPDATE)):
+        elapsed, rate = measure(lambda: fn(content), iterations)
+        report(label, elapsed, rate)
+    statements.load_schema(SCHEMA)
+    for label, fn, content in (
+            ("INSERT, memoized + validated", new_insert, POST),
+            ("UPDATE, memoized + validated", new_update, UPDATE)):
+        elapsed, rate = measure(lambda: fn(content), iterations)
+        report(label, elapsed, rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Shared setup for the benchmark scripts in this directory
+
+Benchmarks run the API in testing mode against the SQLite stand-in from
+``test/standin.py``, optionally with simulated network latency, so they can
+be run anywhere without a MySQL server.
+
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['CM_API_TESTING'] = 'TRUE'
+
+from api import api  # noqa: E402
+from api.extensions import mysql  # noqa: E402
+from test.standin import StandInDatabase  # noqa: E402
+
+
+def make_app(database):
+    """Points the API's database extension at a stand-in database
+
+    :param database: A :py:class:`test.standin.StandInDatabase`
+    :return: The Flask app
+    """
+    if mysql.pool is None:
+        mysql.init_app(api, connect=database.connect)
+    mysql.pool._connect = database.connect
+    api.config['NOTE_PATH'] = os.devnull
+    return api
+
+
+def measure(fn, repeat):
+    """Calls ``fn`` ``repeat`` times
+
+    :return: Tuple of the form ``(total seconds, calls per second)``
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    return elapsed, repeat / elapsed
+
+
+def report(label, elapsed, rate, extra=""):
+    print("%-36s %8.3fs %10.1f/s %s" % (label, elapsed, rate, extra))
@@ -0,0 +1,33 @@
+"""Repairs drift in the maintained counts of posts, members, replies and
+registrations
+
+Compares every counter in the ``counters`` table with a live count of the
+rows it counts and fixes those that differ, and creates missing counters,
+using the database settings in ``api/credentials.py``. See ``api/counters.py``. Safe to run while the API
+is serving; schedule it, e.g. nightly, with cron.
+
+Usage: python bin/reconcile_counters.py [kind ...]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import api, counters  # noqa: E402
+
+
+def main():
+    kinds = sys.argv[1:] or None
+    unknown = set(kinds or ()) - set(counters.KINDS)
+    if unknown:
+        sys.exit("Unknown counters: %s. Choose from %s." % (
+            ", ".join(sorted(unknown)), ", ".join(sorted(counters.KINDS))))
+    with api.app_context():
+        repaired = counters.reconcile(kinds)
+    for kind in sorted(repaired):
+        print("%-12s %d repaired" % (kind, repaired[kind]))
+
+
+if __name__ == "__main__":
+    main()
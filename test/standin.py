@@ -0,0 +1,184 @@
+"""A local stand-in for the MySQL database, backed by SQLite
+
+The unit tests mock the ``apiutils`` execution helpers, so they never see a
+connection. Tests and benchmarks that need to exercise the code underneath
+those helpers (connection handling, cursors, transactions) use this module
+instead. It exposes the small part of the PyMySQL connection and cursor
+interface that the API relies on, translates PyMySQL's ``%s`` parameter style
+to SQLite's, and can simulate network latency so that benchmarks reflect the
+cost of round trips.
+
+"""
+
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+_PARAM = re.compile(r"%s|%%")
+
+
+def _regexp(pattern, value):
+    if value is None:
+        return False
+    return re.search(pattern, str(value), re.IGNORECASE) is not None
+
+
+def translate(sql, args):
+    """Converts a PyMySQL-style query and arguments to SQLite style
+
+    Sequence arguments are expanded into parenthesized lists so that
+    ``IN %s`` works the way it does with PyMySQL.
+
+    :param sql: Query with ``%s`` placeholders
+    :param args: ``None``, a single value, or a sequence of values
+    :return: Tuple of the form ``(sql, params)`` for ``sqlite3``
+    """
+    if args is None:
+        args = ()
+    elif not isinstance(args, (tuple, list)):
+        args = (args,)
+    args = iter(args)
+    params = []
+
+    def replace(match):
+        if match.group(0) == "%%":
+            return "%"
+        arg = next(args)
+        if isinstance(arg, (tuple, list)):
+            params.extend(arg)
+            return "(" + ", ".join("?" * len(arg)) + ")"
+        params.append(arg)
+        return "?"
+
+    sql = _PARAM.sub(replace, sql)
+    sql = re.sub(r"^\s*INSERT\s+IGNORE\b", "INSERT OR IGNORE", sql,
+                 flags=re.IGNORECASE)
+    return sql, params
+
+
+class StandInDatabase:
+    """A SQLite file that hands out PyMySQL-like connections
+
+    :param connect_latency: Seconds to sleep when opening a connection,
+                            standing in for the TCP and auth handshake
+    :param query_latency: Seconds to sleep per statement, standing in for a
+                          network round trip
+    """
+
+    def __init__(self, connect_latency=0, query_latency=0):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.connect_latency = connect_latency
+        self.query_latency = query_latency
+        self.connections_opened = 0
+        self.statements = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Opens a new connection, paying ``connect_latency``
+
+        :return: A :py:class:`StandInConnection`
+        """
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        with self._lock:
+            self.connections_opened += 1
+        return StandInConnection(self)
+
+    def executescript(self, script):
+        """Runs a SQL script directly, e.g. to create tables and fixtures"""
+        conn = sqlite3.connect(self.path)
+        conn.executescript(script)
+        conn.commit()
+        conn.close()
+
+    def destroy(self):
+        os.unlink(self.path)
+
+
+class StandInConnection:
+    """The subset of ``pymysql.connections.Connection`` used by the API"""
+
+    def __init__(self, database):
+        self.database = database
+        self._conn = sqlite3.connect(database.path, timeout=30,
+                                     check_same_thread=False)
+        self._conn.create_function("REGEXP", 2, _regexp)
+        self.open = True
+
+    def cursor(self, cursor_class=None):
+        return StandInCursor(self)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=True):
+        if not self.open:
+            raise sqlite3.ProgrammingError("Already closed")
+
+    def close(self):
+        if self.open:
+            self._conn.close()
+            self.open = False
+
+
+class StandInCursor:
+    """The subset of ``pymysql.cursors.Cursor`` used by the API"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection._conn.cursor()
+
+    def _account(self):
+        database = self.connection.database
+        if database.query_latency:
+            time.sleep(database.query_latency)
+        with database._lock:
+            database.statements += 1
+
+    def execute(self, query, args=None):
+        self._account()
+        sql, params = translate(query, args)
+        self._cursor.execute(sql, params)
+        return self._cursor.rowcount
+
+    def executemany(self, query, args):
+        self._account()
+        rows = [translate(query, arg) for arg in args]
+        if not rows:
+            return 0
+        self._cursor.executemany(rows[0][0], [params for _, params in rows])
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return tuple(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return tuple(self._cursor.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
@@ -1,7 +1,12 @@
+import contextlib
 import os
 import tempfile
 import pytest
-from api import api
+from api import api, cache, leaderboard, networkdir, querylog, refdata, \
+    search
+from api.extensions import mysql
+from api.pool import ConnectionPool
+from test.standin import StandInDatabase
 
 """Initialize the testing environment
 
@@ -60,6 +65,11 @@ def client():
     db_file, api.config['DATABASE'] = tempfile.mkstemp()
     note_file, api.config["NOTE_PATH"] = tempfile.mkstemp()
     api.config['TESTING'] = True
+    cache.clear_all()
+    refdata.clear()
+    leaderboard.clear()
+    networkdir.clear()
+    search.clear()
     client = api.test_client()
 
     #with api.app_context():
@@ -72,3 +82,41 @@ def client():
 
     os.close(note_file)
     os.unlink(api.config["NOTE_PATH"])
+
+
+@pytest.fixture
+def database():
+    """Points the app's database connections at a fresh stand-in database
+
+    Tests that use this fixture exercise the real execution functions in
+    ``apiutils`` instead of mocking them. See ``test/standin.py``.
+
+    :return: The :py:class:`test.standin.StandInDatabase`
+    """
+    db = StandInDatabase()
+    mysql.register(api)
+    mysql.pool = ConnectionPool(db.connect)
+
+    yield db
+
+    mysql.pool.dispose()
+    mysql.pool = None
+    db.destroy()
+
+
+@contextlib.contextmanager
+def query_budget(max_queries):
+    """Fails the test if the block runs more than ``max_queries`` statements
+
+    Only statements that reach a database count, so the block should use the
+    ``database`` fixture rather than mock the execution functions.
+
+    :param max_queries: The most statements the block may run
+    :return: The list of :py:class:`api.querylog.QueryRecord` run so far
+    """
+    with querylog.capture() as records:
+        yield records
+    assert len(records) <= max_queries, \
+        "%d queries run, budget is %d:\n%s" % (
+            len(records), max_queries,
+            "\n".join(record.fingerprint for record in records))
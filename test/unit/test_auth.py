@@ -1,6 +1,120 @@
-from test.unit import client
+from test.unit import client, database, query_budget
+from api import api, passwords
+from api.apiutils import execute_get_all
+from api.blueprints.accounts.controllers import generate_auth_token, \
+    verify_auth_token
+import base64
+import mock
+
+USERS = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
+    last_name TEXT, email TEXT, password TEXT, role INTEGER,
+    register_date TEXT, last_login TEXT, gender TEXT, about_me TEXT,
+    img_link TEXT);
+INSERT INTO users VALUES (1, 'alice', 'Alice', 'A', 'alice@example.com',
+    '098f6bcd4621d373cade4e832627b4f6', 0, '2018-08-21 23:36:05',
+    '2018-08-21 23:36:05', NULL, NULL, NULL);
+"""
+
+
+def basic_auth(username, password=''):
+    credentials = ('%s:%s' % (username, password)).encode('utf-8')
+    return {'Authorization': 'Basic ' + base64.b64encode(credentials).decode()}
 
 
 def test_api_key_missing(client):
     response = client.get('/location/ping')  # Missing API Key
     assert response.status_code == 200
+
+
+def test_token_is_verified_once_per_session(database, client):
+    database.executescript(USERS)
+    response = client.get('/account/token', headers=basic_auth('alice', 'test'))
+    assert response.status_code == 200
+    assert response.json['username'] == 'alice'
+    assert response.json['email'] == 'alice@example.com'
+    assert 'password_hash' not in response.json
+    assert 'password' not in response.json
+    token = response.json['token']
+    with query_budget(1):
+        response = client.get('/account/token', headers=basic_auth(token))
+    assert response.status_code == 200
+    with mock.patch('api.blueprints.accounts.controllers.Serializer.loads') \
+            as loads, query_budget(0):
+        response = client.get('/account/token', headers=basic_auth(token))
+    assert response.status_code == 200
+    loads.assert_not_called()
+    assert verify_auth_token(token).id == 1
+    assert client.get('/account/token',
+                      headers=basic_auth(token + 'x')).status_code == 401
+
+
+def test_password_change_revokes_tokens(database, client):
+    database.executescript(USERS)
+    token = client.get('/account/token',
+                       headers=basic_auth('alice', 'test')).json['token']
+    response = client.put('/user/update_user', json={'password': 'secret'},
+                          headers=basic_auth(token))
+    assert response.status_code == 200
+    assert client.get('/account/token',
+                      headers=basic_auth(token)).status_code == 401
+    # Remembered as revoked, so replaying it reads nothing.
+    with query_budget(0):
+        assert client.get('/account/token',
+                          headers=basic_auth(token)).status_code == 401
+    response = client.get('/account/token',
+                          headers=basic_auth('alice', 'secret'))
+    assert response.status_code == 200
+    assert client.get('/account/token', headers=basic_auth(
+        response.json['token'])).status_code == 200
+
+
+def test_login_by_email_or_username_upgrades_the_hash(database, client):
+    database.executescript(USERS)
+    # Finding the user, then storing a stronger hash of the password.
+    with query_budget(2):
+        response = client.get('/account/token',
+                              headers=basic_auth('alice@example.com', 'test'))
+    assert response.status_code == 200
+    with api.test_request_context('/'):
+        rows, _ = execute_get_all("SELECT password FROM users", ())
+    assert rows[0][0].startswith('pbkdf2_sha256$')
+    with query_budget(1):
+        response = client.get('/account/token',
+                              headers=basic_auth('alice', 'test'))
+    assert response.status_code == 200
+    assert client.get('/account/token',
+                      headers=basic_auth('alice', 'nope')).status_code == 401
+    assert client.get('/account/token',
+                      headers=basic_auth('bob', 'test')).status_code == 401
+    assert client.get('/account/token').status_code == 401
+
+
+def test_login_storm_is_turned_away(database, client):
+    database.executescript(USERS)
+    with mock.patch('api.passwords._run', side_effect=passwords.Busy):
+        response = client.get('/account/token',
+                              headers=basic_auth('alice', 'test'))
+    assert response.status_code == 503
+
+
+def test_rejected_tokens_are_not_checked_as_passwords(database, client):
+    database.executescript(USERS)
+    token = client.get('/account/token',
+                       headers=basic_auth('alice', 'test')).json['token']
+    with api.test_request_context('/'):
+        expired = generate_auth_token(verify_auth_token(token),
+                                      expiration=-1).decode('ascii')
+    with mock.patch('api.passwords.check') as check, query_budget(0):
+        forged = token.rsplit('.', 1)[0] + '.' + 'A' * 86
+        for rejected in (expired, forged):
+            response = client.get('/account/token',
+                                  headers=basic_auth(rejected))
+            assert response.status_code == 401
+    check.assert_not_called()
+    with mock.patch('api.passwords.check',
+                    return_value=(False, None)) as check:
+        response = client.get('/account/token',
+                              headers=basic_auth('alice.a@example.com'))
+    assert response.status_code == 401
+    check.assert_called_once_with('', None)
@@ -0,0 +1,74 @@
+from test.unit import client, database, query_budget
+from api import api, refdata
+from flask import json
+
+USERS = "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, " \
+        "email TEXT, password TEXT); " \
+        "INSERT INTO users VALUES (1, 'ada', 'ada@example.com', 'p'); " \
+        "INSERT INTO users VALUES (2, 'alan', 'alan@example.com', 'q'); " \
+        "INSERT INTO users VALUES (3, 'grace', 'grace@example.com', 'r');"
+
+
+def test_gets_in_request_order_with_one_query(database, client):
+    database.executescript(USERS)
+    with query_budget(1):
+        response = client.get('/user/batch', query_string={'ids': '3,99,1'})
+    assert response.status_code == 200
+    assert response.json == [{'id': 3, 'username': 'grace'}, None,
+                             {'id': 1, 'username': 'ada'}]
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_shares_the_object_cache(database, client):
+    database.executescript(USERS)
+    single = client.get('/user/2').data
+    with query_budget(1) as records:
+        response = client.get('/user/batch', query_string={'ids': '2,1'})
+    assert records[0].arg_count == 1
+    assert json.loads(response.data)[0] == json.loads(single)
+    # Both are cached now.
+    with query_budget(0):
+        assert client.get('/user/1').json == {'id': 1, 'username': 'ada'}
+        client.get('/user/batch', query_string={'ids': '1,2'})
+
+
+def test_rejects_bad_ids(client):
+    assert client.get('/network/batch').status_code == 400
+    assert client.get('/post/batch', query_string={'ids': '1,x'}) \
+        .status_code == 400
+    response = client.get('/event/batch', query_string={
+        'ids': ",".join(str(i) for i in range(1000))})
+    assert response.status_code == 400
+
+
+def test_locations_come_from_the_snapshot(database, client):
+    database.executescript(
+        "CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT);"
+        "CREATE TABLE regions (id INTEGER PRIMARY KEY, country_id INTEGER);"
+        "CREATE TABLE cities (id INTEGER PRIMARY KEY, region_id INTEGER, "
+        "name TEXT);"
+        "CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT);"
+        "INSERT INTO cities VALUES (100, 10, 'Bangor');")
+    with api.app_context():
+        refdata.load()
+    database.executescript("INSERT INTO cities VALUES (101, 10, 'Conwy');")
+    with query_budget(0):
+        response = client.get('/location/cities/batch',
+                              query_string={'ids': '100'})
+    assert response.json == [{'id': 100, 'region_id': 10, 'name': 'Bangor'}]
+    assert response.headers['Cache-Control'] == 'public, max-age=86400'
+    with query_budget(1):
+        response = client.get('/location/cities/batch',
+                              query_string={'ids': '101,100'})
+    assert [city['name'] for city in response.json] == ['Conwy', 'Bangor']
+
+
+def test_serves_only_public_user_fields(database, client):
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "email TEXT, password TEXT, act_code TEXT, fp_code TEXT, "
+        "new_column TEXT); "
+        "INSERT INTO users VALUES (1, 'ada', 'e', 'p', 'a', 'f', 'n');")
+    response = client.get('/user/batch', query_string={'ids': '1'})
+    assert response.json == [{'id': 1, 'username': 'ada'}]
+    assert client.get('/user/1').json == {'id': 1, 'username': 'ada'}
@@ -0,0 +1,99 @@
+from test.unit import client, database, query_budget
+from api import api, counters
+from api.apiutils import execute_get_all, execute_insert_rows, execute_mod
+from api.counters import Change
+import mock
+import pytest
+
+SCHEMA = counters.SCHEMA + \
+    "CREATE TABLE networks (id INTEGER PRIMARY KEY); " \
+    "INSERT INTO networks VALUES (1); INSERT INTO networks VALUES (2); " \
+    "CREATE TABLE network_registration (id_user INTEGER, " \
+    "id_network INTEGER, join_date TEXT, PRIMARY KEY (id_user, id_network)); " \
+    "INSERT INTO network_registration VALUES (7, 1, '2018-08-22');"
+
+
+def counter_values():
+    with api.test_request_context('/'):
+        rows, _ = execute_get_all("SELECT kind, id_subject, value "
+                                  "FROM counters ORDER BY id_subject", ())
+    return [tuple(row) for row in rows]
+
+
+@mock.patch('api.blueprints.users.controllers.get_curr_user_id',
+            return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_counts_follow_writes(auth, get_id, database, client):
+    database.executescript(SCHEMA)
+    # Counted live, and read-only, until a write creates the counter.
+    with query_budget(2):
+        assert client.get('/network/1/user_count').json == {'user_count': 1}
+    assert counter_values() == []
+
+    assert client.post('/user/joinNetwork/1').status_code == 200
+    assert counter_values() == [('user_count', 1, 2)]
+    with query_budget(1):
+        assert client.get('/network/1/user_count').json == {'user_count': 2}
+    assert client.delete('/user/leaveNetwork/1').status_code == 200
+    # Leaving again deletes nothing, so does not change the count.
+    assert client.delete('/user/leaveNetwork/1').status_code == 200
+    assert client.get('/network/1/user_count').json == {'user_count': 1}
+    response = client.post('/user/joinNetworks', json={'ids': [1, 2]})
+    assert response.status_code == 200
+    assert client.get('/network/1/user_count').json == {'user_count': 2}
+    # The counter for network 2 did not exist when the user joined it.
+    assert client.get('/network/2/user_count').json == {'user_count': 1}
+
+
+def test_missing_subjects_count_zero(database, client):
+    database.executescript(SCHEMA)
+    assert client.get('/network/99/user_count').json == {'user_count': 0}
+    assert counter_values() == []
+
+
+def test_counter_updates_share_the_transaction(database, client):
+    database.executescript(SCHEMA)
+    with api.test_request_context('/'):
+        with pytest.raises(ValueError):
+            execute_mod("INSERT INTO network_registration VALUES "
+                        "(8, 1, '2018-08-23')",
+                        (), counts=[Change('user_count', (1,), 1),
+                                    Change('no_such_count', (1,), 1)])
+        rows, _ = execute_get_all("SELECT id_user FROM network_registration",
+                                  ())
+    assert [row[0] for row in rows] == [7]
+    assert counter_values() == []
+
+
+def test_ignored_rows_are_not_counted(database, client):
+    database.executescript(SCHEMA)
+    with api.test_request_context('/'):
+        counters.reconcile(['user_count'])
+        # Someone else registered user 7 first, so only one row goes in.
+        assert execute_insert_rows(
+            "INSERT IGNORE INTO network_registration VALUES",
+            "(%s, %s, '2018-08-23')", [(7, 1), (8, 1), (8, 2)],
+            counts=[Change('user_count', (1, 1, 2), 1)]) == 2
+    assert counter_values() == [('user_count', 1, 2), ('user_count', 2, 1)]
+
+
+def test_reconcile_repairs_drift(database, client):
+    database.executescript(SCHEMA)
+    with api.test_request_context('/'):
+        assert counters.reconcile(['user_count']) == {'user_count': 2}
+    database.executescript(
+        "INSERT INTO network_registration VALUES (8, 1, '2018-08-23'); "
+        "DELETE FROM networks WHERE id=2; "
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY, id_network INTEGER); "
+        "CREATE TABLE post_replies (id INTEGER, id_parent INTEGER); "
+        "CREATE TABLE events (id INTEGER PRIMARY KEY); "
+        "CREATE TABLE event_registration (id_guest INTEGER, "
+        "id_event INTEGER);")
+    with api.test_request_context('/'):
+        assert counters.reconcile(['user_count']) == {'user_count': 2}
+        # Creates the post counter of network 1.
+        assert counters.reconcile() == {'post_count': 1, 'reg_count': 0,
+                                        'reply_count': 0, 'user_count': 0}
+    assert sorted(counter_values()) == [('post_count', 1, 0),
+                                        ('user_count', 1, 2)]
@@ -1,8 +1,10 @@
-from test.unit import client
+from test.unit import client, database
 import mock
 import datetime
 import json
 from mock import call
+from api.counters import Change
+from api.statements import InvalidFieldError
 
 
 def test_ping(client):
@@ -43,6 +45,7 @@ def test_get_event_by_id(get_one, client):
     assert response.json == exp
 
 
+@mock.patch("api.config.LIVE_COUNTS", True)
 @mock.patch("api.apiutils.execute_get_one",
             return_value=((0,), (('reg_count', 8, None, 21, 21, 0, False),)))
 def test_get_reg_count(get_one, client):
@@ -71,8 +74,8 @@ def test_get_reg(get_many, client):
     response = client.get("/event/125/reg")
     query = "SELECT *                           " \
             "FROM event_registration                           " \
-            "WHERE id_event=%sORDER BY date_registered DESC"
-    get_many.assert_called_with(query, ('125',), 100)
+            "WHERE id_event=%s ORDER BY date_registered DESC, id_guest DESC LIMIT %s"
+    get_many.assert_called_with(query, ('125', 101), 101)
     assert response.status_code == 200
     exp = [{'date_registered': 'Wed, 19 Sep 2018 11:13:43 GMT', 'id_event': 125,
             'id_guest': 171, 'job': 'guest'},
@@ -87,8 +90,8 @@ def test_get_reg_empty(get_many, client):
     response = client.get("/event/23/reg")
     query = "SELECT *                           " \
             "FROM event_registration                           " \
-            "WHERE id_event=%sORDER BY date_registered DESC"
-    get_many.assert_called_with(query, ('23',), 100)
+            "WHERE id_event=%s ORDER BY date_registered DESC, id_guest DESC LIMIT %s"
+    get_many.assert_called_with(query, ('23', 101), 101)
     assert response.status_code == 200
     exp = []
     assert response.json == exp
@@ -106,19 +109,13 @@ new_event_spec = {"id_network": 1,
                   "description": "The Event Description!"}
 
 
-new_event_obj = (65,)
-new_event_def = (('id', 8, None, 20, 20, 0, False),)
-
-
-@mock.patch('api.apiutils.execute_insert')
+@mock.patch('api.apiutils.execute_insert', return_value=65)
 @mock.patch('api.blueprints.users.utils.execute_insert')
-@mock.patch('api.blueprints.events.controllers.execute_get_one',
-            return_value=(new_event_obj, new_event_def))
 @mock.patch('api.blueprints.events.controllers.get_curr_user_id',
             return_value=2)
 @mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
             return_value=True)
-def test_new_event(auth, get_user_id, get_one, execute_insert_events,
+def test_new_event(auth, get_user_id, execute_insert_events,
                    execute_insert_apiutils, client):
     new_event_json = json.dumps(new_event_spec)
     response = client.post('/event/new', data=new_event_json,
@@ -134,22 +131,39 @@ def test_new_event(auth, get_user_id, get_one, execute_insert_events,
                    'Address2', 'Country', 'City', 'Region',
                    'The Event Description!')
 
-    execute_insert_apiutils.assert_called_with(insert_query, insert_args)
+    execute_insert_apiutils.assert_called_with(insert_query, insert_args,
+                                               counts=())
 
     join_event_query = "INSERT INTO event_registration VALUES " \
                        "(%s,%s,CURRENT_TIMESTAMP, %s)"
     join_event_args = (2, 65, 'host')
 
-    execute_insert_events.assert_called_with(join_event_query, join_event_args)
+    execute_insert_events.assert_called_with(
+        join_event_query, join_event_args,
+        counts=[Change('reg_count', (65,), 1)])
 
-    get_event_id_query = "SELECT id FROM events WHERE id_host=%s AND id_" \
-                         "network=%s ORDER BY id DESC LIMIT 1"
-    get_event_id_args = (2, 1)
-    get_one.assert_called_with(get_event_id_query, get_event_id_args)
     assert response.status_code == 200
     assert response.data.decode() == 'OK'
 
 
+@mock.patch('api.apiutils.execute_insert')
+@mock.patch('api.blueprints.events.controllers._add_user_to_event')
+@mock.patch('api.blueprints.events.controllers.get_curr_user_id',
+            return_value=2)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_rejected_event_registers_no_host(auth, get_user_id, add_user,
+                                          insert, client):
+    spec = dict(new_event_spec, title='x' * 1000)
+    with mock.patch('api.statements.insert_statement',
+                    side_effect=InvalidFieldError("title is too long")):
+        response = client.post('/event/new', data=json.dumps(spec),
+                               content_type='application/json')
+    assert response.status_code == 400
+    insert.assert_not_called()
+    add_user.assert_not_called()
+
+
 new_event_spec['id'] = 64
 update_event_obj = (64, 1, 157, datetime.datetime(2018, 7, 24, 19, 36, 2),
                     datetime.datetime(2018, 7, 24, 7, 5), 'Test Event 2',
@@ -198,10 +212,11 @@ def test_update_event(auth, get_id, get_one, insert, client):
     assert response.data.decode() == 'OK'
 
 
+@mock.patch('api.counters.forget')
 @mock.patch('api.blueprints.events.controllers.execute_mod')
 @mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
             return_value=True)
-def test_delete_event(auth, mod, client):
+def test_delete_event(auth, mod, forget, client):
     event_id = 1
     response = client.delete('/event/delete', query_string={'id': event_id})
     auth.assert_called_with(None, None)
@@ -209,6 +224,7 @@ def test_delete_event(auth, mod, client):
                   str(event_id)),
              call('DELETE FROM events WHERE id=%s', str(event_id))]
     mod.assert_has_calls(calls, any_order=False)
+    forget.assert_called_with('reg_count', str(event_id))
     assert response.status_code == 200
     assert response.data.decode() == 'OK'
 
@@ -269,10 +285,10 @@ def test_get_events_by_network_user(auth, get_user_id, get_many, client):
     query = 'SELECT *                          ' \
             'FROM event_registration INNER JOIN events ON events.id = ' \
             'event_registration.id_event                          ' \
-            'WHERE (id_guest=%s OR id_host=%s) AND id_network=%sORDER BY ' \
-            'id DESC'
-    args = (157, 157, '1')
-    get_many.assert_called_with(query, args, 100)
+            'WHERE (id_guest=%s OR id_host=%s) AND id_network=%s ORDER BY ' \
+            'events.id DESC, event_registration.id_guest DESC LIMIT %s'
+    args = (157, 157, '1', 101)
+    get_many.assert_called_with(query, args, 101)
     assert response.status_code == 200
     exp = [{'address_1': '123 West Street', 'address_2': None,
             'city': 'SomeCity', 'country': 'ThisCountry',
@@ -304,3 +320,29 @@ def test_get_events_by_network_user(auth, get_user_id, get_many, client):
             'id_event': 120, 'id_guest': 157, 'id_host': 157, 'id_network': 1,
             'job': 'host', 'region': 'MyState', 'title': 'Community Picnic'}]
     assert response.json == exp
+
+
+@mock.patch('api.blueprints.events.controllers.get_curr_user_id',
+            return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_user_events_pages_cover_every_registration(auth, get_user_id,
+                                                    database, client):
+    database.executescript(
+        "CREATE TABLE events (id INTEGER PRIMARY KEY, id_network INTEGER, "
+        "id_host INTEGER); "
+        "CREATE TABLE event_registration (id_guest INTEGER, "
+        "id_event INTEGER, date_registered TEXT, job TEXT); "
+        "INSERT INTO events VALUES (7, 1, 1), (8, 1, 2); "
+        "INSERT INTO event_registration VALUES (1, 7, '', 'host'), "
+        "(2, 7, '', 'guest'), (3, 7, '', 'guest'), (1, 8, '', 'guest');")
+    seen = []
+    query = {'count': 1}
+    while True:
+        response = client.get('/event/currentUserEventsByNetwork/1',
+                              query_string=query)
+        seen += [(row['id'], row['id_guest']) for row in response.json]
+        if response.headers['X-Has-More'] != 'true':
+            break
+        query['cursor'] = response.headers['X-Next-Cursor']
+    assert seen == [(8, 1), (7, 3), (7, 2), (7, 1)]
@@ -0,0 +1,56 @@
+from test.unit import client, database, query_budget
+from api import api, counters, existence
+import mock
+
+SCHEMA = "CREATE TABLE events (id INTEGER PRIMARY KEY); " \
+         "INSERT INTO events VALUES (1); INSERT INTO events VALUES (2);"
+
+
+def test_answers_from_cache(database, client):
+    database.executescript(SCHEMA)
+    with api.test_request_context('/'):
+        with query_budget(1) as records:
+            assert existence.exists('events', '1')
+            assert existence.exists('events', 1)
+            assert not existence.exists('events', 'abc')
+        assert records[0].fingerprint == \
+            "SELECT id FROM `events` WHERE id IN (...)"
+
+
+def test_answers_many_ids_in_one_query(database, client):
+    database.executescript(SCHEMA)
+    with api.test_request_context('/'):
+        with query_budget(1):
+            assert existence.existing_ids('events', ['1', 2, 3]) == {1, 2}
+            assert existence.existing_ids('events', [3, 2]) == {2}
+
+
+def test_negative_answers_expire_quickly(database, client):
+    database.executescript(SCHEMA)
+    with api.test_request_context('/'):
+        assert not existence.exists('events', 3)
+        database.executescript("INSERT INTO events VALUES (3);")
+        assert not existence.exists('events', 3)
+        with mock.patch('api.cache.time.monotonic',
+                        return_value=10 ** 9):
+            assert existence.exists('events', 3)
+
+
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_delete_event_invalidates(auth, database, client):
+    database.executescript(SCHEMA + counters.SCHEMA +
+                           "CREATE TABLE event_registration "
+                           "(id_event INTEGER, id_guest INTEGER);")
+    with api.test_request_context('/'):
+        assert existence.exists('events', 1)
+    response = client.delete('/event/delete', query_string={'id': 1})
+    assert response.status_code == 200
+    with api.test_request_context('/'):
+        assert not existence.exists('events', 1)
+
+
+def test_cache_stats_endpoint(client):
+    response = client.get('/dev/caches')
+    assert response.status_code == 200
+    assert 'existence' in response.json
@@ -0,0 +1,76 @@
+from test.unit import client, database, query_budget
+from api import api, counters
+
+SCHEMA = counters.SCHEMA + """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, email TEXT,
+                    password TEXT);
+CREATE TABLE networks (id INTEGER PRIMARY KEY, network_class TEXT);
+CREATE TABLE posts (id INTEGER PRIMARY KEY, id_user INTEGER,
+                    id_network INTEGER, post_text TEXT);
+CREATE TABLE post_replies (id INTEGER PRIMARY KEY, id_parent INTEGER,
+                           id_user INTEGER, id_network INTEGER);
+INSERT INTO users VALUES (1, 'ada', 'ada@example.com', 'p');
+INSERT INTO users VALUES (2, 'alan', 'alan@example.com', 'q');
+INSERT INTO networks VALUES (5, '_l');
+INSERT INTO post_replies VALUES (1, 12, 2, 5), (2, 12, 1, 5);
+"""
+
+
+def add_posts(database, count):
+    database.executescript("".join(
+        "INSERT INTO posts VALUES (%d, %d, 5, 'Hi');" % (i, 1 + i % 3)
+        for i in range(10, 10 + count)))
+
+
+def test_expands_posts(database, client):
+    database.executescript(SCHEMA)
+    add_posts(database, 3)
+    response = client.get('/network/5/posts',
+                          query_string={'expand': 'user,network,reply_count'})
+    assert response.status_code == 200
+    # Expanded pages are not streamed, so they get an ETag.
+    assert 'ETag' in response.headers
+    posts = response.json
+    assert [post['id'] for post in posts] == [12, 11, 10]
+    assert [post['user'] for post in posts] == \
+        [{'id': 1, 'username': 'ada'}, None, {'id': 2, 'username': 'alan'}]
+    assert [post['reply_count'] for post in posts] == [2, 0, 0]
+    assert posts[0]['network'] == {'id': 5, 'network_class': '_l'}
+
+
+def test_queries_do_not_grow_with_the_page(database, client):
+    database.executescript(SCHEMA)
+    add_posts(database, 80)
+    query = {'expand': 'user,network,reply_count', 'count': 40}
+    # The page, users, networks, reply counters, and the replies of posts
+    # that have no counter yet.
+    with query_budget(5):
+        response = client.get('/network/5/posts', query_string=query)
+    assert len(response.json) == 40
+    with api.test_request_context('/'):
+        counters.reconcile(['reply_count'])
+    with query_budget(4):
+        client.get('/network/5/posts', query_string=query)
+    query['cursor'] = response.headers['X-Next-Cursor']
+    with query_budget(4):
+        response = client.get('/network/5/posts', query_string=query)
+    assert len(response.json) == 40
+
+
+def test_replies_expand_users(database, client):
+    database.executescript(SCHEMA)
+    add_posts(database, 3)
+    response = client.get('/post/12/replies', query_string={'expand': 'user'})
+    assert [reply['user']['username'] for reply in response.json] == \
+        ['ada', 'alan']
+
+
+def test_rejects_unknown_expansions(database, client):
+    database.executescript(SCHEMA)
+    response = client.get('/post/12/replies',
+                          query_string={'expand': 'reply_count'})
+    assert response.status_code == 400
+    assert response.data.decode() == 'Cannot expand reply_count'
+    response = client.get('/network/5/posts',
+                          query_string={'expand': 'password'})
+    assert response.status_code == 400
@@ -0,0 +1,81 @@
+from test.unit import client, database, query_budget
+from api import objectcache
+from api.httpcache import CachePolicy, cache_control
+
+POSTS = "CREATE TABLE posts (id INTEGER PRIMARY KEY, id_network INTEGER, " \
+        "post_text TEXT); INSERT INTO posts VALUES (1, 5, 'Hi');"
+
+
+def test_routes_without_policy_are_not_stored(client):
+    response = client.get('/user/ping')
+    assert response.headers['Cache-Control'] == \
+        'no-cache, no-store, must-revalidate, max-age=0'
+    assert response.headers['Expires'] == 'Thu, 01 Jan 1970 00:00:00 GMT'
+    assert 'ETag' not in response.headers
+
+
+def test_revalidated_routes_answer_304(database, client):
+    database.executescript(POSTS)
+    response = client.get('/post/1')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Expires' not in response.headers
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    response = client.get('/post/1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = client.get('/post/2', headers={'If-None-Match': etag})
+    assert response.status_code == 405
+    assert 'no-store' in response.headers['Cache-Control']
+
+
+def test_cached_objects_answer_304_without_queries(database, client):
+    database.executescript(POSTS)
+    etag = client.get('/post/1').headers['ETag']
+    with query_budget(0):
+        response = client.get('/post/1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    # Once the object changes, the view runs and sends it.
+    database.executescript("UPDATE posts SET post_text='Bye';")
+    objectcache.invalidate('posts', 1)
+    response = client.get('/post/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_etag_changes_with_content(database, client):
+    database.executescript(POSTS + "CREATE TABLE post_replies (id INTEGER, "
+                                   "id_parent INTEGER);")
+    etag = client.get('/post/1/replies').headers['ETag']
+    database.executescript("INSERT INTO post_replies VALUES (3, 1);")
+    response = client.get('/post/1/replies', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_streamed_routes_get_no_etag(database, client):
+    database.executescript(POSTS)
+    response = client.get('/network/5/posts')
+    assert response.is_streamed
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert 'ETag' not in response.headers
+
+
+def test_reference_data_is_public(database, client):
+    database.executescript("CREATE TABLE languages (id INTEGER PRIMARY KEY, "
+                           "name TEXT); INSERT INTO languages "
+                           "VALUES (1, 'Welsh');")
+    response = client.get('/language/1')
+    assert response.headers['Cache-Control'] == 'public, max-age=86400'
+
+
+def test_cache_control():
+    assert cache_control(CachePolicy(31536000, True, False, True)) == \
+        'public, max-age=31536000, immutable'
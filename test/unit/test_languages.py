@@ -1,4 +1,4 @@
-from test.unit import client
+from test.unit import client, database, query_budget
 import mock
 
 
@@ -29,63 +29,66 @@ def test_get_event_by_id(get_one, client):
     assert response.json == exp
 
 
-autocomplete_obj = ((3, 'English', 365, 0, None, '0'),
-                    (7, 'Bengali', 202, 0, None, None),
-                    (18, 'French', 74, 0, None, None))
-autocomplete_des = (('id', 8, None, 20, 20, 0, False),
-                    ('name', 253, None, 50, 50, 0, False),
-                    ('num_speakers', 3, None, 4, 4, 0, False),
-                    ('added', 2, None, 1, 1, 0, False),
-                    ('tweet_terms', 253, None, 200, 200, 0, True),
-                    ('tweet_terms_override', 253, None, 200, 200, 0, True))
-
-
-@mock.patch('api.blueprints.languages.controllers.execute_get_many',
-            return_value=(autocomplete_obj, autocomplete_des))
-def test_autocomplete(get_many, client):
-    search_text = 'en'
-    response = client.get('/language/autocomplete',
-                          query_string={'input_text': search_text})
-    query = "SELECT * FROM languages WHERE languages.name REGEXP %s " \
-            "ORDER BY num_speakers DESC;"
-    get_many.assert_called_with(query, ('en',), 20)
+AUTOCOMPLETE_TABLES = """
+CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE regions (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE cities (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT, num_speakers INTEGER,
+                        added INTEGER, tweet_terms TEXT,
+                        tweet_terms_override TEXT);
+INSERT INTO languages VALUES (1, 'Mandarin Chinese/Putonghua', 935, 0, NULL,
+                              NULL),
+                             (3, 'English', 365, 0, NULL, '0'),
+                             (7, 'Bengali', 202, 0, NULL, NULL),
+                             (18, 'French', 74, 0, 'Français', NULL),
+                             (40, 'Provençal', 1, 0, NULL, NULL);
+"""
+
+
+def test_autocomplete(database, client):
+    database.executescript(AUTOCOMPLETE_TABLES)
+    # Loading the reference data: the tables' stamp, then each table.
+    with query_budget(5):
+        response = client.get('/language/autocomplete',
+                              query_string={'input_text': 'en'})
     assert response.status_code == 200
     exp = [{'added': 0, 'id': 3, 'name': 'English', 'num_speakers': 365,
             'tweet_terms': None, 'tweet_terms_override': '0'},
            {'added': 0, 'id': 7, 'name': 'Bengali', 'num_speakers': 202,
             'tweet_terms': None, 'tweet_terms_override': None},
            {'added': 0, 'id': 18, 'name': 'French', 'num_speakers': 74,
+            'tweet_terms': 'Français', 'tweet_terms_override': None},
+           {'added': 0, 'id': 40, 'name': 'Provençal', 'num_speakers': 1,
             'tweet_terms': None, 'tweet_terms_override': None}]
     assert response.json == exp
 
 
-@mock.patch('api.blueprints.languages.controllers.execute_get_many',
-            return_value=((), ()))
-def test_autocomplete_no_query(get_many, client):
-    response = client.get('/language/autocomplete')
-    get_many.assert_not_called()
-    assert response.status_code == 400
+def test_autocomplete_alternate_names(database, client):
+    database.executescript(AUTOCOMPLETE_TABLES)
+    response = client.get('/language/autocomplete',
+                          query_string={'input_text': 'PUTONG'})
+    assert [language['id'] for language in response.json] == [1]
+    with query_budget(0):
+        response = client.get('/language/autocomplete',
+                              query_string={'input_text': 'franca'})
+    assert [language['id'] for language in response.json] == [18]
+    response = client.get('/language/autocomplete',
+                          query_string={'input_text': 'ese/put'})
+    assert response.json == []
+    response = client.get('/language/autocomplete',
+                          query_string={'input_text': ''})
+    assert [language['id'] for language in response.json] == [1, 3, 7, 18, 40]
 
 
-@mock.patch('api.blueprints.languages.controllers.execute_get_many',
-            return_value=((), ()))
-def test_autocomplete_query_none(get_many, client):
-    response = client.get('/language/autocomplete',
-                          query_string={'input_text': None})
-    get_many.assert_not_called()
+def test_autocomplete_no_query(client):
+    response = client.get('/language/autocomplete')
     assert response.status_code == 400
-    # TODO: This behavior makes the `if input_text is None` check useless
-    assert "Must have valid input_text field" not in response.data.decode()
 
 
-@mock.patch('api.blueprints.languages.controllers.execute_get_many',
-            return_value=((), ()))
-def test_autocomplete_query_none(get_many, client):
+def test_autocomplete_query_none(database, client):
+    database.executescript(AUTOCOMPLETE_TABLES)
     search_text = 'nonexistentLocationQuery'
     response = client.get('/language/autocomplete',
                           query_string={'input_text': search_text})
-    query = "SELECT * FROM languages WHERE languages.name REGEXP %s " \
-            "ORDER BY num_speakers DESC;"
-    get_many.assert_called_with(query, ('nonexistentLocationQuery',), 20)
     assert response.status_code == 200
     assert response.json == []
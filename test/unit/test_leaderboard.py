@@ -0,0 +1,100 @@
+from test.unit import client, database, query_budget
+from api import api, background, leaderboard
+import mock
+
+SCHEMA = """
+CREATE TABLE networks (id INTEGER PRIMARY KEY, name TEXT, network_class TEXT,
+                       id_city_cur INTEGER, id_region_cur INTEGER,
+                       id_country_cur INTEGER);
+CREATE TABLE network_registration (id_user INTEGER, id_network INTEGER);
+INSERT INTO networks VALUES (1, 'a', 'cc', 10, 20, 30);
+INSERT INTO networks VALUES (2, 'b', 'rc', 10, 20, 30);
+INSERT INTO networks VALUES (3, 'c', 'cc', 11, 20, 30);
+INSERT INTO networks VALUES (4, 'd', '_l', NULL, NULL, NULL);
+INSERT INTO network_registration VALUES (1, 2), (2, 2), (3, 2);
+INSERT INTO network_registration VALUES (1, 3), (2, 3);
+INSERT INTO network_registration VALUES (1, 1), (2, 1);
+"""
+
+
+def ids(response):
+    assert response.status_code == 200
+    return [network['id'] for network in response.json]
+
+
+def test_orders_by_members(database, client):
+    database.executescript(SCHEMA)
+    with query_budget(2):
+        response = client.get('/network/popular', query_string={'count': 3})
+    # Ties are broken by id.
+    assert ids(response) == [2, 1, 3]
+    assert response.json[0] == {
+        'id': 2, 'name': 'b', 'network_class': 'rc', 'id_city_cur': 10,
+        'id_region_cur': 20, 'id_country_cur': 30, 'user_count': 3}
+    assert 'ETag' in response.headers
+    with query_budget(0):
+        assert ids(client.get('/network/popular')) == [2, 1, 3, 4]
+
+
+def test_filters(database, client):
+    database.executescript(SCHEMA)
+    assert ids(client.get('/network/popular',
+                          query_string={'network_class': 'cc'})) == [1, 3]
+    assert ids(client.get('/network/popular',
+                          query_string={'id_city_cur': 10})) == [2, 1]
+    assert ids(client.get('/network/popular',
+                          query_string={'network_class': 'cc',
+                                        'id_region_cur': 20})) == [1, 3]
+    assert ids(client.get('/network/popular',
+                          query_string={'id_country_cur': 99})) == []
+    response = client.get('/network/popular',
+                          query_string={'id_city_cur': 10,
+                                        'id_country_cur': 30})
+    assert response.status_code == 400
+    response = client.get('/network/popular',
+                          query_string={'id_city_cur': 'x'})
+    assert response.status_code == 400
+    response = client.get('/network/popular', query_string={'count': 0})
+    assert response.status_code == 400
+
+
+def test_pages(database, client):
+    database.executescript(SCHEMA)
+    response = client.get('/network/popular', query_string={'count': 2})
+    assert ids(response) == [2, 1]
+    assert response.headers['X-Has-More'] == 'true'
+    response = client.get('/network/popular', query_string={
+        'count': 2, 'cursor': response.headers['X-Next-Cursor']})
+    assert ids(response) == [3, 4]
+    assert response.headers['X-Has-More'] == 'false'
+    response = client.get('/network/popular', query_string={'cursor': 'x'})
+    assert response.status_code == 400
+
+
+def test_refreshes_when_stale(database, client):
+    database.executescript(SCHEMA)
+    with mock.patch('api.leaderboard.time.monotonic', return_value=1000):
+        assert ids(client.get('/network/popular'))[0] == 2
+    database.executescript("INSERT INTO network_registration VALUES "
+                           "(1, 4), (2, 4), (3, 4), (4, 4);")
+    with mock.patch('api.leaderboard.time.monotonic', return_value=1001):
+        assert ids(client.get('/network/popular'))[0] == 2
+    with mock.patch('api.leaderboard.time.monotonic', return_value=2000):
+        # Rebuilt in the background while the old board is served.
+        assert ids(client.get('/network/popular'))[0] == 2
+        background.wait()
+        response = client.get('/network/popular')
+    assert ids(response)[0] == 4
+    assert response.json[0]['user_count'] == 4
+
+
+def test_keeps_top_networks_per_leaderboard():
+    networks = [{'id': id_, 'network_class': 'cc', 'id_city_cur': 10}
+                for id_ in range(1, 6)]
+    board = leaderboard.build(networks, {3: 5, 4: 1}, size=2)
+    key = (('id_city_cur', 10), ('network_class', 'cc'))
+    assert [entry.id for entry in board.groups[key]] == [3, 4]
+    assert [entry.id for entry in board.groups[()]] == [3, 4]
+    entries, following = leaderboard.page(board, (), (1, 4), 5)
+    assert [entry.id for entry in entries] == [4]
+    assert following is None
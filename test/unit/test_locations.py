@@ -1,4 +1,4 @@
-from test.unit import client
+from test.unit import client, database, query_budget
 import mock
 from mock import call
 
@@ -107,73 +107,64 @@ def test_get_city_by_id(get_one, client):
     assert response.json == exp
 
 
-def mock_autocomplete_get_many(sql_q_format, args, count):
-    cities_obj = (('North York', 135351, 21359, 44888),
-                  ('Yorkton', 136221, 21392, 44888),
-                  ('York', 183111, 27255, 45356),
-                  ('York', 316511, 56196, 47228),
-                  ('Yorkville', 322071, 55921, 47228),
-                  ('West New York', 326241, 56108, 47228),
-                  ('East New York', 326611, 56130, 47228),
-                  ('New York City', 327181, 56130, 47228))
-    cities_des = (('name', 253, None, 50, 50, 0, False),
-                  ('city_id', 8, None, 20, 20, 0, False),
-                  ('region_id', 8, None, 20, 20, 0, True),
-                  ('country_id', 8, None, 20, 20, 0, True))
-    regions_obj = (('New York', 'null', 56130, 47228),)
-    regions_des = (('name', 253, None, 50, 50, 0, False),
-                   ('city_id', 253, None, 4, 4, 31, False),
-                   ('region_id', 8, None, 20, 20, 0, False),
-                   ('country_id', 8, None, 20, 20, 0, False))
-    countries_obj = ()
-    countries_des = (('name', 253, None, 50, 50, 0, True),
-                     ('city_id', 253, None, 4, 4, 31, False),
-                     ('region_id', 253, None, 4, 4, 31, False),
-                     ('country_id', 8, None, 20, 20, 0, False))
-    if 'cities.name' in sql_q_format:
-        return cities_obj, cities_des
-    elif 'regions.name' in sql_q_format:
-        return regions_obj, regions_des
-    elif 'countries.name' in sql_q_format:
-        return countries_obj, countries_des
-    else:
-        raise ValueError("Parameter sql_q_format should contain "
-                         "<location type>.name")
-
-
-@mock.patch('api.blueprints.locations.controllers.execute_get_many',
-            side_effect=mock_autocomplete_get_many)
-def test_autocomplete(get_many, client):
-    search_text = 'york'
-    response = client.get('/location/autocomplete',
-                          query_string={'input_text': search_text})
-    cit_format = "SELECT cities.name, id AS city_id, region_id, country_id " \
-                 "FROM cities WHERE cities.name REGEXP %s"
-    reg_format = "SELECT regions.name, 'null' AS city_id, id AS region_id, " \
-                 "country_id FROM regions WHERE regions.name REGEXP %s"
-    cou_format = "SELECT countries.name, 'null' AS city_id, 'null' AS " \
-                 "region_id, id AS country_id FROM countries WHERE " \
-                 "countries.name REGEXP %s"
-    calls = [call(form, ('york',), 100) for form in
-             [cit_format, reg_format, cou_format]]
-    get_many.assert_has_calls(calls, any_order=False)
+AUTOCOMPLETE_TABLES = """
+CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT, population INTEGER);
+CREATE TABLE regions (id INTEGER PRIMARY KEY, country_id INTEGER, name TEXT,
+                      population INTEGER);
+CREATE TABLE cities (id INTEGER PRIMARY KEY, region_id INTEGER,
+                     country_id INTEGER, name TEXT, population INTEGER);
+CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT);
+INSERT INTO countries VALUES (47228, 'United States', 1);
+INSERT INTO regions VALUES (56130, 47228, 'New York', 1);
+INSERT INTO cities VALUES (135351, 21359, 44888, 'North York', 636000),
+                          (183111, 27255, 45356, 'York', 153717),
+                          (326241, 56108, 47228, 'West New York', 49708),
+                          (327181, 56130, 47228, 'New York City', 8175133),
+                          (330000, 1, 2, 'Yverdon', 30000),
+                          (3448439, 1, 2, 'São Paulo', 10021295);
+"""
+
+
+def test_autocomplete(database, client):
+    database.executescript(AUTOCOMPLETE_TABLES)
+    # Loading the reference data: the tables' stamp, then each table.
+    with query_budget(5):
+        response = client.get('/location/autocomplete',
+                              query_string={'input_text': 'york'})
     assert response.status_code == 200
-    exp = [{'city_id': 135351, 'country_id': 44888, 'name': 'North York',
-            'region_id': 21359},
-           {'city_id': 136221, 'country_id': 44888, 'name': 'Yorkton',
-            'region_id': 21392},
-           {'city_id': 183111, 'country_id': 45356, 'name': 'York',
-            'region_id': 27255},
-           {'city_id': 316511, 'country_id': 47228, 'name': 'York',
-            'region_id': 56196},
-           {'city_id': 322071, 'country_id': 47228, 'name': 'Yorkville',
-            'region_id': 55921},
-           {'city_id': 326241, 'country_id': 47228, 'name': 'West New York',
-            'region_id': 56108},
-           {'city_id': 326611, 'country_id': 47228, 'name': 'East New York',
-            'region_id': 56130},
-           {'city_id': 327181, 'country_id': 47228, 'name': 'New York City',
-            'region_id': 56130},
-           {'city_id': 'null', 'country_id': 47228, 'name': 'New York',
-            'region_id': 56130}]
-    assert response.json == exp
+    assert response.json == [
+        {'city_id': 'null', 'country_id': 47228, 'name': 'New York',
+         'region_id': 56130},
+        {'city_id': 327181, 'country_id': 47228, 'name': 'New York City',
+         'region_id': 56130},
+        {'city_id': 135351, 'country_id': 44888, 'name': 'North York',
+         'region_id': 21359},
+        {'city_id': 183111, 'country_id': 45356, 'name': 'York',
+         'region_id': 27255},
+        {'city_id': 326241, 'country_id': 47228, 'name': 'West New York',
+         'region_id': 56108}]
+    with query_budget(0):
+        response = client.get('/location/autocomplete',
+                              query_string={'input_text': 'NEW yo'})
+    assert [location['name'] for location in response.json] == \
+        ['New York', 'New York City', 'West New York']
+
+
+def test_autocomplete_folds_accents(database, client):
+    database.executescript(AUTOCOMPLETE_TABLES)
+    response = client.get('/location/autocomplete',
+                          query_string={'input_text': 'sao p'})
+    assert [location['name'] for location in response.json] == ['São Paulo']
+    response = client.get('/location/autocomplete',
+                          query_string={'input_text': 'Y'})
+    assert [location['name'] for location in response.json] == \
+        ['New York', 'New York City', 'North York', 'York', 'West New York',
+         'Yverdon']
+    response = client.get('/location/autocomplete',
+                          query_string={'input_text': '(a+)+$ !'})
+    assert response.json == []
+
+
+def test_autocomplete_no_query(client):
+    response = client.get('/location/autocomplete')
+    assert response.status_code == 400
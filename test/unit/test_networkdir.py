@@ -0,0 +1,61 @@
+from test.unit import client, database, query_budget
+from api import api, networkdir
+
+NETWORKS = [(1, '47228,56130,327181/44888,21359,/'),
+            (2, '47228,56130,327181/,,/Welsh'),
+            (3, '47228,,/44888,21359,/'),
+            (4, '47228,56130,327181/,,/Chinese/Mandarin')]
+
+
+def test_finds_networks_by_key_and_id():
+    directory = networkdir.Directory(NETWORKS)
+    assert len(directory) == 4
+    assert directory.get('47228,,/44888,21359,/') == 3
+    assert directory.get('47228,,/44888,,/') is None
+    assert directory.key(4) == '47228,56130,327181/,,/Chinese/Mandarin'
+    # A network with the key of another is not added.
+    directory.add(5, '47228,,/44888,21359,/')
+    assert directory.get('47228,,/44888,21359,/') == 3
+    assert directory.key(5) is None
+    # Nor is a network already there under another key.
+    directory.add(2, '47228,56130,327181/,,/welsh')
+    assert directory.get('47228,56130,327181/,,/welsh') is None
+    assert directory.key(2) == '47228,56130,327181/,,/Welsh'
+    assert len(directory) == 4
+
+
+def test_reads_networks_missing_from_the_directory(database, client):
+    database.executescript(
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY, network_key TEXT);"
+        "INSERT INTO networks VALUES (1, '47228,,/,,/Welsh'), (2, NULL);")
+    with api.test_request_context('/'):
+        with query_budget(1):
+            assert len(networkdir.current()) == 1
+        with query_budget(0):
+            assert networkdir.find('47228,,/,,/Welsh') == 1
+        database.executescript(
+            "INSERT INTO networks VALUES (3, '47228,,/44888,,/')")
+        with query_budget(1):
+            assert networkdir.find('47228,,/44888,,/') == 3
+        with query_budget(0):
+            assert networkdir.find('47228,,/44888,,/') == 3
+        assert networkdir.find('44888,,/,,/Welsh') is None
+        networkdir.add({'id': 4, 'network_key': '44888,,/,,/Welsh'})
+        assert networkdir.find('44888,,/,,/Welsh') == 4
+
+
+def test_adds_networks_found_by_their_stored_keys(database, client):
+    # Like MySQL's default collation.
+    database.executescript(
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY, "
+        "network_key TEXT COLLATE NOCASE);")
+    with api.test_request_context('/'):
+        networkdir.load()
+        database.executescript(
+            "INSERT INTO networks VALUES (5, '1,,/,,/English')")
+        assert networkdir.find('1,,/,,/english') == 5
+        assert networkdir.find('1,,/,,/English') == 5
+        directory = networkdir.current()
+        assert directory.get('1,,/,,/english') is None
+        assert directory.key(5) == '1,,/,,/English'
+        assert len(directory) == 1
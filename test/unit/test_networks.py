@@ -1,6 +1,9 @@
-from test.unit import client
+from test.unit import client, database, query_budget
+from api import api, networkdir
+from api.apiutils import execute_get_all
 import mock
 import datetime
+import threading
 
 
 def test_ping(client):
@@ -11,6 +14,7 @@ def test_ping(client):
 get_user_count_description = (('user_count', 8, None, 21, 21, 0, False),)
 
 
+@mock.patch("api.config.LIVE_COUNTS", True)
 @mock.patch("api.apiutils.execute_get_one",
             return_value=((16,), get_user_count_description))
 def test_get_user_count(get_one, client):
@@ -84,6 +88,7 @@ def test_get_network_by_id(get_one, client):
 get_post_count_description = (('post_count', 8, None, 21, 21, 0, False),)
 
 
+@mock.patch("api.config.LIVE_COUNTS", True)
 @mock.patch("api.apiutils.execute_get_one",
             return_value=((48,), get_post_count_description))
 def test_get_post_count(get_one, client):
@@ -123,14 +128,17 @@ get_events_des = (('id', 8, None, 20, 20, 0, False),
                   ('region', 253, None, 50, 50, 0, True))
 
 
-@mock.patch('api.apiutils.execute_get_many',
-            return_value=(get_events_obj, get_events_des))
-def test_get_events(get_many, client):
+@mock.patch('api.apiutils.execute_stream',
+            return_value=(iter([get_events_obj]), get_events_des))
+@mock.patch('api.apiutils.execute_get_one', return_value=(None, get_events_des))
+def test_get_events(get_one, stream, client):
     response = client.get("/network/547/events")
     query = "SELECT *                           " \
             "FROM events                           " \
-            "WHERE id_network=%sORDER BY id DESC"
-    get_many.assert_called_with(query, ('547',), 100)
+            "WHERE id_network=%s ORDER BY id DESC"
+    get_one.assert_called_with(query + " LIMIT %s, 1", ('547', 100))
+    stream.assert_called_with(query + " LIMIT %s", ('547', 100), 100)
+    assert response.headers['X-Has-More'] == 'false'
     assert response.status_code == 200
     exp = [{'address_1': 'ehebsbdhd', 'address_2': '', 'city': '',
             'country': '', 'date_created': 'Sat, 21 Jul 2018 01:11:20 GMT',
@@ -164,14 +172,17 @@ get_posts_des = (('id', 8, None, 20, 20, 0, False),
                  ('img_link', 253, None, 100, 100, 0, True))
 
 
-@mock.patch('api.apiutils.execute_get_many',
-            return_value=(get_posts_obj, get_posts_des))
-def test_get_posts(get_many, client):
+@mock.patch('api.apiutils.execute_stream',
+            return_value=(iter([get_posts_obj]), get_posts_des))
+@mock.patch('api.apiutils.execute_get_one', return_value=(None, get_posts_des))
+def test_get_posts(get_one, stream, client):
     response = client.get("/network/545/posts")
     query = "SELECT *                          " \
             "FROM posts                          " \
-            "WHERE id_network=%sORDER BY id DESC"
-    get_many.assert_called_with(query, ('545',), 100)
+            "WHERE id_network=%s ORDER BY id DESC"
+    get_one.assert_called_with(query + " LIMIT %s, 1", ('545', 100))
+    stream.assert_called_with(query + " LIMIT %s", ('545', 100), 100)
+    assert response.headers['X-Has-More'] == 'false'
     assert response.status_code == 200
     exp = [{'id': 635, 'id_network': 545, 'id_user': 171, 'img_link': None,
             'post_class': 'o', 'post_date': 'Wed, 19 Sep 2018 20:34:56 GMT',
@@ -207,26 +218,221 @@ get_users_obj = ((178, 'sbdbb', 'dndn', 'dbdn', 'snsj',
                   '', None, None, datetime.datetime(2018, 8, 22, 0, 11, 42)),)
 
 
-@mock.patch('api.apiutils.execute_get_many',
-            return_value=(get_users_obj, get_users_des))
-def test_get_users(get_many, client):
+@mock.patch('api.apiutils.execute_stream',
+            return_value=(iter([get_users_obj]), get_users_des))
+@mock.patch('api.apiutils.execute_get_one', return_value=(None, get_users_des))
+def test_get_users(get_one, stream, client):
     response = client.get("/network/3161/users")
     query = "SELECT users.*, join_date                           " \
             "FROM network_registration                           " \
             "INNER JOIN users                           " \
             "ON users.id = " \
             "network_registration.id_user                           " \
-            "WHERE id_network=%sORDER BY join_date DESC"
-    get_many.assert_called_with(query, ('3161',), 100)
+            "WHERE id_network=%s ORDER BY join_date DESC, users.id DESC"
+    get_one.assert_called_with(query + " LIMIT %s, 1", ('3161', 100))
+    stream.assert_called_with(query + " LIMIT %s", ('3161', 100), 100)
+    assert response.headers['X-Has-More'] == 'false'
     assert response.status_code == 200
     exp = [{'about_me': None, 'act_code': '', 'company_news': None,
-            'confirmed': 0, 'email': 'snsj', 'events_interested_in': None,
+            'confirmed': 0, 'events_interested_in': None,
             'events_upcoming': None, 'first_name': 'dndn', 'fp_code': None,
             'gender': None, 'id': 178, 'img_link': None,
             'join_date': 'Wed, 22 Aug 2018 00:11:42 GMT',
             'last_login': '0000-00-00 00:00:00', 'last_name': 'dbdn',
             'network_activity': None,
-            'password': '098f6bcd4621d373cade4e832627b4f6',
             'register_date': 'Tue, 21 Aug 2018 23:36:05 GMT', 'role': None,
             'username': 'sbdbb'}]
     assert response.json == exp
+
+
+def test_get_posts_streams_from_database(database, client):
+    database.executescript(
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY, id_network INTEGER, "
+        "post_text TEXT);" +
+        "".join("INSERT INTO posts VALUES (%d, %d, 'Post %d');"
+                % (i, 545 + i % 2, i) for i in range(1, 301)))
+    response = client.get('/network/545/posts', query_string={'count': 120})
+    assert response.is_streamed
+    assert response.status_code == 200
+    posts = response.json
+    assert len(posts) == 120
+    assert posts[0] == {'id': 300, 'id_network': 545, 'post_text': 'Post 300'}
+    assert [post['id'] for post in posts] == list(range(300, 60, -2))
+
+    response = client.get('/network/999/posts')
+    assert response.json == []
+
+
+def test_get_users_pages_through_ties(database, client):
+    # Ten members who all joined at the same moment, plus two later ones.
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "email TEXT, password TEXT);"
+        "CREATE TABLE network_registration (id_user INTEGER, "
+        "id_network INTEGER, join_date TEXT);" +
+        "".join("INSERT INTO users VALUES (%d, 'u%d', 'e', 'p');"
+                "INSERT INTO network_registration VALUES (%d, 7, '%s');"
+                % (i, i, i, '2018-08-22 00:00:00' if i <= 10 else
+                   '2018-09-0%d 00:00:00' % (i - 10))
+                for i in range(1, 13)))
+    seen = []
+    query_string = {'count': 4}
+    while True:
+        # One query for the page and one to find where the next one starts.
+        with query_budget(2):
+            response = client.get('/network/7/users',
+                                  query_string=query_string)
+        assert response.status_code == 200
+        page = response.json
+        assert all(set(user) == {'id', 'username', 'join_date'}
+                   for user in page)
+        seen.extend(user['id'] for user in page)
+        if response.headers['X-Has-More'] == 'false':
+            assert 'X-Next-Cursor' not in response.headers
+            break
+        query_string = {'count': 4,
+                        'cursor': response.headers['X-Next-Cursor']}
+    assert seen == [12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1]
+
+    response = client.get('/network/7/users', query_string={
+        'max_registration_date': '2018-08-22 00:00:00', 'count': 3})
+    assert [user['id'] for user in response.json] == [10, 9, 8]
+
+
+def test_get_users_rejects_bad_page_params(client):
+    response = client.get('/network/7/users', query_string={'cursor': 'nope'})
+    assert response.status_code == 400
+    response = client.get('/network/7/users', query_string={'count': 'ten'})
+    assert response.status_code == 400
+
+
+NETWORK_TABLES = """
+CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE regions (id INTEGER PRIMARY KEY, country_id INTEGER, name TEXT);
+CREATE TABLE cities (id INTEGER PRIMARY KEY, region_id INTEGER, name TEXT);
+INSERT INTO countries VALUES (47228, 'United States'), (44888, 'Canada');
+CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT);
+INSERT INTO languages VALUES (5, 'Welsh');
+CREATE TABLE networks (id INTEGER PRIMARY KEY, city_cur TEXT,
+    id_city_cur INTEGER, region_cur TEXT, id_region_cur INTEGER,
+    country_cur TEXT, id_country_cur INTEGER, city_origin TEXT,
+    id_city_origin INTEGER, region_origin TEXT, id_region_origin INTEGER,
+    country_origin TEXT, id_country_origin INTEGER, language_origin TEXT,
+    id_language_origin INTEGER, network_class TEXT, network_key TEXT UNIQUE);
+"""
+
+
+def test_get_networks_creates_network_once(database, client):
+    database.executescript(NETWORK_TABLES)
+    query = {'near_location': '47228,-1,-1', 'from_location': '44888,-1,-1'}
+    # Loading the network directory, looking for the network, naming its
+    # locations, creating it and reading it back.
+    with query_budget(5):
+        response = client.get('/network/networks', query_string=query)
+    assert response.status_code == 200
+    assert response.headers['X-Has-More'] == 'false'
+    [network] = response.json
+    assert network['network_key'] == '47228,,/44888,,/'
+    assert network['country_origin'] == 'Canada'
+    assert network['network_class'] == 'co'
+    # Found in the directory, then served from the object cache.
+    with query_budget(1):
+        assert client.get('/network/networks',
+                          query_string=query).json == [network]
+    with query_budget(0):
+        response = client.get('/network/networks', query_string=query)
+    assert response.json == [network]
+    assert response.headers['X-Has-More'] == 'false'
+
+    response = client.get('/network/networks',
+                          query_string={'near_location': '47228,-1,-1',
+                                        'language': 'Welsh'})
+    [language_network] = response.json
+    assert language_network['network_key'] == '47228,,/,,/Welsh'
+    assert language_network['network_class'] == '_l'
+    assert language_network['id_language_origin'] == 5
+
+
+def test_concurrent_get_networks_create_one_network(database, client):
+    database.executescript(NETWORK_TABLES)
+    threads = 8
+    barrier = threading.Barrier(threads)
+    responses = []
+
+    def get_networks():
+        barrier.wait()
+        responses.append(api.test_client().get(
+            '/network/networks',
+            query_string={'near_location': '47228,-1,-1',
+                          'from_location': '44888,-1,-1'}))
+
+    workers = [threading.Thread(target=get_networks) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [response.status_code for response in responses] == \
+        [200] * threads
+    assert {response.json[0]['id'] for response in responses} == {1}
+    with api.test_request_context('/'):
+        rows, _ = execute_get_all("SELECT count(*) FROM networks", ())
+    assert rows[0][0] == 1
+
+
+def test_new_network_is_not_duplicated(database, client):
+    database.executescript(NETWORK_TABLES)
+    network = {'id_country_cur': 47228, 'language_origin': 'Welsh',
+               'network_class': '_l'}
+    assert client.post('/network/new', json=network).status_code == 200
+    assert client.post('/network/new', json=network).status_code == 200
+    with api.test_request_context('/'):
+        rows, _ = execute_get_all("SELECT network_key FROM networks", ())
+    assert [row[0] for row in rows] == ['47228,,/,,/Welsh']
+
+
+def test_get_networks_finds_networks_made_elsewhere(database, client):
+    database.executescript(NETWORK_TABLES)
+    with api.test_request_context('/'):
+        networkdir.load()
+    # Made by another worker process, so missing from this one's directory.
+    database.executescript(
+        "INSERT INTO networks (id, id_country_cur, id_country_origin, "
+        "network_key) VALUES (9, 47228, 44888, '47228,,/44888,,/')")
+    response = client.get('/network/networks', query_string={
+        'near_location': '47228,null,-1', 'from_location': '44888,-1,-1'})
+    assert [network['id'] for network in response.json] == [9]
+    with api.test_request_context('/'):
+        rows, _ = execute_get_all("SELECT count(*) FROM networks", ())
+    assert rows[0][0] == 1
+    assert networkdir.current().get('47228,,/44888,,/') == 9
+    response = client.get('/network/networks', query_string={
+        'near_location': '47228,x,-1', 'from_location': '44888,-1,-1'})
+    assert response.status_code == 400
+
+
+def test_get_networks_does_not_write_for_existing_networks(database, client):
+    database.executescript(NETWORK_TABLES.replace(
+        "network_key TEXT UNIQUE", "network_key TEXT UNIQUE COLLATE NOCASE"))
+    with api.test_request_context('/'):
+        networkdir.load()
+    database.executescript(
+        "INSERT INTO networks (id, id_country_cur, language_origin, "
+        "network_key) VALUES (9, 47228, 'Welsh', '47228,,/,,/Welsh')")
+    with mock.patch('api.blueprints.networks.controllers.'
+                    'get_or_create_network') as get_or_create:
+        response = client.get('/network/networks', query_string={
+            'near_location': '47228,-1,-1', 'language': 'welsh'})
+    assert [network['id'] for network in response.json] == [9]
+    get_or_create.assert_not_called()
+
+
+def test_new_network_that_is_not_inserted_is_rejected(database, client):
+    # Like INSERT IGNORE into a column with a foreign key, which drops the
+    # row with only a warning.
+    database.executescript(NETWORK_TABLES.replace(
+        "network_class TEXT,", "network_class TEXT CHECK "
+        "(network_class IN ('_l', 'cc', 'co', 'rc', 'ro')),"))
+    response = client.post('/network/new', json={
+        'id_country_cur': 47228, 'language_origin': 'Welsh',
+        'network_class': 'bad'})
+    assert response.status_code == 400
@@ -0,0 +1,111 @@
+from test.unit import client, database, query_budget
+from api import counters, objectcache
+from api.usermodel import PRIVATE_COLUMNS
+import mock
+import pytest
+
+USERS = "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, " \
+        "email TEXT, password TEXT); " \
+        "INSERT INTO users VALUES (1, 'ada', 'ada@example.com', 'p');"
+
+
+def test_serves_hits_without_queries(database, client):
+    database.executescript(USERS)
+    hits = objectcache.stats()['hits']
+    with query_budget(1):
+        first = client.get('/user/1')
+    with query_budget(0):
+        second = client.get('/user/1')
+    assert first.status_code == second.status_code == 200
+    assert first.data == second.data
+    assert second.content_type == 'application/json'
+    assert second.json == {'id': 1, 'username': 'ada'}
+    stats = objectcache.stats()
+    assert stats['hits'] == hits + 1
+    assert stats['bytes'] > 0
+
+
+def test_does_not_cache_missing_objects(database, client):
+    database.executescript(USERS)
+    assert client.get('/user/2').status_code == 405
+    database.executescript("INSERT INTO users VALUES (2, 'bo', 'e', 'p');")
+    assert client.get('/user/2').json == {'id': 2, 'username': 'bo'}
+
+
+def test_caches_by_integer_id(database, client):
+    database.executescript(USERS)
+    client.get('/user/01')
+    with query_budget(0):
+        assert client.get('/user/1').json['username'] == 'ada'
+    assert objectcache.get('users', '1x') is objectcache.TOMBSTONE
+    objectcache.put('users', '1x', (), b'{}')
+    assert objectcache.get('users', 1, list(PRIVATE_COLUMNS))
+
+
+def test_never_serves_private_fields(database, client):
+    database.executescript(USERS)
+    client.get('/user/1')
+    assert objectcache.get('users', 1, list(PRIVATE_COLUMNS))
+    assert objectcache.get('users', 1, []) is None
+
+
+@mock.patch('api.blueprints.users.controllers.get_curr_user_id', return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_update_invalidates(auth, get_id, database, client):
+    database.executescript(USERS)
+    client.get('/user/01')
+    response = client.put('/user/update_user',
+                          json={'id': 1, 'username': 'lovelace'})
+    assert response.status_code == 200
+    assert client.get('/user/1').json['username'] == 'lovelace'
+    assert client.get('/user/01').json['username'] == 'lovelace'
+    # The tombstone keeps replica reads out of the cache for a while.
+    with query_budget(1):
+        client.get('/user/1')
+
+
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_delete_event_invalidates(auth, database, client):
+    database.executescript(counters.SCHEMA +
+                           "CREATE TABLE events (id INTEGER PRIMARY KEY); "
+                           "INSERT INTO events VALUES (4); "
+                           "CREATE TABLE event_registration "
+                           "(id_event INTEGER, id_guest INTEGER);")
+    assert client.get('/event/4').status_code == 200
+    client.delete('/event/delete', query_string={'id': 4})
+    assert client.get('/event/4').status_code == 405
+
+
+class FakeClient(object):
+    """Stands in for a memcached or Redis client."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ttl):
+        self.data[key] = value
+
+
+@pytest.fixture
+def shared_backend():
+    backend = objectcache.ClientBackend(FakeClient())
+    objectcache.set_backend(backend)
+    yield backend
+    objectcache.set_backend(objectcache.LocalBackend())
+
+
+def test_shared_backend(shared_backend, database, client):
+    database.executescript(USERS)
+    client.get('/user/1')
+    assert list(shared_backend.client.data) == ['cm:obj:users:1']
+    with query_budget(0):
+        assert client.get('/user/1').json['username'] == 'ada'
+    shared_backend.client.get = mock.Mock(side_effect=IOError)
+    with query_budget(1):
+        assert client.get('/user/1').status_code == 200
+    assert objectcache.stats()['errors'] == 1
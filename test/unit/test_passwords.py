@@ -0,0 +1,38 @@
+from api import passwords
+import mock
+import pytest
+import threading
+
+MD5_TEST = '098f6bcd4621d373cade4e832627b4f6'
+
+
+def test_replaces_md5_hashes():
+    valid, new_hash = passwords.check('test', MD5_TEST)
+    assert valid and new_hash.startswith('pbkdf2_sha256$100000$')
+    assert passwords.check('test', new_hash) == (True, None)
+    assert passwords.check('Test', new_hash) == (False, None)
+    assert passwords.check('Test', MD5_TEST) == (False, None)
+
+
+def test_rehashes_with_new_parameters():
+    old = passwords.PBKDF2Hasher(1000).encode('test')
+    valid, new_hash = passwords.check('test', old)
+    assert valid and new_hash.startswith('pbkdf2_sha256$100000$')
+    with mock.patch('api.config.PASSWORD_HASHER', 'md5'):
+        assert passwords.make_hash('test') == MD5_TEST
+        assert passwords.check('test', new_hash) == (True, MD5_TEST)
+
+
+def test_rejects_unknown_users_and_hashes():
+    assert passwords.check('test', None) == (False, None)
+    assert passwords.check('test', 'bcrypt$2b$12$...') == (False, None)
+
+
+def test_turns_away_hashes_beyond_the_queue():
+    with mock.patch('api.passwords._slots', threading.BoundedSemaphore(1)):
+        passwords._slots.acquire()
+        with pytest.raises(passwords.Busy):
+            passwords.make_hash('test')
+        passwords._slots.release()
+        assert passwords.make_hash('test')
+        assert passwords._slots.acquire(blocking=False)
@@ -0,0 +1,76 @@
+from test.unit import client, database, query_budget
+from api import api, places, refdata
+import pytest
+
+TABLES = """
+CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE regions (id INTEGER PRIMARY KEY, country_id INTEGER, name TEXT);
+CREATE TABLE cities (id INTEGER PRIMARY KEY, region_id INTEGER,
+                     country_id INTEGER, name TEXT);
+CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT);
+INSERT INTO countries VALUES (47228, 'United States'), (44888, 'Canada');
+INSERT INTO regions VALUES (56130, 47228, 'New York'),
+                           (21359, 44888, 'Ontario');
+INSERT INTO cities VALUES (327181, 56130, 47228, 'New York City');
+"""
+
+NETWORKS = """
+CREATE TABLE networks (id INTEGER PRIMARY KEY, city_cur TEXT,
+    id_city_cur INTEGER, region_cur TEXT, id_region_cur INTEGER,
+    country_cur TEXT, id_country_cur INTEGER, city_origin TEXT,
+    id_city_origin INTEGER, region_origin TEXT, id_region_origin INTEGER,
+    country_origin TEXT, id_country_origin INTEGER, language_origin TEXT,
+    id_language_origin INTEGER, network_class TEXT, network_key TEXT UNIQUE);
+"""
+
+
+def test_parse_triple():
+    assert places.parse_triple('47228,-1,null') == (47228, None, None)
+    with pytest.raises(ValueError):
+        places.parse_triple('47228,56130')
+    with pytest.raises(ValueError):
+        places.parse_triple('47228,x,1')
+
+
+def test_resolves_triples_with_one_query_per_level(database, client):
+    database.executescript(TABLES)
+    triples = [(47228, 56130, 327181), (44888, 21359, None),
+               (47228, 99, None)]
+    with api.test_request_context('/'):
+        with query_budget(3):
+            names = places.resolve(triples)
+        assert names == [('United States', 'New York', 'New York City'),
+                         ('Canada', 'Ontario', None),
+                         ('United States', None, None)]
+        with query_budget(1):
+            # Only the region that does not exist is read again.
+            assert places.resolve(triples) == names
+        assert places.lookup('cities', [327181]) == {
+            327181: places.Place(327181, 'New York City', 56130, 47228)}
+
+
+def test_resolves_from_reference_data(database, client):
+    database.executescript(TABLES)
+    with api.test_request_context('/'):
+        refdata.load()
+        with query_budget(0):
+            assert places.resolve([(44888, 21359, None)]) == \
+                [('Canada', 'Ontario', None)]
+
+
+def test_network_creation_names_locations(database, client):
+    database.executescript(TABLES + NETWORKS)
+    with api.test_request_context('/'):
+        refdata.load()
+    # Loading the network directory, looking for the network, creating it
+    # and reading it back.
+    with query_budget(4):
+        response = client.get('/network/networks', query_string={
+            'near_location': '47228,56130,327181',
+            'from_location': '44888,21359,-1'})
+    assert response.status_code == 200
+    [network] = response.json
+    assert network['city_cur'] == 'New York City'
+    assert network['region_origin'] == 'Ontario'
+    assert network['id_city_origin'] is None
+    assert network['network_class'] == 'cc'
@@ -0,0 +1,215 @@
+from test.unit import client, database
+from api.pool import ConnectionPool, PoolTimeout, PooledMySQL
+from test.standin import StandInDatabase
+from flask import Flask, g
+import mock
+import pymysql
+import pytest
+
+SCHEMA = "CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT); " \
+         "INSERT INTO users VALUES (1, '%s');"
+
+
+def test_reuses_connections(database):
+    database.executescript("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                           "name TEXT); INSERT INTO users VALUES (1, 'Ada');")
+    pool = ConnectionPool(database.connect, max_size=2)
+    for _ in range(5):
+        entry = pool.checkout()
+        cursor = entry.connection.cursor()
+        cursor.execute("SELECT name FROM users WHERE id=%s", 1)
+        assert cursor.fetchone() == ('Ada',)
+        pool.checkin(entry)
+    assert database.connections_opened == 1
+    stats = pool.stats()
+    assert stats['created'] == 1
+    assert stats['checkouts'] == 5
+    assert stats['idle'] == 1
+    assert stats['in_use'] == 0
+
+
+def test_checkout_times_out_when_exhausted(database):
+    pool = ConnectionPool(database.connect, max_size=1, checkout_timeout=0.01)
+    entry = pool.checkout()
+    with pytest.raises(PoolTimeout):
+        pool.checkout()
+    assert pool.stats()['timeouts'] == 1
+    pool.checkin(entry)
+    pool.checkin(pool.checkout())
+    assert database.connections_opened == 1
+
+
+def test_recycles_old_connections(database):
+    pool = ConnectionPool(database.connect, max_size=1, max_lifetime=0)
+    pool.checkin(pool.checkout())
+    pool.checkin(pool.checkout())
+    assert database.connections_opened == 2
+    assert pool.stats()['size'] == 0
+
+
+def test_replaces_unhealthy_connections(database):
+    pool = ConnectionPool(database.connect, max_size=1, ping_interval=0)
+    entry = pool.checkout()
+    pool.checkin(entry)
+    entry.connection.close()
+    fresh = pool.checkout()
+    assert fresh.connection is not entry.connection
+    assert pool.stats()['failed_health_checks'] == 1
+
+
+def test_drops_inherited_connections_after_fork(database):
+    pool = ConnectionPool(database.connect, max_size=1)
+    parent = pool.checkout()
+    with mock.patch('api.pool.os.getpid', return_value=-1):
+        child = pool.checkout()
+        assert child.connection is not parent.connection
+        # The parent's connection must not be closed or reused by the child.
+        pool.checkin(parent)
+        assert parent.connection.open
+        assert pool.stats()['idle'] == 0
+
+
+def test_extension_lends_one_connection_per_context(database):
+    app = Flask(__name__)
+    mysql = PooledMySQL()
+    mysql.init_app(app, connect=database.connect)
+    with app.app_context():
+        assert mysql.get_db() is mysql.get_db()
+        assert mysql.pool.stats()['in_use'] == 1
+    assert mysql.pool.stats()['in_use'] == 0
+    with app.app_context():
+        mysql.get_db()
+    assert database.connections_opened == 1
+
+
+def test_extension_releases_connection_early(database):
+    app = Flask(__name__)
+    mysql = PooledMySQL()
+    mysql.init_app(app, connect=database.connect)
+    with app.app_context():
+        mysql.get_db()
+        mysql.release()
+        assert mysql.pool.stats()['in_use'] == 0
+        mysql.get_db()
+        assert mysql.pool.stats()['in_use'] == 1
+    assert mysql.pool.stats()['in_use'] == 0
+    assert database.connections_opened == 1
+
+
+def test_pool_stats_endpoint(client):
+    response = client.get('/dev/pool')
+    assert response.status_code == 200
+    with mock.patch.dict(client.application.config, TESTING=False):
+        assert client.get('/dev/pool').status_code == 404
+        assert client.get('/dev/caches').status_code == 404
+
+
+@pytest.fixture
+def replicated():
+    """A Flask app whose extension has a primary and one replica database,
+    each holding a differently named user 1 so tests can tell which one
+    served a read. ``lag`` sets what the replica reports as its lag."""
+    primary, replica = StandInDatabase(), StandInDatabase()
+    primary.executescript(SCHEMA % 'primary')
+    replica.executescript(SCHEMA % 'replica')
+    lag = {'seconds': 0}
+    app = Flask(__name__)
+    app.config['MYSQL_REPLICA_LAG_CHECK_INTERVAL'] = 0
+    mysql = PooledMySQL()
+    mysql.init_app(app, connect=primary.connect,
+                   replica_connects=[replica.connect],
+                   lag_probe=lambda connection: lag['seconds'])
+
+    def read_name():
+        cursor = mysql.get_db(read_only=True).cursor()
+        cursor.execute("SELECT name FROM users WHERE id=%s", 1)
+        return cursor.fetchone()[0]
+
+    @app.route('/read')
+    def read():
+        return read_name()
+
+    @app.route('/write')
+    def write():
+        before = read_name()
+        mysql.note_write()
+        cursor = mysql.get_db().cursor()
+        cursor.execute("UPDATE users SET name=%s WHERE id=1", 'written')
+        mysql.get_db().commit()
+        return before + ',' + read_name()
+
+    app.mysql, app.lag = mysql, lag
+    yield app
+    primary.destroy()
+    replica.destroy()
+
+
+def test_reads_go_to_replica(replicated):
+    client = replicated.test_client()
+    assert client.get('/read').data == b'replica'
+    stats = replicated.mysql.stats()
+    assert stats['routing']['replica_reads'] == 1
+    assert stats['replicas'][0]['in_use'] == 0
+
+
+def test_write_pins_request_and_client_to_primary(replicated):
+    client = replicated.test_client()
+    assert client.get('/write').data == b'replica,written'
+    # The cookie set by the write keeps the client on the primary.
+    assert client.get('/read').data == b'written'
+    fresh_client = replicated.test_client()
+    assert fresh_client.get('/read').data == b'replica'
+
+
+def test_write_pins_authenticated_user_without_cookie(replicated):
+    user = mock.Mock(id=7)
+    with replicated.test_request_context('/write'):
+        g.user = user
+        replicated.mysql.note_write()
+        replicated.mysql.remember_writer(replicated.response_class())
+    with replicated.test_request_context('/read'):
+        assert not replicated.mysql.reads_pinned()
+        g.user = user
+        assert replicated.mysql.reads_pinned()
+
+
+def test_lagging_replica_falls_back_to_primary(replicated):
+    replicated.lag['seconds'] = replicated.mysql.max_lag + 1
+    client = replicated.test_client()
+    assert client.get('/read').data == b'primary'
+    assert replicated.mysql.stats()['routing']['replica_fallbacks'] == 1
+    replicated.lag['seconds'] = None  # Replication stopped
+    assert client.get('/read').data == b'primary'
+    replicated.lag['seconds'] = 0
+    assert client.get('/read').data == b'replica'
+
+
+def test_unreachable_replica_falls_back_to_primary(replicated):
+    replica = replicated.mysql.replicas[0]
+    replica.pool.dispose()
+    replica.pool._connect = mock.Mock(
+        side_effect=pymysql.err.OperationalError(2003, "Can't connect"))
+    client = replicated.test_client()
+    assert client.get('/read').data == b'primary'
+    assert replica.stats()['lag'] is None
+
+
+def test_api_reads_use_replica(client, database):
+    from api.extensions import mysql
+    from api.pool import Replica
+    database.executescript("CREATE TABLE posts (id INTEGER PRIMARY KEY, "
+                           "post_text TEXT)")
+    replica = StandInDatabase()
+    replica.executescript("CREATE TABLE posts (id INTEGER PRIMARY KEY, "
+                          "post_text TEXT); "
+                          "INSERT INTO posts VALUES (1, 'from replica');")
+    mysql.replicas = [Replica(ConnectionPool(replica.connect),
+                              lag_probe=lambda connection: 0)]
+    try:
+        response = client.get('/post/1')
+        assert response.get_json()['post_text'] == 'from replica'
+        assert database.statements == 0
+    finally:
+        mysql.replicas[0].pool.dispose()
+        mysql.replicas = []
+        replica.destroy()
@@ -2,6 +2,10 @@ from test.unit import client
 import mock
 import datetime
 import json
+import pytest
+from api import statements
+from api.counters import Change
+from api.apiutils import load_table_schemas
 
 
 def test_ping(client):
@@ -59,6 +63,7 @@ def test_get_reply_by_id(get_one, client):
     assert response.json == exp
 
 
+@mock.patch('api.config.LIVE_COUNTS', True)
 @mock.patch('api.apiutils.execute_get_one',
             return_value=((5,), (('reply_count', 8, None, 21, 21, 0, False),)))
 def test_get_reply_count(get_one, client):
@@ -107,8 +112,8 @@ def test_get_replies(get_many, client):
             "FROM posts                           " \
             "INNER JOIN post_replies                           " \
             "ON posts.id = post_replies.id_parent                           " \
-            "WHERE posts.id=%sORDER BY id DESC"
-    get_many.assert_called_with(query, ('88',), 100)
+            "WHERE posts.id=%s ORDER BY post_replies.id DESC LIMIT %s"
+    get_many.assert_called_with(query, ('88', 101), 101)
     assert response.status_code == 200
     exp = [{'id': 424, 'id_network': 1, 'id_parent': 88, 'id_user': 2,
             'reply_date': 'Thu, 05 Jul 2018 22:41:49 GMT',
@@ -156,7 +161,8 @@ def test_create_post(auth, get_user_id, execute_insert, client):
             '(id_user,id_network,post_text,vid_link,img_link)  values ' \
             '(%s, %s, %s, %s, %s);'
     args = (1, 2, 'New Post', 'videoLink', 'imageLink')
-    execute_insert.assert_called_with(query, args)
+    execute_insert.assert_called_with(
+        query, args, counts=[Change('post_count', (2,), 1)])
 
     assert response.status_code == 200
     assert response.data.decode() == 'OK'
@@ -181,7 +187,90 @@ def test_create_reply(auth, get_user_id, execute_insert, client):
             '(id_parent,id_user,id_network,reply_text)  ' \
             'values (%s, %s, %s, %s);'
     args = (2, 1, 3, 'Some post reply!')
-    execute_insert.assert_called_with(query, args)
+    execute_insert.assert_called_with(
+        query, args, counts=[Change('reply_count', (2,), 1)])
 
     assert response.status_code == 200
     assert response.data.decode() == 'OK'
+
+
+posts_schema = (('posts', 'id', 'bigint', 'NO'),
+                ('posts', 'id_user', 'bigint', 'YES'),
+                ('posts', 'id_network', 'bigint', 'YES'),
+                ('posts', 'post_date', 'timestamp', 'NO'),
+                ('posts', 'post_text', 'mediumtext', 'YES'),
+                ('posts', 'post_class', 'enum', 'NO'),
+                ('posts', 'post_original', 'bigint', 'YES'),
+                ('posts', 'vid_link', 'varchar', 'YES'),
+                ('posts', 'img_link', 'varchar', 'YES'))
+
+
+@pytest.fixture
+def schema():
+    with mock.patch('api.apiutils.execute_get_all',
+                    return_value=(posts_schema, None)) as get_all:
+        load_table_schemas(['posts'])
+    assert get_all.call_args[0][1] == (('posts',),)
+    yield
+    statements.clear_schema()
+
+
+@mock.patch('api.apiutils.execute_insert')
+@mock.patch('api.blueprints.posts.controllers.get_curr_user_id', return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_create_post_coerces_to_schema(auth, get_user_id, execute_insert,
+                                       schema, client):
+    post = dict(new_post_def, id_network='2', post_text=12)
+    response = client.post('/post/new', data=json.dumps(post),
+                           content_type='application/json')
+    query = 'INSERT INTO posts ' \
+            '(id_user,id_network,post_text,vid_link,img_link)  ' \
+            'values (%s, %s, %s, %s, %s);'
+    args = (1, 2, '12', 'videoLink', 'imageLink')
+    execute_insert.assert_called_with(
+        query, args, counts=[Change('post_count', ('2',), 1)])
+    assert response.status_code == 200
+
+
+@mock.patch('api.apiutils.execute_insert')
+@mock.patch('api.blueprints.posts.controllers.get_curr_user_id', return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_create_post_rejects_bad_value(auth, get_user_id, execute_insert,
+                                       schema, client):
+    post = dict(new_post_def, id_network='two')
+    response = client.post('/post/new', data=json.dumps(post),
+                           content_type='application/json')
+    execute_insert.assert_not_called()
+    assert response.status_code == 400
+    assert response.data.decode() == 'id_network must be an integer'
+
+
+@mock.patch('api.apiutils.execute_insert')
+@mock.patch('api.apiutils.execute_get_one',
+            return_value=(post_by_id_obj, post_by_id_des))
+@mock.patch('api.blueprints.posts.controllers.get_curr_user_id', return_value=3)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_update_post_rejects_unknown_field(auth, get_user_id, get_one,
+                                           execute_insert, schema, client):
+    update = {'id': 88, 'post_text': 'Edited', 'id_user=1, post_text': 'x'}
+    response = client.put('/post/new', data=json.dumps(update),
+                          content_type='application/json')
+    execute_insert.assert_not_called()
+    assert response.status_code == 400
+
+    update = {'id': 88, 'post_text': 'Edited', 'likes': 3}
+    response = client.put('/post/new', data=json.dumps(update),
+                          content_type='application/json')
+    execute_insert.assert_not_called()
+    assert response.data.decode() == 'Unknown field likes'
+
+    update = {'id': 88, 'post_text': 'Edited'}
+    response = client.put('/post/new', data=json.dumps(update),
+                          content_type='application/json')
+    execute_insert.assert_called_with(
+        'UPDATE posts SET post_text=%s, id_user=%s WHERE id=%s',
+        ('Edited', 3, 88))
+    assert response.status_code == 200
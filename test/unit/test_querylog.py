@@ -0,0 +1,57 @@
+from test.unit import client, database, query_budget
+from api import api, querylog
+import pytest
+
+
+def test_fingerprint_normalizes_values():
+    assert querylog.fingerprint(
+        "SELECT *  FROM users\n  WHERE id=%s AND name = 'Ada' LIMIT 10") == \
+        "SELECT * FROM users WHERE id=? AND name = ? LIMIT ?"
+    assert querylog.fingerprint("SELECT * FROM posts WHERE id IN (1, 2, 3)") \
+        == querylog.fingerprint("SELECT * FROM posts WHERE id IN (%s)")
+
+
+def test_arg_count():
+    assert querylog.arg_count(None) == 0
+    assert querylog.arg_count(5) == 1
+    assert querylog.arg_count((1, (2, 3, 4), 'x')) == 5
+
+
+def test_records_statements_per_request(database, client):
+    database.executescript("CREATE TABLE posts (id INTEGER PRIMARY KEY, "
+                           "post_text TEXT); "
+                           "INSERT INTO posts VALUES (1, 'Hi');")
+    with api.test_request_context('/'):
+        from api.apiutils import execute_get_all, execute_get_one
+        execute_get_one("SELECT * FROM posts WHERE id=%s", 1)
+        execute_get_all("SELECT * FROM posts", ())
+        records = querylog.queries()
+    assert [(record.fingerprint, record.arg_count, record.rows)
+            for record in records] == [
+        ("SELECT * FROM posts WHERE id=?", 1, 1),
+        ("SELECT * FROM posts", 0, 1)]
+    assert all(record.elapsed >= 0 for record in records)
+
+
+def test_debug_headers(database, client):
+    database.executescript("CREATE TABLE posts (id INTEGER PRIMARY KEY, "
+                           "post_text TEXT);")
+    response = client.get('/post/1')
+    assert 'X-Query-Count' not in response.headers
+    api.debug = True
+    try:
+        response = client.get('/post/1')
+    finally:
+        api.debug = False
+    assert response.headers['X-Query-Count'] == '1'
+    assert float(response.headers['X-Query-Time-Ms']) >= 0
+
+
+def test_query_budget_fails_when_exceeded(database, client):
+    database.executescript("CREATE TABLE posts (id INTEGER PRIMARY KEY, "
+                           "post_text TEXT);")
+    with pytest.raises(AssertionError) as error:
+        with query_budget(1):
+            client.get('/post/1')
+            client.get('/post/2')
+    assert "SELECT * FROM `posts` WHERE id=?" in str(error.value)
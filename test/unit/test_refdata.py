@@ -0,0 +1,113 @@
+import gzip
+from flask import json
+from test.unit import client, database, query_budget
+from api import api, config, refdata, search
+
+TABLES = """
+CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE regions (id INTEGER PRIMARY KEY, country_id INTEGER, name TEXT);
+CREATE TABLE cities (id INTEGER PRIMARY KEY, region_id INTEGER, name TEXT);
+CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT);
+INSERT INTO countries VALUES (1, 'Wales'), (2, 'Scotland');
+INSERT INTO regions VALUES (10, 1, 'Gwynedd'), (11, 1, 'Powys');
+INSERT INTO cities VALUES (100, 10, 'Bangor');
+INSERT INTO languages VALUES (1, 'Welsh');
+"""
+
+
+def test_manifest_lists_versioned_urls(database, client):
+    database.executescript(TABLES)
+    response = client.get('/location/refdata')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    manifest = json.loads(response.data)
+    version = manifest['version']
+    assert manifest['countries'] == '/location/v/%s/countries' % version
+    assert manifest['languages'] == '/language/v/%s/languages' % version
+
+
+def test_versioned_downloads_are_immutable(database, client):
+    database.executescript(TABLES)
+    version = json.loads(client.get('/location/refdata').data)['version']
+    with query_budget(0):
+        response = client.get('/location/v/%s/countries/1/regions' % version)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == \
+        'public, max-age=31536000, immutable'
+    assert [region['id'] for region in json.loads(response.data)] == [10, 11]
+
+    response = client.get('/location/v/%s/regions/11/cities' % version)
+    assert json.loads(response.data) == []
+
+    response = client.get('/location/v/%s/countries/3/regions' % version)
+    assert response.status_code == 405
+    assert 'no-store' in response.headers['Cache-Control']
+
+
+def test_outdated_versions_redirect(database, client):
+    database.executescript(TABLES)
+    version = json.loads(client.get('/location/refdata').data)['version']
+    response = client.get('/language/v/0123abcd/languages')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(
+        '/language/v/%s/languages' % version)
+    assert 'no-store' in response.headers['Cache-Control']
+
+
+def test_large_payloads_are_gzipped(database, client, monkeypatch):
+    database.executescript(TABLES)
+    monkeypatch.setattr(config, 'GZIP_MIN_SIZE', 1)
+    version = json.loads(client.get('/location/refdata').data)['version']
+    url = '/location/v/%s/countries' % version
+    plain = client.get(url)
+    zipped = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.headers['Vary'] == 'Accept-Encoding'
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+
+    response = client.get(url, headers={'If-None-Match': plain.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_single_items_come_from_the_snapshot(database, client):
+    database.executescript(TABLES)
+    with api.app_context():
+        refdata.load()
+    with query_budget(0):
+        response = client.get('/location/cities/100')
+    assert json.loads(response.data) == \
+        {'id': 100, 'region_id': 10, 'name': 'Bangor'}
+    assert response.headers['Cache-Control'] == 'public, max-age=86400'
+    etag = response.headers['ETag']
+    response = client.get('/location/cities/100',
+                          headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+    # Rows missing from the snapshot are looked up in the database.
+    database.executescript("INSERT INTO languages VALUES (2, 'Gaelic');")
+    with query_budget(1):
+        response = client.get('/language/2')
+    assert json.loads(response.data)['name'] == 'Gaelic'
+
+
+def test_snapshot_is_rebuilt_when_tables_change(database, client,
+                                                monkeypatch):
+    database.executescript(TABLES)
+    with api.app_context():
+        snapshot = refdata.load()
+    monkeypatch.setattr(config, 'REFERENCE_DATA_CHECK_SECS', 0)
+    with api.app_context():
+        # Unchanged, so only checked.
+        with query_budget(1):
+            assert refdata.current() is snapshot
+        database.executescript("INSERT INTO languages VALUES (2, 'Gaelic');")
+        assert search.languages().search('gae', 10)
+        assert refdata.current().version != snapshot.version
+    with query_budget(1):
+        response = client.get('/language/2')
+    assert json.loads(response.data)['name'] == 'Gaelic'
+    monkeypatch.setattr(config, 'REFERENCE_DATA_CHECK_SECS', 60)
+    with query_budget(0):
+        client.get('/language/2')
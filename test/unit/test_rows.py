@@ -0,0 +1,33 @@
+from api.rows import row_factory, compile_row_factory
+from api.apiutils import convert_objects
+
+description = (('id', 8, None, 20, 20, 0, False),
+               ('username', 253, None, 30, 30, 0, True),
+               ('email', 253, None, 50, 50, 0, False),
+               ('password', 253, None, 32, 32, 0, True))
+rows = ((1, 'ada', 'ada@example.com', 'hash1'),
+        (2, 'alan', 'alan@example.com', 'hash2'))
+
+
+def test_convert_objects():
+    assert convert_objects(rows, description) == [
+        {'id': 1, 'username': 'ada', 'email': 'ada@example.com',
+         'password': 'hash1'},
+        {'id': 2, 'username': 'alan', 'email': 'alan@example.com',
+         'password': 'hash2'}]
+
+
+def test_convert_objects_omits_fields():
+    assert convert_objects(rows, description, ['password', 'email']) == [
+        {'id': 1, 'username': 'ada'}, {'id': 2, 'username': 'alan'}]
+    assert convert_objects(rows, description, ['username', 'email',
+                                               'password']) == [
+        {'id': 1}, {'id': 2}]
+
+
+def test_factory_is_compiled_once_per_description():
+    factory = row_factory(description, ['password'])
+    hits = compile_row_factory.cache_info().hits
+    assert row_factory(list(description), ('password',)) is factory
+    assert compile_row_factory.cache_info().hits == hits + 1
+    assert row_factory(description) is not factory
@@ -0,0 +1,76 @@
+import random
+
+from test.unit import client, database
+from api import api, background, refdata, search
+
+NAMES = ['Saint-Étienne', 'Santa Cruz de Tenerife', 'Santander', 'Cruz Alta',
+         'San San']
+INDEX = search.Index((name, name.encode('utf-8')) for name in NAMES)
+
+
+def test_folds_case_and_accents():
+    assert search.fold('Saint-Étienne') == 'saint-etienne'
+    assert search.words('Saint-Étienne') == ['saint', 'etienne']
+
+
+def test_matches_every_word_by_prefix():
+    assert INDEX.search('san', 10) == [b'Santa Cruz de Tenerife',
+                                       b'Santander', b'San San']
+    assert INDEX.search('cruz san', 10) == [b'Santa Cruz de Tenerife']
+    assert INDEX.search('ETIEN', 10) == [b'Saint-\xc3\x89tienne']
+    assert INDEX.search('sa', 2) == [b'Saint-\xc3\x89tienne',
+                                     b'Santa Cruz de Tenerife']
+    assert INDEX.search('santanderx', 10) == []
+    assert INDEX.search(' - ', 10) == []
+
+
+def test_words_are_intersected_like_a_scan(monkeypatch):
+    monkeypatch.setattr(search, 'INTERSECT_BLOCK', 7)
+    rng = random.Random(0)
+    syllables = ('san', 'ta', 'cruz', 'de', 'ma', 'rko', 'marko')
+    names = [" ".join("".join(rng.choice(syllables)
+                              for _ in range(rng.randint(1, 3)))
+                      for _ in range(rng.randint(1, 3)))
+             for _ in range(500)]
+    index = search.Index((name, str(i).encode()) for i, name in
+                         enumerate(names))
+    for query in ('mar ko', 'san ta', 'ta san', 'cruzma de s', 'mark marko',
+                  'santacruz ma', 'de de'):
+        terms = search.words(query)
+        expected = [str(i).encode() for i, name in enumerate(names)
+                    if all(any(word.startswith(term)
+                               for word in search.words(name))
+                           for term in terms)]
+        assert index.search(query, 1000) == expected
+        assert index.search(query, 3) == expected[:3]
+
+
+def test_infix_index_matches_anywhere_in_any_name():
+    index = search.InfixIndex([(['Mandarin Chinese', 'Putonghua'], b'1'),
+                               (['Ñandeva', None], b'2'),
+                               (['Guaraní'], b'3')])
+    assert index.search('AND', 10) == [b'1', b'2']
+    assert index.search('ndev', 10) == [b'2']
+    assert index.search('ani', 10) == [b'3']
+    assert index.search('nan', 1) == [b'2']
+    assert index.search('ese put', 10) == []
+    assert index.search('', 2) == [b'1', b'2']
+
+
+def test_stale_index_is_served_while_rebuilding(database, client):
+    database.executescript(
+        "CREATE TABLE countries (id INTEGER PRIMARY KEY, name TEXT);"
+        "CREATE TABLE regions (id INTEGER PRIMARY KEY, name TEXT);"
+        "CREATE TABLE cities (id INTEGER PRIMARY KEY, name TEXT);"
+        "CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT);"
+        "INSERT INTO countries VALUES (1, 'Wales');")
+    with api.app_context():
+        old = search.locations()
+        database.executescript("INSERT INTO countries VALUES (2, 'Spain');")
+        refdata.load()
+        assert search.locations() is old
+        background.wait()
+        assert search.locations() is not old
+    response = client.get('/location/autocomplete',
+                          query_string={'input_text': 'spa'})
+    assert [location['name'] for location in response.json] == ['Spain']
@@ -0,0 +1,57 @@
+from api.usermodel import ACCOUNT_FIELDS, FIELDS, PRIVATE_COLUMNS, \
+    PUBLIC_FIELDS, User, compile_user_factory, public_factory, user_factory
+from test.unit.test_users import description, sql_object
+import pytest
+
+
+def test_factory_builds_users_from_rows():
+    user = user_factory(description)(sql_object)
+    assert user.id == 2
+    assert user.username == 'CYoum23'
+    assert user.email == 'upperbrain@gmail.com'
+    assert user.password_hash == 'b53a15ae0b7d18f359dd0f5e0fa9cc7b'
+    assert user == User.from_dict(dict(zip(
+        [column[0] for column in description], sql_object)))
+
+
+def test_fields_not_selected_are_none():
+    user = user_factory((('id',), ('password',)))((7, 'hash'))
+    assert user.id == 7
+    assert user.password_hash == 'hash'
+    assert user.username is None
+    assert User.from_dict({'id': 7}).password_hash is None
+
+
+def test_projections_leave_out_private_fields():
+    public = public_factory(description)(sql_object)
+    assert sorted(public) == sorted(PUBLIC_FIELDS)
+    user = user_factory(description)(sql_object)
+    account = user.account()
+    assert sorted(account) == sorted(ACCOUNT_FIELDS)
+    assert account['email'] == 'upperbrain@gmail.com'
+    assert all(account[field] == public[field]
+               for field in ACCOUNT_FIELDS if field in public)
+    assert 'password_hash' not in account
+    # Only the public fields selected.
+    assert public_factory((('id',), ('email',)))((7, 'e')) == {'id': 7}
+
+
+def test_private_columns_are_the_rest_of_users():
+    columns = {column[0] for column in description}
+    assert columns - set(PUBLIC_FIELDS) == set(PRIVATE_COLUMNS)
+
+
+def test_users_are_immutable_and_small():
+    user = User.from_dict({'id': 1})
+    with pytest.raises(AttributeError):
+        user.id = 2
+    assert not hasattr(user, '__dict__')
+    assert user._replace(password_hash='new').password_hash == 'new'
+    assert len(user) == len(FIELDS)
+
+
+def test_factory_is_compiled_once_per_description():
+    factory = user_factory(description)
+    hits = compile_user_factory.cache_info().hits
+    assert user_factory(description) is factory
+    assert compile_user_factory.cache_info().hits == hits + 1
@@ -1,10 +1,13 @@
-from test.unit import client
+from test.unit import client, database, query_budget
+from api import api
 import json
 import mock
 from hashlib import md5
 import datetime
 from pymysql.err import IntegrityError
 from mock import call
+from api import counters, passwords
+from api.counters import Change
 
 
 def test_ping(client):
@@ -65,73 +68,48 @@ def test_create_user(get_one, execute_insert, client):
     response = client.post("/user/users", data=user_def_json,
                            content_type="application/json")
 
-    by_email_query = "SELECT * FROM users WHERE email=%s"
-    call_email = call(by_email_query, (user_obj['email'],))
-    by_username_query = "SELECT * FROM users WHERE username=%s"
-    call_username = call(by_username_query, (user_obj['username'],))
-
-    get_one.assert_has_calls([call_email, call_username], any_order=False)
+    get_one.assert_called_once_with(
+        "SELECT id FROM users WHERE email=%s OR username=%s LIMIT 1",
+        (user_obj['email'], user_obj['username']))
 
     form = 'INSERT INTO users (username,first_name,last_name,email,password)' \
            '  values (%s, %s, %s, %s, %s);'
-    args = ('MyUserName3!', 'Human2!', 'Being4!', 'humanbeing@example.com',
-            md5(str(user_def["password"]).encode('utf-8')).hexdigest())
-    execute_insert.assert_called_with(form, args)
+    [(query, args), _] = execute_insert.call_args
+    assert query == form
+    assert args[:4] == ('MyUserName3!', 'Human2!', 'Being4!',
+                        'humanbeing@example.com')
+    assert args[4].startswith('pbkdf2_sha256$')
+    assert passwords.check(user_def['password'], args[4]) == (True, None)
 
     assert response.status_code == 200
     assert response.data.decode() == "OK"
 
 
-def mock_execute_get_one_create_user_username_taken(sql_q_format, args):
-    if 'WHERE email=' in sql_q_format:
-        return None, get_user_by_des
-    elif 'WHERE username=' in sql_q_format:
-        return get_user_by_obj, get_user_by_des
-    else:
-        raise ValueError('execute_get_one for username creation should include'
-                         'either `WHERE email=` or `WHERE username=` in the'
-                         'query.')
-
-
 @mock.patch("api.apiutils.execute_insert")
 @mock.patch("api.blueprints.users.utils.execute_get_one",
-            side_effect=mock_execute_get_one_create_user_username_taken)
-def test_create_user_username_taken_fail(get_one, execute_insert, client):
+            return_value=((1,), get_user_by_des))
+def test_create_user_taken_fail(get_one, execute_insert, client):
     user_def_json = json.dumps(user_def)
     response = client.post("/user/users", data=user_def_json,
                            content_type="application/json")
 
-    get_one.assert_called_with("SELECT * FROM users WHERE username=%s",
-                               (user_obj['username'],))
+    get_one.assert_called_once_with(
+        "SELECT id FROM users WHERE email=%s OR username=%s LIMIT 1",
+        (user_obj['email'], user_obj['username']))
     execute_insert.assert_not_called()
     assert response.status_code == 400
     assert response.data.decode() == "Username already taken or invalid params"
 
 
-def mock_execute_get_one_create_user_email_taken(sql_q_format, args):
-    if 'WHERE email=' in sql_q_format:
-        return get_user_by_obj, get_user_by_des
-    elif 'WHERE username=' in sql_q_format:
-        return None, get_user_by_des
-    else:
-        raise ValueError('execute_get_one for username creation should include'
-                         'either `WHERE email=` or `WHERE username=` in the'
-                         'query.')
-
-
-@mock.patch("api.apiutils.execute_insert")
-@mock.patch("api.blueprints.users.utils.execute_get_one",
-            side_effect=mock_execute_get_one_create_user_email_taken)
-def test_create_user_email_taken_fail(get_one, execute_insert, client):
-    user_def_json = json.dumps(user_def)
-    response = client.post("/user/users", data=user_def_json,
-                           content_type="application/json")
-
-    get_one.assert_called_with("SELECT * FROM users WHERE email=%s",
-                               (user_obj['email'],))
-    execute_insert.assert_not_called()
-    assert response.status_code == 400
-    assert response.data.decode() == "Username already taken or invalid params"
+def test_create_user_email_or_username_taken_fail(database, client):
+    database.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, "
+        "email TEXT); INSERT INTO users VALUES (1, 'taken', 'a@example.com');")
+    for taken in ({'username': 'taken'}, {'email': 'a@example.com'}):
+        with query_budget(1):
+            response = client.post("/user/users",
+                                   json=dict(user_def, **taken))
+        assert response.status_code == 400
 
 
 @mock.patch("api.apiutils.execute_insert")
@@ -183,9 +161,9 @@ def test_get_user_by_id(get_one, client):
     get_one.assert_called_with(query, '2')
     assert response.status_code == 200
     exp = {'about_me': 'I am from Korea and working at SF as game developer.',
-           'act_code': '97657a61f23bff2b65c63c9aacf4f032', 'company_news': 1,
+           'company_news': 1,
            'confirmed': 1, 'events_interested_in': 1, 'events_upcoming': 1,
-           'first_name': 'Chris', 'fp_code': None, 'gender': 'M', 'id': 2,
+           'first_name': 'Chris', 'gender': 'M', 'id': 2,
            'img_link': '1401652610_0/pp.png',
            'last_login': 'Sun, 01 Jun 2014 11:54:27 GMT', 'last_name': 'Youm',
            'network_activity': 1,
@@ -214,8 +192,8 @@ def test_get_posts(get_many, client):
     response = client.get('/user/2/posts')
     query = "SELECT *                           " \
             "FROM posts                           " \
-            "WHERE id_user=%sORDER BY id DESC"
-    get_many.assert_called_with(query, ('2',), 100)
+            "WHERE id_user=%s ORDER BY id DESC LIMIT %s"
+    get_many.assert_called_with(query, ('2', 101), 101)
     assert response.status_code == 200
     exp = [{'id': 381, 'id_network': 1, 'id_user': 2, 'img_link': None,
             'post_class': 'o', 'post_date': 'Sat, 17 Jan 2015 12:32:12 GMT',
@@ -261,8 +239,9 @@ def test_get_networks(get_many, client):
             "INNER JOIN networks                           " \
             "ON networks.id = " \
             "network_registration.id_network                           " \
-            "WHERE network_registration.id_user=%sORDER BY join_date DESC"
-    get_many.assert_called_with(query, ('2',), 100)
+            "WHERE network_registration.id_user=%s ORDER BY join_date DESC, " \
+            "networks.id DESC LIMIT %s"
+    get_many.assert_called_with(query, ('2', 101), 101)
     assert response.status_code == 200
     exp = [{'city_cur': 'Palo Alto', 'city_origin': None,
             'country_cur': 'United States', 'country_origin': 'United States',
@@ -288,10 +267,12 @@ def test_update_user(execute_insert, auth, get_id, client):
                           content_type="application/json")
     query = 'UPDATE users SET username=%s, first_name=%s, last_name=%s, ' \
             'email=%s, password=%s, role=%s, about_me=%s, gender=%s WHERE id=%s'
-    args = (user_obj['username'], user_obj['first_name'], user_obj['last_name'],
-            user_obj['email'], user_obj['password'], user_obj['role'], '', '',
-            user_obj['id'])
-    execute_insert.assert_called_with(query, args)
+    [(sql, args), _] = execute_insert.call_args
+    assert sql == query
+    assert args[:4] + args[5:] == (
+        user_obj['username'], user_obj['first_name'], user_obj['last_name'],
+        user_obj['email'], user_obj['role'], '', '', user_obj['id'])
+    assert passwords.check(user_def['password'], args[4]) == (True, None)
     get_id.assert_called_with()
     auth.assert_called_with(None, None)
     assert response.status_code == 200
@@ -309,7 +290,8 @@ def test_join_event(execute_insert, event_exists, auth, get_id, client):
     query = "INSERT INTO event_registration VALUES " \
             "(%s,%s,CURRENT_TIMESTAMP, %s)"
     args = (1, '23', 'guest')
-    execute_insert.assert_called_with(query, args)
+    execute_insert.assert_called_with(
+        query, args, counts=[Change('reg_count', ('23',), 1)])
     event_exists.assert_called_with('23')
     get_id.assert_called_with()
     auth.assert_called_with(None, None)
@@ -375,7 +357,8 @@ def test_leave_event(execute_mod, event_exists, auth, get_id, client):
     response = client.delete('/user/leaveEvent/23')
     query = "DELETE FROM event_registration WHERE id_event=%s AND id_guest=%s"
     args = ('23', 1)
-    execute_mod.assert_called_with(query, args)
+    execute_mod.assert_called_with(
+        query, args, counts=[Change('reg_count', ('23',), -1)])
     event_exists.assert_called_with('23')
     get_id.assert_called_with()
     auth.assert_called_with(None, None)
@@ -412,7 +395,8 @@ def test_join_network(execute_mod, net_exists, auth, get_id, client):
     query = "INSERT INTO network_registration VALUES " \
             "(%s, %s, CURRENT_TIMESTAMP)"
     args = ('1', '2')
-    execute_mod.assert_called_with(query, args)
+    execute_mod.assert_called_with(
+        query, args, counts=[Change('user_count', ('2',), 1)])
     assert response.status_code == 200
     assert response.data.decode() == 'OK'
 
@@ -448,7 +432,8 @@ def test_join_subscribed_network(execute_mod, net_exists, auth, get_id, client):
     query = "INSERT INTO network_registration VALUES " \
             "(%s, %s, CURRENT_TIMESTAMP)"
     args = ('1', '2')
-    execute_mod.assert_called_with(query, args)
+    execute_mod.assert_called_with(
+        query, args, counts=[Change('user_count', ('2',), 1)])
     assert response.status_code == 405
     assert response.data.decode() == 'User already subscribed'
 
@@ -464,102 +449,210 @@ def test_leave_network(execute_mod, auth, get_id, client):
     query = "DELETE FROM network_registration WHERE id_user=%s AND " \
             "id_network=%s"
     args = (1, '2')
-    execute_mod.assert_called_with(query, args)
+    execute_mod.assert_called_with(
+        query, args, counts=[Change('user_count', ('2',), -1)])
     assert response.status_code == 200
     assert response.data.decode() == 'User 1 left network 2'
 
 
-# execute_get_all
-get_net_users_net_obj = ((3161,),)
-get_net_users_net_des = (('id', 8, None, 20, 20, 0, False),)
-
-# execute_get_many
-get_net_users_reg_obj = ((178,),)
-get_net_users_reg_des = (('id_user', 8, None, 20, 20, 0, False),)
-
-# execute_get_all
-get_net_users_usr_obj = ((178, 'sbdbb', 'dndn', 'dbdn', 'snsj',
-                          '098f6bcd4621d373cade4e832627b4f6', None,
-                          datetime.datetime(2018, 8, 21, 23, 36, 5),
-                          '0000-00-00 00:00:00', None, None, None, None, None,
-                          None, 0, '', None, None),)
-get_net_users_usr_des = (('id', 8, None, 20, 20, 0, False),
-                         ('username', 253, None, 30, 30, 0, True),
-                         ('first_name', 253, None, 30, 30, 0, True),
-                         ('last_name', 253, None, 30, 30, 0, True),
-                         ('email', 253, None, 50, 50, 0, False),
-                         ('password', 253, None, 32, 32, 0, True),
-                         ('role', 2, None, 1, 1, 0, True),
-                         ('register_date', 7, None, 19, 19, 0, False),
-                         ('last_login', 7, None, 19, 19, 0, False),
-                         ('gender', 253, None, 1, 1, 0, True),
-                         ('about_me', 253, None, 500, 500, 0, True),
-                         ('events_upcoming', 2, None, 1, 1, 0, True),
-                         ('events_interested_in', 2, None, 1, 1, 0, True),
-                         ('company_news', 2, None, 1, 1, 0, True),
-                         ('network_activity', 2, None, 1, 1, 0, True),
-                         ('confirmed', 1, None, 1, 1, 0, False),
-                         ('act_code', 253, None, 32, 32, 0, False),
-                         ('img_link', 253, None, 50, 50, 0, True),
-                         ('fp_code', 254, None, 96, 96, 0, True))
-
-
-def mock_get_all_get_net_users(sql_q_format, args):
-    if 'FROM networks' in sql_q_format:
-        return get_net_users_net_obj, get_net_users_net_des
-    elif 'FROM users' in sql_q_format:
-        return get_net_users_usr_obj, get_net_users_usr_des
-    else:
-        raise ValueError('sql_q_format should specify either from the networks'
-                         'or from the users table.')
-
-
-@mock.patch('api.blueprints.users.controllers.execute_get_many',
-            return_value=(get_net_users_reg_obj, get_net_users_reg_des))
-@mock.patch('api.blueprints.users.controllers.execute_get_all',
-            side_effect=mock_get_all_get_net_users)
-def test_get_net_users(get_all, get_many, client):
-    city_cur = 327181
-    region_cur = 56130
-    country_cur = 47228
-    near_loc = str(country_cur) + ',' + str(region_cur) + ',' + str(city_cur)
-
-    city_origin = 332851
-    region_origin = 55833
-    country_origin = 47228
-    from_loc = str(country_origin) + ',' + str(region_origin) + ',' + \
-               str(city_origin)
-
-    response = client.get('/user/users',
-                          query_string={'near_location': near_loc,
-                                        'from_location': from_loc})
-
-    net_query = 'SELECT id FROM networks WHERE id_country_cur=%s AND ' \
-                'id_region_cur=%s AND id_city_cur=%s AND ' \
-                'id_country_origin=%s AND id_region_origin=%s AND ' \
-                'id_city_origin=%s'
-    net_args = ('47228', '56130', '327181', '47228', '55833', '332851')
-    net_call = call(net_query, net_args)
-
-    reg_query = 'SELECT id_user FROM network_registration WHERE ' \
-                'id_network IN %sORDER BY id_user DESC'
-    reg_args = (((3161,),),)
-    reg_count = 100
-    get_many.assert_called_with(reg_query, reg_args, reg_count)
-
-    usr_query = 'SELECT * FROM users WHERE id IN %s'
-    usr_args = (((178,),),)
-    usr_call = call(usr_query, usr_args)
-
-    get_all.assert_has_calls([net_call, usr_call], any_order=False)
-
+NETWORK_USERS_TABLES = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
+    last_name TEXT, email TEXT, password TEXT, role INTEGER,
+    register_date TEXT, last_login TEXT, gender TEXT, about_me TEXT,
+    events_upcoming INTEGER, events_interested_in INTEGER,
+    company_news INTEGER, network_activity INTEGER, confirmed INTEGER,
+    act_code TEXT, img_link TEXT, fp_code TEXT);
+CREATE TABLE networks (id INTEGER PRIMARY KEY, id_country_cur INTEGER,
+    id_region_cur INTEGER, id_city_cur INTEGER, id_country_origin INTEGER,
+    id_region_origin INTEGER, id_city_origin INTEGER, language_origin TEXT,
+    network_key TEXT UNIQUE);
+CREATE TABLE network_registration (id_user INTEGER, id_network INTEGER,
+    PRIMARY KEY (id_user, id_network));
+INSERT INTO networks VALUES (3161, 47228, 56130, 327181, 47228, 55833, 332851,
+                             NULL, '47228,56130,327181/47228,55833,332851/'),
+                            (3162, 47228, NULL, NULL, 47228, 55833, 332851,
+                             NULL, '47228,,/47228,55833,332851/'),
+                            (3163, 47228, 56130, 327181, NULL, NULL, NULL,
+                             'Welsh', '47228,56130,327181/,,/Welsh'),
+                            (3164, 47228, 56130, NULL, NULL, NULL, NULL,
+                             'Welsh', '47228,56130,/,,/Welsh');
+INSERT INTO network_registration VALUES (178, 3161), (179, 3161), (180, 3162),
+                                        (178, 3163), (179, 3163), (180, 3164);
+"""
+
+
+def add_network_users(database):
+    database.executescript(NETWORK_USERS_TABLES + "".join(
+        "INSERT INTO users VALUES (%d, 'user%d', 'dndn', 'dbdn', 'snsj', "
+        "'098f6bcd4621d373cade4e832627b4f6', NULL, '2018-08-21 23:36:05', "
+        "'0000-00-00 00:00:00', NULL, NULL, NULL, NULL, NULL, NULL, 0, 'code', "
+        "NULL, 'reset');" % (id_, id_) for id_ in (178, 179, 180)))
+
+
+def test_get_net_users(database, client):
+    add_network_users(database)
+    query = {'near_location': '47228,56130,327181',
+             'from_location': '47228,55833,332851'}
+    # Loading the network directory, then listing the members.
+    with query_budget(2):
+        response = client.get('/user/users', query_string=query)
     assert response.status_code == 200
-    exp = [{'about_me': None, 'act_code': '', 'company_news': None,
-            'confirmed': 0, 'events_interested_in': None,
-            'events_upcoming': None, 'first_name': 'dndn', 'fp_code': None,
-            'gender': None, 'id': 178, 'img_link': None,
+    exp = [{'about_me': None, 'company_news': None, 'confirmed': 0,
+            'events_interested_in': None, 'events_upcoming': None,
+            'first_name': 'dndn', 'gender': None, 'id': 179, 'img_link': None,
+            'last_login': '0000-00-00 00:00:00', 'last_name': 'dbdn',
+            'network_activity': None, 'register_date': '2018-08-21 23:36:05',
+            'role': None, 'username': 'user179'},
+           {'about_me': None, 'company_news': None, 'confirmed': 0,
+            'events_interested_in': None, 'events_upcoming': None,
+            'first_name': 'dndn', 'gender': None, 'id': 178, 'img_link': None,
             'last_login': '0000-00-00 00:00:00', 'last_name': 'dbdn',
-            'network_activity': None,
-            'register_date': 'Tue, 21 Aug 2018 23:36:05 GMT', 'role': None,
-            'username': 'sbdbb'}]
+            'network_activity': None, 'register_date': '2018-08-21 23:36:05',
+            'role': None, 'username': 'user178'}]
     assert response.json == exp
+    assert response.headers['X-Has-More'] == 'false'
+    with query_budget(1):
+        assert client.get('/user/users', query_string=query).json == exp
+
+
+def test_get_net_users_null_location_and_language(database, client):
+    add_network_users(database)
+    response = client.get('/user/users', query_string={
+        'near_location': '47228,-1,null',
+        'from_location': '47228,55833,332851'})
+    assert [user['id'] for user in response.json] == [180]
+    # Only the members of the Welsh network in the city are listed.
+    response = client.get('/user/users', query_string={
+        'near_location': '47228,56130,327181', 'language': 'Welsh',
+        'count': 1})
+    assert [user['id'] for user in response.json] == [179]
+    response = client.get('/user/users', query_string={
+        'near_location': '47228,56130,327181', 'language': 'Welsh',
+        'cursor': response.headers['X-Next-Cursor']})
+    assert [user['id'] for user in response.json] == [178]
+    response = client.get('/user/users', query_string={
+        'near_location': '47228,56130', 'language': 'Welsh'})
+    assert response.status_code == 400
+    response = client.get('/user/users', query_string={
+        'near_location': '47228,56130,327181', 'language': 'Cornish'})
+    assert response.json == []
+
+
+def test_get_posts_pages_with_cursor(database, client):
+    database.executescript(
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY, id_user INTEGER);" +
+        "".join("INSERT INTO posts VALUES (%d, 2);" % i
+                for i in range(1, 8)))
+    with query_budget(1):
+        response = client.get('/user/2/posts', query_string={'count': 5})
+    assert [post['id'] for post in response.json] == [7, 6, 5, 4, 3]
+    assert response.headers['X-Has-More'] == 'true'
+    cursor = response.headers['X-Next-Cursor']
+    response = client.get('/user/2/posts', query_string={'cursor': cursor})
+    assert [post['id'] for post in response.json] == [2, 1]
+    assert response.headers['X-Has-More'] == 'false'
+
+    response = client.get('/user/2/posts', query_string={'max_id': 4})
+    assert [post['id'] for post in response.json] == [4, 3, 2, 1]
+
+
+@mock.patch('api.apiutils.execute_get_many', return_value=((), ()))
+def test_get_posts_caps_page_size(get_many, client):
+    client.get('/user/2/posts', query_string={'count': 100000})
+    get_many.assert_called_with(mock.ANY, ('2', 501), 501)
+
+
+@mock.patch('api.blueprints.users.controllers.get_curr_user_id', return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_join_and_leave_event_check_existence_once(auth, get_id, database,
+                                                   client):
+    database.executescript(
+        counters.SCHEMA +
+        "CREATE TABLE events (id INTEGER PRIMARY KEY);"
+        "INSERT INTO events VALUES (23);"
+        "CREATE TABLE event_registration (id_guest INTEGER, "
+        "id_event INTEGER, date_registered TEXT, job TEXT);")
+    # Existence, the write, and updating then creating its counter.
+    with query_budget(4):
+        response = client.post('/user/joinEvent/23',
+                               query_string={'role': 'guest'})
+    assert response.status_code == 200
+    # The event is known to exist and its counter to be there now, so only
+    # the write and the counter update remain.
+    with query_budget(2):
+        response = client.delete('/user/leaveEvent/23')
+    assert response.status_code == 200
+    with query_budget(2):
+        response = client.post('/user/joinEvent/23',
+                               query_string={'role': 'host'})
+    assert response.status_code == 200
+
+
+@mock.patch('api.blueprints.users.controllers.get_curr_user_id', return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_join_networks_in_bulk(auth, get_id, database, client):
+    database.executescript(
+        counters.SCHEMA +
+        "CREATE TABLE networks (id INTEGER PRIMARY KEY);" +
+        "".join("INSERT INTO networks VALUES (%d);" % i for i in range(1, 6)) +
+        "CREATE TABLE network_registration (id_user INTEGER, "
+        "id_network INTEGER, join_date TEXT, "
+        "PRIMARY KEY (id_user, id_network));"
+        "INSERT INTO network_registration VALUES (1, 2, '2018-08-22');")
+    # Existence, current registrations, one multi-row insert, and one counter
+    # update and one statement creating the counters that did not exist.
+    with query_budget(5):
+        response = client.post('/user/joinNetworks',
+                               json={'ids': [1, 2, 99, 3, 1]})
+    assert response.status_code == 200
+    assert response.json == [{'id': 1, 'result': 'joined'},
+                             {'id': 2, 'result': 'already subscribed'},
+                             {'id': 99, 'result': 'invalid'},
+                             {'id': 3, 'result': 'joined'}]
+    response = client.post('/user/joinNetworks', query_string={'ids': '3,4'})
+    assert response.json == [{'id': 3, 'result': 'already subscribed'},
+                             {'id': 4, 'result': 'joined'}]
+    with api.test_request_context('/'):
+        from api.apiutils import execute_get_all
+        rows, _ = execute_get_all("SELECT id_network FROM "
+                                  "network_registration WHERE id_user=1 "
+                                  "ORDER BY id_network", ())
+    assert [row[0] for row in rows] == [1, 2, 3, 4]
+
+
+@mock.patch('api.blueprints.users.controllers.get_curr_user_id', return_value=1)
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+@mock.patch('api.blueprints.users.utils.existence.existing_ids',
+            return_value={23, 24})
+@mock.patch('api.blueprints.users.utils.mysql')
+@mock.patch('api.blueprints.users.utils.fetch_all', return_value=(((24,),), ()))
+@mock.patch('api.blueprints.users.utils.execute_insert_rows')
+def test_join_events_in_bulk(insert_rows, fetch_all, mysql, existing_ids,
+                             auth, get_id, client):
+    response = client.post('/user/joinEvents', json={'ids': [23, 24, 25]},
+                           query_string={'role': 'guest'})
+    insert_rows.assert_called_with(
+        "INSERT IGNORE INTO event_registration VALUES",
+        "(%s,%s,CURRENT_TIMESTAMP, %s)", [(1, 23, 'guest')],
+        counts=[Change('reg_count', [23], 1)])
+    assert response.json == [{'id': 23, 'result': 'joined'},
+                             {'id': 24, 'result': 'already registered'},
+                             {'id': 25, 'result': 'invalid'}]
+
+
+@mock.patch('api.blueprints.accounts.controllers.auth.authenticate',
+            return_value=True)
+def test_join_networks_rejects_bad_ids(auth, client):
+    response = client.post('/user/joinNetworks', json={'ids': ['one']})
+    assert response.status_code == 400
+    response = client.post('/user/joinNetworks')
+    assert response.status_code == 400
+    response = client.post('/user/joinNetworks',
+                           json={'ids': list(range(1000))})
+    assert response.status_code == 400
+    response = client.post('/user/joinEvents', json={'ids': [1]},
+                           query_string={'role': 'boss'})
+    assert response.status_code == 405